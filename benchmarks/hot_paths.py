@@ -0,0 +1,272 @@
+"""
+Benchmark labware selection, deck parsing and state I/O. Each benchmark is timed over
+several samples and the median is appended to a results file, keyed by commit and host,
+so results can be tracked over time. Fails if a benchmark is slower than the last result
+from the same host and Python version by more than the threshold.
+
+Usage: python benchmarks/hot_paths.py [-k pattern] [--no-save] [--threshold 0.25]
+"""
+
+# Imports
+import os, sys, argparse, json, platform, statistics, subprocess, tempfile, time
+import datetime
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+lib_dir_path = os.path.join(root, "parseqpyhamilton", "lib")
+layout_dir_path = os.path.join(root, "data", "layouts")
+results_path = os.path.join(root, "benchmarks", "results.jsonl")
+
+sys.path.insert(0, lib_dir_path)
+
+import numpy as np
+from pyhamilton import Plate384, Tip96
+
+import deck as dk
+import labware as lw
+import state as st
+
+# Samples per benchmark, each sample runs for at least SAMPLE_TIME s if possible
+SAMPLES = 15
+SAMPLE_TIME = 0.01
+
+# Relative slowdown against the last result which counts as a regression
+THRESHOLD = 0.25
+
+# Layout with the most labware, used for deck store benchmarks
+DECK_LAYOUT = "cherry_picking"
+
+# State changes per set_state sample
+STATE_CHANGES = 20
+
+# Seed for fragmented plates and shuffled inputs
+SEED = 0
+
+
+def measure(fn, setup=None) -> list[float]:
+    """
+    Time fn in s per call. Without setup calls are looped until a sample takes at least
+    SAMPLE_TIME, otherwise setup is called untimed before every call.
+    """
+    number = 1
+    if setup is None:
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= SAMPLE_TIME or number >= 1e6:
+                break
+            number *= 10
+
+    times = []
+    for _ in range(SAMPLES):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+
+    return times
+
+
+def plates() -> dict[str, lw.plate_384]:
+    """Full, fragmented (3/4 of wells left at random) and sparse (last column)."""
+    rng = np.random.default_rng(SEED)
+    wells = lw.pos_row_384()
+
+    full = lw.plate_384(Plate384("bench_full"))
+    fragmented = lw.plate_384(Plate384("bench_fragmented"))
+    fragmented.fill(list(rng.choice(wells, 288, replace=False)))
+    sparse = lw.plate_384(Plate384("bench_sparse"))
+    sparse.fill([w for w in wells if int(w[1:]) == 24])
+
+    return {"full": full, "fragmented": fragmented, "sparse": sparse}
+
+
+def labware_benchmarks() -> dict:
+    """Labware selection, wells are not removed so every call sees the same plate."""
+    benchmarks = {}
+    for name, plate in plates().items():
+        benchmarks[f"plate_384.ch2 {name}"] = lambda p=plate: p.ch2(2, remove=False)
+        benchmarks[f"plate_384.mph384 1x1 {name}"] = lambda p=plate: p.mph384(
+            1, 1, remove=False
+        )
+        benchmarks[f"plate_384.quadrant {name}"] = lambda p=plate: p.quadrant(
+            remove=False
+        )
+
+    for rows, columns in [(2, 2), (8, 12)]:
+        plate = plates()["full"]
+        benchmarks[f"plate_384.mph384 {rows}x{columns} full"] = (
+            lambda p=plate, r=rows, c=columns: p.mph384(r, c, remove=False)
+        )
+
+    plate = plates()["full"]
+    wells = list(lw.pos_row_384())
+    benchmarks["plate_384.fill 384 wells"] = lambda: plate.fill(wells)
+
+    # Draining a rack column by column, as done by the 384 head in pooling
+    for policy in ["first", "best"]:
+        rack = lw.tip_96(Tip96("bench_rack"), policy)
+
+        def drain(rack=rack):
+            for _ in range(12):
+                rack.mph384(8, 1)
+
+        benchmarks[f"tip_96.mph384 drain 8x1 {policy}"] = (drain, rack.reset)
+
+    rng = np.random.default_rng(SEED)
+    for n in [16, 384]:
+        indexes = rng.permutation(384)[:n].tolist()
+        benchmarks[f"sort_list {n}"] = lambda i=indexes: lw.sort_list(i, 4)
+
+    return benchmarks
+
+
+def deck_benchmarks() -> dict:
+    """Parse every layout without installing it for Hamilton software."""
+    benchmarks = {}
+    for f in sorted(os.listdir(layout_dir_path)):
+        if f.endswith(".lay"):
+            path = os.path.join(layout_dir_path, f)
+            benchmarks[f"get_deck+add_dataframes {f[:-4]}"] = lambda p=path: (
+                dk.add_dataframes(dk.get_deck(p, install=False))
+            )
+
+    return benchmarks
+
+
+def state_benchmarks(tmp_dir_path: str) -> tuple[dict, st.DeckStore]:
+    """State changes with an open deck store, returned to be closed after timing."""
+    layout_path = os.path.join(layout_dir_path, f"{DECK_LAYOUT}.lay")
+    deck = dk.add_dataframes(dk.get_deck(layout_path, install=False))
+    labware_path = os.path.join(tmp_dir_path, "labware")
+    st.save_deck_state(labware_path, deck)
+
+    state_path = os.path.join(tmp_dir_path, "state.json")
+    st.save_state({"step": 0}, state_path)
+    state = st.load_state(state_path)
+
+    def load_all(shelf):
+        return [shelf[col][row] for col in shelf for row in range(len(shelf[col]))]
+
+    # Every slot is loaded, so each set_state checks the full deck for changes
+    shelf = st.load_deck_state(labware_path)
+    load_all(shelf)
+
+    def set_states():
+        for i in range(STATE_CHANGES):
+            st.set_state(state, state_path, "step", i)
+
+    def round_trip():
+        with st.load_deck_state(labware_path) as shelf:
+            load_all(shelf)
+
+    return {
+        f"set_state x{STATE_CHANGES} with deck store": set_states,
+        f"deck store open/load/close {DECK_LAYOUT}": round_trip,
+        f"save_deck_state {DECK_LAYOUT}": lambda: st.save_deck_state(
+            labware_path, deck
+        ),
+    }, shelf
+
+
+def git_commit() -> str | None:
+    """Commit of the working tree, None outside a git repo."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def last_results(host: str, python: str) -> dict:
+    """Last saved result of each benchmark from the same host and Python version."""
+    results = {}
+    try:
+        with open(results_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["host"] == host and record["python"] == python:
+                    results.update(record["results"])
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def format_time(seconds: float) -> str:
+    """Format seconds with unit."""
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:.1f} {unit}"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark run-critical code.")
+    parser.add_argument("-k", default="", help="only run benchmarks containing this")
+    parser.add_argument("--no-save", action="store_true", help="do not save results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="relative slowdown which counts as a regression",
+    )
+    args = parser.parse_args()
+
+    host = platform.node()
+    python = platform.python_version()
+    previous = last_results(host, python)
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        benchmarks = {**labware_benchmarks(), **deck_benchmarks()}
+        state, shelf = state_benchmarks(tmp_dir_path)
+        benchmarks.update(state)
+
+        print(f"{'benchmark':<45}{'median':<12}{'min':<12}{'change':<12}")
+        print(f"{'-' * 80}")
+        results = {}
+        regressions = []
+        for name, benchmark in benchmarks.items():
+            if args.k not in name:
+                continue
+            fn, setup = benchmark if isinstance(benchmark, tuple) else (benchmark, None)
+            times = measure(fn, setup)
+            results[name] = statistics.median(times)
+
+            change = ""
+            if name in previous:
+                ratio = results[name] / previous[name] - 1
+                change = f"{ratio:+.0%}"
+                if ratio > args.threshold:
+                    regressions.append(name)
+                    change += " !"
+            print(
+                f"{name:<45}{format_time(results[name]):<12}"
+                f"{format_time(min(times)):<12}{change:<12}"
+            )
+        print(f"{'-' * 80}")
+
+        shelf.close()
+
+    if not args.no_save:
+        record = {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "host": host,
+            "python": python,
+            "results": results,
+        }
+        with open(results_path, "at", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Results saved to: {results_path}")
+
+    if regressions:
+        print(f"Slower than last result by over {args.threshold:.0%}: {regressions}")
+        sys.exit(1)
@@ -0,0 +1,272 @@
+"""
+Benchmark host-side overhead of methods end to end. Every method with a default layout
+and state file is run against the simulator with canned prompt answers and generated
+input CSVs, keeping the deck in a deck store as main.py does. Python CPU time per
+command, total commands, peak allocations (tracemalloc) and state writes are reported.
+Results are saved and compared like benchmarks/hot_paths.py.
+
+Usage: python benchmarks/methods.py [-k pattern] [--runs 3] [--no-save]
+"""
+
+# Imports
+import os, sys, argparse, builtins, contextlib, collections, io, platform, statistics
+import datetime, json, tempfile, time, tracemalloc, importlib
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+lib_dir_path = os.path.join(root, "parseqpyhamilton", "lib")
+layout_dir_path = os.path.join(root, "data", "layouts")
+state_dir_path = os.path.join(root, "data", "states")
+
+sys.path.insert(0, lib_dir_path)
+sys.path.insert(0, os.path.join(root, "parseqpyhamilton", "methods"))
+
+import numpy as np
+
+import estimate as es
+import labware as lw
+import state as st
+
+from hot_paths import THRESHOLD, git_commit, last_results, format_time, results_path
+
+# Prompt answers by message, {csv} is replaced by the generated input of the method
+# Prompts not listed (press enter to continue) are answered with an empty line
+ANSWERS = {
+    "bpcr": {"Plates to process": "4"},
+    "cherry_picking": {"Input CSV file": "{csv}"},
+    "lib_nanopore": {"Input CSV file": "{csv}", "Moles per sample": "200"},
+    "plate_filling": {"Plates to fill": "18", "Volume to add": "100"},
+    "pm_emptying": {"Input CSV file": "{csv}"},
+    "pm_filling": {"Input CSV file": "{csv}"},
+    # Tip racks on deck last for 6 plates, the user adds racks for more
+    "pooling": {"Plates to pool": "6", "Current tip column": "0"},
+    "purification": {"Pools to purify": "24", "Current tip column": "0"},
+}
+
+# Times a prompt is repeated in a row before the run is stopped (e.g. invalid value)
+MAX_PROMPTS = 50
+
+# Seed for generated inputs
+SEED = 0
+
+
+def random_wells(rng: np.random.Generator, n: int) -> list[str]:
+    """n distinct wells of a 384-well plate in random order."""
+    return [lw.int_to_str_384(int(i)) for i in rng.permutation(384)[:n]]
+
+
+def pm_csv(path: str) -> None:
+    """Plate merging well map, 600 wells from 4 source plates into 2 target plates."""
+    rng = np.random.default_rng(SEED)
+    sources = [(w, f"S{i}") for i in range(4) for w in random_wells(rng, 150)]
+    targets = [(w, "T0") for w in lw.pos_col_384()]
+    targets += [(w, "T1") for w in lw.pos_col_384(216)]
+    with open(path, "wt", encoding="utf-8") as f:
+        for (source, source_plate), (target, target_plate) in zip(sources, targets):
+            f.write(f"{source},{source_plate},{target},{target_plate}\n")
+
+
+def cherry_csv(path: str) -> None:
+    """Cherry picking well map, 300 wells from 6 source plates."""
+    rng = np.random.default_rng(SEED)
+    wells = [(w, f"P{i:02}") for i in range(6) for w in random_wells(rng, 50)]
+    with open(path, "wt", encoding="utf-8") as f:
+        f.write("id,plate,well,target\n")
+        for i, ((well, plate), target) in enumerate(zip(wells, lw.pos_row_384(300))):
+            f.write(f"{i},{plate},{well},{target}\n")
+
+
+def nanopore_csv(path: str) -> None:
+    """Concentrations (ng/uL) and fragment lengths (bp) of 16 samples."""
+    with open(path, "wt", encoding="utf-8") as f:
+        for i in range(16):
+            f.write(f"S{i},{20 + i},{800 + 10 * i}\n")
+
+
+# Input CSV of each method
+INPUTS = {
+    "cherry_picking": cherry_csv,
+    "lib_nanopore": nanopore_csv,
+    "pm_emptying": pm_csv,
+    "pm_filling": pm_csv,
+}
+
+
+@contextlib.contextmanager
+def canned_input(answers: dict[str, str]):
+    """Answer prompts from answers, failing if a prompt is repeated too often."""
+    asked = []
+
+    def answer(prompt: str = "") -> str:
+        asked.append(prompt)
+        if asked[-MAX_PROMPTS:] == [prompt] * MAX_PROMPTS:
+            raise RuntimeError(f"Prompt repeated, check answers: {prompt}")
+        for message, value in answers.items():
+            if prompt.startswith(message):
+                return value
+        return ""
+
+    interactive = builtins.input
+    builtins.input = answer
+    try:
+        yield
+    finally:
+        builtins.input = interactive
+
+
+@contextlib.contextmanager
+def counting(module, names: list[str], counts: collections.Counter):
+    """Count calls of functions in module."""
+    functions = {name: getattr(module, name) for name in names}
+
+    def counter(name, fn):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    for name, fn in functions.items():
+        setattr(module, name, counter(name, fn))
+    try:
+        yield
+    finally:
+        for name, fn in functions.items():
+            setattr(module, name, fn)
+
+
+def run_method(method: str, tmp_dir_path: str, trace: bool = False) -> dict:
+    """
+    Run method once against the simulator, returning commands, CPU time in s, state
+    writes and peak allocations in bytes if traced.
+    """
+    script = importlib.import_module(method)
+    answers = dict(ANSWERS[method])
+    if method in INPUTS:
+        csv_path = os.path.join(tmp_dir_path, f"{method}.csv")
+        INPUTS[method](csv_path)
+        answers = {k: v.format(csv=csv_path) for k, v in answers.items()}
+
+    counts = collections.Counter()
+    with (
+        canned_input(answers),
+        counting(st, ["set_state", "save_state", "write_well_index"], counts),
+        contextlib.redirect_stdout(io.StringIO()),
+    ):
+        if trace:
+            tracemalloc.start()
+        start = time.process_time()
+        ham, _ = es.estimate_method(
+            script,
+            method,
+            os.path.join(layout_dir_path, f"{method}.lay"),
+            os.path.join(state_dir_path, f"{method}.json"),
+            os.path.join(tmp_dir_path, "cache"),
+            store=True,
+        )
+        cpu = time.process_time() - start
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    # Journal writes are set_state calls, saves replace state or well index files
+    return {
+        "commands": len([c for c in ham.history if c[0] != "SLEEP"]),
+        "cpu": cpu,
+        "state writes": counts["set_state"],
+        "file saves": counts["save_state"] + counts["write_well_index"],
+        "peak": peak if trace else None,
+    }
+
+
+def format_bytes(size: float) -> str:
+    """Format bytes with unit."""
+    for unit, scale in [("GB", 1e9), ("MB", 1e6), ("kB", 1e3)]:
+        if size >= scale:
+            return f"{size / scale:.1f} {unit}"
+    return f"{size:.0f} B"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark methods end to end.")
+    parser.add_argument("-k", default="", help="only run methods containing this")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per method")
+    parser.add_argument("--no-save", action="store_true", help="do not save results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="relative slowdown which counts as a regression",
+    )
+    args = parser.parse_args()
+
+    methods = [
+        f[:-4]
+        for f in sorted(os.listdir(layout_dir_path))
+        if f.endswith(".lay") and args.k in f and f[:-4] in ANSWERS
+    ]
+
+    host = platform.node()
+    python = platform.python_version()
+    previous = last_results(host, python)
+
+    print(
+        f"{'method':<18}{'commands':<10}{'CPU':<10}{'CPU/cmd':<12}{'change':<10}"
+        f"{'peak':<10}{'writes':<8}{'saves':<8}"
+    )
+    print(f"{'-' * 86}")
+    results = {}
+    regressions = []
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        for method in methods:
+            # First run parses the layout into the deck cache and imports the method
+            # Methods exit on invalid input, which is reported like other errors
+            try:
+                run_method(method, tmp_dir_path)
+            except (Exception, SystemExit) as e:
+                failures.append(method)
+                print(f"{method:<18}failed: {type(e).__name__}: {e}")
+                continue
+            runs = [run_method(method, tmp_dir_path) for _ in range(args.runs)]
+            traced = run_method(method, tmp_dir_path, trace=True)
+
+            run = runs[0]
+            cpu = statistics.median(r["cpu"] for r in runs)
+            per_command = cpu / max(run["commands"], 1)
+            results[f"method cpu/command {method}"] = per_command
+            results[f"method peak {method}"] = traced["peak"]
+
+            change = ""
+            if f"method cpu/command {method}" in previous:
+                ratio = per_command / previous[f"method cpu/command {method}"] - 1
+                change = f"{ratio:+.0%}"
+                if ratio > args.threshold:
+                    regressions.append(method)
+                    change += " !"
+            print(
+                f"{method:<18}{run['commands']:<10}{format_time(cpu):<10}"
+                f"{format_time(per_command):<12}{change:<10}"
+                f"{format_bytes(traced['peak']):<10}{run['state writes']:<8}"
+                f"{run['file saves']:<8}"
+            )
+    print(f"{'-' * 86}")
+
+    if not args.no_save:
+        record = {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "host": host,
+            "python": python,
+            "results": results,
+        }
+        with open(results_path, "at", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        print(f"Results saved to: {results_path}")
+
+    if failures:
+        print(f"Methods failed in simulator: {failures}")
+    if regressions:
+        print(f"CPU per command up by over {args.threshold:.0%}: {regressions}")
+    if failures or regressions:
+        sys.exit(1)
@@ -0,0 +1,109 @@
+"""
+Benchmark time to first prompt of main.py. main.py is deployed to a temporary directory
+laid out as on the Hamilton PC, started repeatedly and timed until the method prompt is
+printed, then started once with python -X importtime to list the modules imported before
+the prompt. Fails if the median time is over budget or a heavy module is imported before
+the prompt. The import check also runs with the tests (tests/test_startup.py).
+
+Usage: python benchmarks/startup.py [runs]
+"""
+
+# Imports
+import os, sys, subprocess, statistics, shutil, tempfile, time
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+package_dir_path = os.path.join(root, "parseqpyhamilton")
+
+# Time to first prompt in s
+BUDGET = 0.1
+
+# Modules which must not be imported before the first prompt
+HEAVY = ["pandas", "numpy", "pyhamilton", "requests"]
+
+# Printed by main.py once methods are listed
+PROMPT = b"Method id: "
+
+
+def deploy(dir_path: str) -> None:
+    """Copy main.py, lib and methods (as scripts) to dir_path, as on the Hamilton PC."""
+    ignore = shutil.ignore_patterns("__pycache__")
+    shutil.copy(os.path.join(package_dir_path, "main.py"), dir_path)
+    shutil.copytree(
+        os.path.join(package_dir_path, "lib"),
+        os.path.join(dir_path, "lib"),
+        ignore=ignore,
+    )
+    shutil.copytree(
+        os.path.join(package_dir_path, "methods"),
+        os.path.join(dir_path, "scripts"),
+        ignore=ignore,
+    )
+
+
+def start_main(dir_path: str, *flags: str) -> tuple[subprocess.Popen, float]:
+    """
+    Start main.py deployed to dir_path and wait for the first prompt, returning process
+    and time in s.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, *flags, "main.py"],
+        cwd=dir_path,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output = b""
+    while not output.endswith(PROMPT):
+        char = process.stdout.read(1)
+        if not char:
+            raise RuntimeError(f"main.py exited before prompt: {process.stderr.read()}")
+        output += char
+
+    return process, time.perf_counter() - start
+
+
+def stop_main(process: subprocess.Popen) -> bytes:
+    """Close stdin of main.py so the prompt fails, returning stderr."""
+    _, stderr = process.communicate(b"")
+    return stderr
+
+
+def imported_modules(stderr: bytes) -> list[str]:
+    """Top-level packages listed in python -X importtime output."""
+    modules = set()
+    for line in stderr.decode(errors="replace").splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            modules.add(name.split(".")[0])
+    return sorted(modules)
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as tmp_dir_path:
+        deploy(tmp_dir_path)
+
+        times = []
+        for _ in range(runs):
+            process, seconds = start_main(tmp_dir_path)
+            stop_main(process)
+            times.append(seconds)
+
+        process, _ = start_main(tmp_dir_path, "-X", "importtime")
+        heavy = [m for m in imported_modules(stop_main(process)) if m in HEAVY]
+
+    median = statistics.median(times)
+    print(f"{'benchmark':<40}{'median':<15}{'min':<15}{'budget':<10}")
+    print(f"{'-' * 80}")
+    print(
+        f"{'time to first prompt':<40}{median * 1e3:<15.1f}"
+        f"{min(times) * 1e3:<15.1f}{BUDGET * 1e3:<10.0f}"
+    )
+    print(f"{'-' * 80}")
+    print(f"Heavy modules imported before prompt: {heavy or 'none'}")
+
+    if median > BUDGET or heavy:
+        sys.exit(1)
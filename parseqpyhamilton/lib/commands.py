@@ -5,11 +5,15 @@ Default command templates are defined as dict entries to easily modify common pa
 
 # Imports
 import logging
+import contextlib
+import time
 from typing import Optional
 
 # Classes
 from pyhamilton import HamiltonInterface, HamiltonCmdTemplate, Plate96, Plate384, Tip96
-from .labware import Tip384, Reservoir300, Lid, EppiCarrier24
+from labware import Tip384, Reservoir300, Lid, EppiCarrier24
+
+import state as st
 
 # Logging
 logger = logging.getLogger(__name__)
@@ -57,23 +61,170 @@ def compound_pos_str(pos_tuples: list) -> str:
     )
 
 
+# Pipelined mode
+# Command ids sent by interfaces in pipelined mode, not yet waited on
+pipelines: dict[HamiltonInterface, list[str]] = {}
+
+
+@contextlib.contextmanager
+def pipeline(ham: HamiltonInterface):
+    """
+    Send commands without waiting for the previous one to finish, so the next command
+    is prepared and queued while the robot executes the current one. Commands still
+    run in order. Responses are collected at barriers, which are set before every
+    set_state and when leaving the block.
+
+    Barriers are also set when incubation timers start and before user confirmations
+    (see schedule.py and helpers.confirm). Call barrier before anything else that needs
+    the robot to be done, such as reading labware state back from the robot.
+
+    Args:
+    - ham: Robot interface.
+    """
+    if ham in pipelines:
+        yield ham
+        return
+
+    pipelines[ham] = []
+    hook = lambda: barrier(ham)
+    st.barriers.append(hook)
+    try:
+        yield ham
+    finally:
+        st.barriers.remove(hook)
+        try:
+            barrier(ham)
+        finally:
+            del pipelines[ham]
+
+
+def pipelined(interface):
+    """
+    Wrap an interface class so methods using it run in pipelined mode, see pipeline.
+    Used by main.py and runqueue.py for --pipeline, methods are not changed.
+
+    Args:
+    - interface: Interface class or factory, e.g. HamiltonInterface.
+
+    Returns:
+    - Factory creating the interface like the class, entering pipelined mode with it.
+    """
+
+    @contextlib.contextmanager
+    def start(*args, **kwargs):
+        with interface(*args, **kwargs) as ham, pipeline(ham):
+            yield ham
+
+    return start
+
+
+def barrier(ham: HamiltonInterface) -> None:
+    """
+    Wait for all commands sent in pipelined mode to finish, raising the first error.
+    Commands queued after a failed command are dropped.
+
+    Args:
+    - ham: Robot interface.
+    """
+    pending, pipelines[ham] = pipelines.get(ham, []), []
+    if pending:
+        logger.debug("Barrier: waiting on %s commands", len(pending))
+    for cid in pending:
+        wait(ham, cid)
+
+
+def finish(ham: HamiltonInterface, cid: str) -> str:
+    """
+    Wait for command to finish, or queue it for the next barrier in pipelined mode.
+
+    Args:
+    - ham: Robot interface.
+    - cid: Command id.
+
+    Returns:
+    - Command id.
+    """
+    if ham in pipelines:
+        pipelines[ham].append(cid)
+    else:
+        wait(ham, cid)
+    return cid
+
+
+# Tracing
+# Objects with sent and received methods, called for every command (see tracing.py)
+tracers = []
+
+
+def send(ham: HamiltonInterface, name: str, **cmd_dict) -> str:
+    """
+    Send command from its template and report it to tracers.
+
+    Args:
+    - ham: Robot interface.
+    - name: Command name, see command_templates.
+    - cmd_dict: Command parameters, defaults are taken from the template.
+
+    Returns:
+    - Command id.
+    """
+    start = time.time()
+    try:
+        cid = ham.send_command(commands[name], **cmd_dict)
+    except Exception as e:
+        for tracer in tracers:
+            tracer.sent(None, name, cmd_dict, start, error=e)
+        raise
+
+    for tracer in tracers:
+        tracer.sent(cid, name, cmd_dict, start)
+    return cid
+
+
+def wait(ham: HamiltonInterface, cid: str) -> None:
+    """
+    Wait for command to finish, raising its error, and report response to tracers.
+
+    Args:
+    - ham: Robot interface.
+    - cid: Command id.
+    """
+    try:
+        ham.wait_on_response(cid, raise_first_exception=True)
+    except Exception as e:
+        for tracer in tracers:
+            tracer.received(cid, error=e)
+        raise
+
+    for tracer in tracers:
+        tracer.received(cid)
+
+
 # Commands
-def initialize(ham: HamiltonInterface) -> None:
+# Interfaces kept open across queued methods which are initialized (see runqueue.py)
+initialized = []
+
+
+def initialize(ham: HamiltonInterface) -> str | None:
     """
     Initializes the HamiltonInterface object by sending the 'INITIALIZE' command and waiting for a response.
+    Skipped for interfaces in initialized.
 
     Args:
     - ham (HamiltonInterface): The HamiltonInterface object to be initialized.
 
     Returns:
-    - None
+    - Command id, None if skipped.
     """
+    if any(ham is h for h in initialized):
+        logger.info("Robot already initialized, skipping initialize.")
+        return None
 
     logger.debug("Command: %s", "initialize")
 
-    cid = ham.send_command(commands["INITIALIZE"])
+    cid = send(ham, "INITIALIZE")
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def grip_get(
@@ -81,7 +232,7 @@ def grip_get(
     labware: Plate96 | Plate384 | Lid,
     mode: int = 0,
     **kw_args,
-) -> None:
+) -> str:
     """
     Pick up a plate or lid with the gripper.
 
@@ -100,7 +251,7 @@ def grip_get(
     - checkPlate (integer): 0 or 1, whether to check for plate presence. Defaults to 0.
 
     Returns:
-    - None
+    - Command id.
     """
 
     logger.debug(
@@ -111,15 +262,17 @@ def grip_get(
     transportMode = mode
 
     if mode == 0:
-        cid = ham.send_command(
-            commands["GRIP_GET"],
+        cid = send(
+            ham,
+            "GRIP_GET",
             plateLabwarePositions=labwarePositions,
             transportMode=transportMode,
             **kw_args,
         )
     elif mode == 1:
-        cid = ham.send_command(
-            commands["GRIP_GET"],
+        cid = send(
+            ham,
+            "GRIP_GET",
             lidLabwarePositions=labwarePositions,
             transportMode=transportMode,
             **kw_args,
@@ -127,7 +280,7 @@ def grip_get(
     else:
         raise ValueError
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def grip_place(
@@ -136,7 +289,7 @@ def grip_place(
     mode: int = 0,
     eject: bool = False,
     **kw_args,
-) -> None:
+) -> str:
     """
     Place a plate or lid with the gripper.
 
@@ -165,16 +318,18 @@ def grip_place(
     ejectToolWhenFinish = eject
 
     if mode == 0:
-        cid = ham.send_command(
-            commands["GRIP_PLACE"],
+        cid = send(
+            ham,
+            "GRIP_PLACE",
             plateLabwarePositions=labwarePositions,
             transportMode=transportMode,
             ejectToolWhenFinish=ejectToolWhenFinish,
             **kw_args,
         )
     elif mode == 1:
-        cid = ham.send_command(
-            commands["GRIP_PLACE"],
+        cid = send(
+            ham,
+            "GRIP_PLACE",
             lidLabwarePositions=labwarePositions,
             transportMode=transportMode,
             ejectToolWhenFinish=ejectToolWhenFinish,
@@ -183,14 +338,14 @@ def grip_place(
     else:
         raise ValueError
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def tip_pick_up(
     ham: HamiltonInterface,
     positions: list[tuple[Tip96, int]],
     **kw_args,
-) -> None:
+) -> str:
     """
     Pick up tips (300 or 50 uL) using single channels.
 
@@ -212,14 +367,15 @@ def tip_pick_up(
     else:
         channelVariable = "11"
 
-    cid = ham.send_command(
-        commands["PICKUP"],
+    cid = send(
+        ham,
+        "PICKUP",
         labwarePositions=labwarePositions,
         channelVariable=channelVariable,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def tip_eject(
@@ -227,7 +383,7 @@ def tip_eject(
     positions: Optional[list[tuple[Tip96, int]]] = None,
     waste: bool = False,
     **kw_args,
-) -> None:
+) -> str:
     """
     Eject tips (300 or 50 uL) using single channels.
 
@@ -260,20 +416,21 @@ def tip_eject(
         useDefaultWaste = int(waste)
         labwarePositions = compound_pos_str(positions)
 
-    cid = ham.send_command(
-        commands["EJECT"],
+    cid = send(
+        ham,
+        "EJECT",
         labwarePositions=labwarePositions,
         useDefaultWaste=useDefaultWaste,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def grip_eject(
     ham: HamiltonInterface,
     **kw_args,
-) -> None:
+) -> str:
     """
     Eject the gripper tool.
 
@@ -282,13 +439,14 @@ def grip_eject(
     """
     logger.debug("Command: %s", "grip_eject")
 
-    cid = ham.send_command(
-        commands["EJECT"],
+    cid = send(
+        ham,
+        "EJECT",
         wasteSequence=DEFAULT_GRIP_TOOL_SEQUENCE,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def aspirate(
@@ -299,7 +457,7 @@ def aspirate(
     | list[tuple[Reservoir300, int]],
     volumes: list[float],
     **kw_args,
-) -> None:
+) -> str:
     """
     Aspirate from a plate, carrier or reservoir using single channels.
 
@@ -350,15 +508,16 @@ def aspirate(
 
     labwarePositions = compound_pos_str(positions)
 
-    cid = ham.send_command(
-        commands["ASPIRATE"],
+    cid = send(
+        ham,
+        "ASPIRATE",
         labwarePositions=labwarePositions,
         channelVariable=channelVariable,
         volumes=volumes,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def dispense(
@@ -369,7 +528,7 @@ def dispense(
     | list[tuple[Reservoir300, int]],
     volumes: list[float],
     **kw_args,
-) -> None:
+) -> str:
     """
     Dispense to a plate, carrier or reservoir using single channels.
 
@@ -421,22 +580,23 @@ def dispense(
 
     labwarePositions = compound_pos_str(positions)
 
-    cid = ham.send_command(
-        commands["DISPENSE"],
+    cid = send(
+        ham,
+        "DISPENSE",
         labwarePositions=labwarePositions,
         volumes=volumes,
         channelVariable=channelVariable,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def tip_pick_up_384(
     ham: HamiltonInterface,
     positions: list[tuple[Tip96, int]] | list[tuple[Tip384, int]],
     **kw_args,
-) -> None:
+) -> str:
     """
     Pick up tips (50 uL) using 384 head. Only the first position is sent to the robot to allow for variable head patterns.
 
@@ -454,8 +614,9 @@ def tip_pick_up_384(
 
     labwarePositions = compound_pos_str(positions[:1])
 
-    cid = ham.send_command(
-        commands["PICKUP384"],
+    cid = send(
+        ham,
+        "PICKUP384",
         labwarePositions=labwarePositions,
         tipMode=1,
         reducedPatternMode=1,
@@ -464,7 +625,7 @@ def tip_pick_up_384(
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def tip_eject_384(
@@ -472,7 +633,7 @@ def tip_eject_384(
     positions: Optional[list[tuple[Tip384, int]]] = None,
     mode: int = 0,
     **kw_args,
-) -> None:
+) -> str:
     """
     Eject tips (50 uL) using 384 head.
 
@@ -509,14 +670,15 @@ def tip_eject_384(
     else:
         raise ValueError
 
-    cid = ham.send_command(
-        commands["EJECT384"],
+    cid = send(
+        ham,
+        "EJECT384",
         labwarePositions=labwarePositions,
         tipEjectToKnownPosition=tipEjectToKnownPosition,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def aspirate_384(
@@ -526,7 +688,7 @@ def aspirate_384(
     | list[tuple[Reservoir300, int]],
     volume: float,
     **kw_args,
-) -> None:
+) -> str:
     """
     Aspirate from a plate or reservoir using 384 head.
 
@@ -561,14 +723,15 @@ def aspirate_384(
 
     labwarePositions = compound_pos_str(positions[:1])
 
-    cid = ham.send_command(
-        commands["ASPIRATE384"],
+    cid = send(
+        ham,
+        "ASPIRATE384",
         labwarePositions=labwarePositions,
         aspirateVolume=volume,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def dispense_384(
@@ -578,7 +741,7 @@ def dispense_384(
     | list[tuple[Reservoir300, int]],
     volume: float,
     **kw_args,
-) -> None:
+) -> str:
     """
     Dispense to a plate or reservoir using 384 head.
 
@@ -615,21 +778,22 @@ def dispense_384(
 
     labwarePositions = compound_pos_str(positions[:1])
 
-    cid = ham.send_command(
-        commands["DISPENSE384"],
+    cid = send(
+        ham,
+        "DISPENSE384",
         labwarePositions=labwarePositions,
         dispenseVolume=volume,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def grip_get_tip_rack(
     ham: HamiltonInterface,
     labware: Tip96 | Tip384,
     **kw_args,
-) -> None:
+) -> str:
     """
     Pick up a tip rack with the gripper.
 
@@ -653,8 +817,9 @@ def grip_get_tip_rack(
     else:
         raise TypeError
 
-    cid = ham.send_command(
-        commands["GRIP_GET"],
+    cid = send(
+        ham,
+        "GRIP_GET",
         plateLabwarePositions=labwarePositions,
         gripForce=9,
         gripHeight=gripHeight,
@@ -662,7 +827,7 @@ def grip_get_tip_rack(
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 def grip_place_tip_rack(
@@ -671,7 +836,7 @@ def grip_place_tip_rack(
     waste: bool = False,
     eject: bool = False,
     **kw_args,
-) -> None:
+) -> str:
     """
     Place a tip rack with the gripper.
 
@@ -706,15 +871,16 @@ def grip_place_tip_rack(
         plateSequence = ""
         labwarePositions = labware_pos_str(labware, 0)
 
-    cid = ham.send_command(
-        commands["GRIP_PLACE"],
+    cid = send(
+        ham,
+        "GRIP_PLACE",
         plateSequence=plateSequence,
         plateLabwarePositions=labwarePositions,
         ejectToolWhenFinish=ejectToolWhenFinish,
         **kw_args,
     )
 
-    ham.wait_on_response(cid, raise_first_exception=True)
+    return finish(ham, cid)
 
 
 # Default command templates
@@ -898,9 +1064,11 @@ command_templates: dict[str, tuple[str, dict]] = {
     ),
 }
 
-# Make commands available locally
+# Make commands available locally, defaults are taken from templates above
 commands = {}
 for command, template in command_templates.items():
     command_name, command_dict = template
-    command = HamiltonCmdTemplate(template, list(command_dict.keys()))
-    commands[command_name] = command
+    commands[command_name] = HamiltonCmdTemplate(command, list(command_dict.keys()))
+    commands[command_name].defaults = {
+        k: v for k, v in command_dict.items() if v is not None
+    }
@@ -1,12 +1,11 @@
-import logging, sys, shelve
+import logging, sys, os, shelve, json, hashlib, filecmp
 
 import labware as lw
+import motion as mo
 
-from pyhamilton import LayoutManager, ResourceType, Plate96, Plate384, Tip96
+from pyhamilton import LayoutManager, Plate96, Plate384, Tip96, OEM_LAY_PATH
 from labware import Tip384, Reservoir300, Lid, EppiCarrier24
 
-from pyhamilton.oemerr import ResourceUnavailableError
-
 # Logging
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -23,6 +22,9 @@ TYPES = {
     "EppiCarrier24": EppiCarrier24,
 }
 
+# Maximum number of parsed decks kept in cache, least recently used are evicted
+CACHE_SIZE = 16
+
 # Empty deck dictionary in dict["Column": list[rows]] format
 # labware list for PyHamilton objects
 # frame list for DataFrames provided by labware module
@@ -70,28 +72,190 @@ DECK = {
 }
 
 
-def get_deck(layout_file_path: str) -> dict:
+def new_deck() -> dict:
+    """Empty deck dictionary with the slots of DECK, which is never filled itself."""
+    return {
+        col: [{"labware": None, "frame": None} for _ in slots]
+        for col, slots in DECK.items()
+    }
+
+
+def get_deck(layout_file_path: str, install: bool = True) -> dict:
     """Get deck from provided layout file. Returns deck dictionary.
+    Labware coordinates are read from the layout file, see add_coordinates.
+    Each call parses into a new deck, so decks can be parsed in a background thread.
 
     Args:
         - layout_file_path: Path to layout file.
+        - install: Install layout file for Hamilton software. Defaults to True.
 
     Returns:
         - dict: Deck dictionary with labware.
     """
     logger.debug(f"Getting deck from: {layout_file_path}")
-    lmgr = LayoutManager(layout_file_path)
+    lmgr = LayoutManager(layout_file_path, install=install)
 
-    deck = parse_layout_file(DECK, lmgr)
+    deck = parse_layout_file(new_deck(), lmgr)
     deck = clean_deck(deck)
+    add_coordinates(deck, mo.read_coordinates(layout_file_path))
+
+    return deck
+
+
+def get_cached_deck(
+    layout_file_path: str,
+    cache_dir_path: str,
+    cache: bool = True,
+    install: bool = True,
+    policy: str = "first",
+) -> dict:
+    """Get deck with dataframes from provided layout file, using a cache of parsed decks.
+    Cached decks are keyed by layout file contents, labware classes and TYPES.
+
+    Args:
+        - layout_file_path: Path to layout file.
+        - cache_dir_path: Path to cache directory.
+        - cache: Use cache, otherwise parse layout file.
+        - install: Install layout file for Hamilton software. Defaults to True.
+        - policy: Tip allocation policy of tip racks, see labware.TIP_POLICIES.
+
+    Returns:
+        - dict: Deck dictionary with labware and dataframes.
+    """
+    if not cache:
+        return add_dataframes(get_deck(layout_file_path, install), policy)
+
+    key = deck_cache_key(layout_file_path)
+    cache_path = os.path.join(cache_dir_path, f"{key}.json")
+
+    try:
+        with open(cache_path, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        logger.debug(f"Deck not found in cache: {e}")
+    else:
+        logger.debug(f"Getting deck from cache: {cache_path}")
+        os.utime(cache_path)
+        if install:
+            install_layout(layout_file_path)
+        return add_dataframes(deck_from_snapshot(snapshot), policy)
+
+    deck = get_deck(layout_file_path, install)
+
+    # Write to temporary file first so an interrupted write never leaves a partial entry
+    os.makedirs(cache_dir_path, exist_ok=True)
+    with open(f"{cache_path}.tmp", "wt", encoding="utf-8") as f:
+        json.dump(deck_to_snapshot(deck), f)
+    os.replace(f"{cache_path}.tmp", cache_path)
+
+    evict_deck_cache(cache_dir_path)
+
+    return add_dataframes(deck, policy)
+
+
+def deck_to_snapshot(deck: dict) -> dict:
+    """Labware in deck as [TYPES key, layout name, coordinates] lists for caching."""
+    names = {resource: name for name, resource in TYPES.items()}
+    return {
+        col: [
+            [
+                [
+                    names[type(labware)],
+                    labware.layout_name(),
+                    getattr(labware, "coordinates", None),
+                ]
+                for labware in slot["labware"]
+            ]
+            for slot in deck[col]
+        ]
+        for col in deck.keys()
+    }
+
+
+def deck_from_snapshot(snapshot: dict) -> dict:
+    """Rebuild deck with labware and their coordinates from a cached snapshot."""
+    deck = {}
+    for col, slots in snapshot.items():
+        deck[col] = []
+        for slot in slots:
+            resources = []
+            for name, layout_name, coordinates in slot:
+                labware = TYPES[name](layout_name)
+                labware.coordinates = coordinates and tuple(coordinates)
+                resources.append(labware)
+            deck[col].append({"labware": resources, "frame": None})
 
     return deck
 
 
+def add_coordinates(deck: dict, coordinates: dict) -> None:
+    """Set deck coordinates of each labware in mm as its coordinates attribute, in
+    (x, y) format or None if not found in the layout file (see motion.py).
+
+    Args:
+        - deck: Deck dictionary with labware.
+        - coordinates: Labware coordinates in {layout name: (x, y)} format.
+    """
+    for col in deck.keys():
+        for slot in deck[col]:
+            for labware in slot["labware"]:
+                labware.coordinates = coordinates.get(labware.layout_name())
+
+
+def deck_coordinates(deck: shelve.Shelf | dict) -> dict:
+    """Coordinates of labware in deck in {layout name: (x, y)} format, e.g. to time
+    simulated moves between labware (see simulator.py)."""
+    return {
+        labware.layout_name(): labware.coordinates
+        for col in deck.keys()
+        for slot in deck[col]
+        for labware in slot["labware"]
+        if getattr(labware, "coordinates", None) is not None
+    }
+
+
+def deck_cache_key(layout_file_path: str) -> str:
+    """Hash of layout file, labware and deck modules and TYPES map."""
+    digest = hashlib.sha256()
+    for path in [layout_file_path, lw.__file__, __file__]:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    for name, resource in TYPES.items():
+        digest.update(f"{name}={resource.__module__}.{resource.__qualname__};".encode())
+
+    return digest.hexdigest()
+
+
+def evict_deck_cache(cache_dir_path: str, size: int = CACHE_SIZE) -> None:
+    """Remove least recently used decks from cache, keeping size decks."""
+    entries = [
+        os.path.join(cache_dir_path, f)
+        for f in os.listdir(cache_dir_path)
+        if f.endswith(".json")
+    ]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[size:]:
+        logger.debug(f"Evicting deck from cache: {path}")
+        os.remove(path)
+
+
+def install_layout(layout_file_path: str) -> None:
+    """
+    Install layout file for Hamilton software, as done by LayoutManager when parsing.
+    Skipped if installed layout file is identical.
+    """
+    if os.path.exists(OEM_LAY_PATH) and filecmp.cmp(
+        layout_file_path, OEM_LAY_PATH, shallow=False
+    ):
+        return
+    LayoutManager(layout_file_path)
+
+
 def parse_layout_file(deck: dict, lmgr: LayoutManager) -> dict:
     """
     Parse provided layout file, extracting valid labware into default deck dictionary.
     Labware in layout file must named according to scheme provided in documentation.
+    Layout lines are read once and indexed by deck position and labware type.
 
     Args:
         - deck: Empty deck dictionary.
@@ -101,28 +265,43 @@ def parse_layout_file(deck: dict, lmgr: LayoutManager) -> dict:
         - dict: Deck dictionary with labware.
     """
     logger.debug(f"Parsing layout file...")
+    positions = {
+        col + str(row + 1) for col in deck.keys() for row in range(len(deck[col]))
+    }
+
+    # Index unique labware names in {position: {resource: [names]}} format
+    # Each name is assigned to the first matching resource type in TYPES order
+    index = {}
+    seen = set()
+    for line in lmgr.lines:
+        name = LayoutManager.name_from_line(line)
+        if not name or name in seen:
+            continue
+        seen.add(name)
+
+        # Deck positions are two characters (A1-F5)
+        position = name[:2]
+        if position not in positions:
+            continue
+        for resource in TYPES.values():
+            if extract_resource_from_field(name, resource, position):
+                index.setdefault(position, {}).setdefault(resource, []).append(name)
+                break
+
     for col in deck.keys():
         for row in range(len(deck[col])):
             position = col + str(row + 1)
             resource_list = []
 
+            # Labware of the same type is ordered by layout name
             for resource in TYPES.values():
-                resource_test = lambda line: extract_resource_from_field(
-                    LayoutManager.name_from_line(line), resource, position
-                )
-                resource_type = ResourceType(
-                    resource, resource_test, LayoutManager.name_from_line
-                )
-                while True:
-                    try:
-                        resource_list.append(
-                            LayoutManager.assign_unused_resource(
-                                lmgr, resource_type, reverse=False
-                            )
-                        )
-                    except ResourceUnavailableError:
-                        logger.debug(f"Resource {resource} not found in {position}.")
-                        break
+                names = sorted(index.get(position, {}).get(resource, []))
+                if not names:
+                    logger.debug(f"Resource {resource} not found in {position}.")
+                for name in names:
+                    labware = resource(name)
+                    lmgr.resources[name] = labware
+                    resource_list.append(labware)
 
             deck[col][row]["labware"] = resource_list
 
@@ -157,12 +336,13 @@ def clean_deck(deck: dict) -> dict:
     return deck
 
 
-def add_dataframes(deck: dict) -> dict:
+def add_dataframes(deck: dict, policy: str = "first") -> dict:
     """
     Assign labware classes (DataFrame wrapper) to objects in deck.
 
     Args:
         - deck: Deck dictionary with labware.
+        - policy: Tip allocation policy of tip racks. Defaults to "first".
 
     Returns:
         - dict: Deck dictionary with labware and dataframes.
@@ -172,7 +352,7 @@ def add_dataframes(deck: dict) -> dict:
         for row in range(len(deck[col])):
             frames = []
             for labware in deck[col][row]["labware"]:
-                frame = lw.assign_labware(labware)
+                frame = lw.assign_labware(labware, policy)
                 frames.append(frame)
             deck[col][row]["frame"] = frames
 
@@ -196,6 +376,24 @@ def print_deck(shelf: shelve.Shelf | dict) -> None:
                     print(f"{labware.layout_name()[3:]}")
 
 
+def report_tip_policies(shelf: shelve.Shelf | dict) -> None:
+    """Log rack swaps each tip allocation policy would save over recorded pickups.
+
+    Args:
+        - shelf: Shelf or dictionary with deck contents.
+    """
+    logger.debug(f"Comparing tip allocation policies...")
+    for col in shelf.keys():
+        for row in range(0, len(shelf[col])):
+            for frame in shelf[col][row].get("frame", []):
+                if isinstance(frame, lw.tip_96) and frame.pickups:
+                    saved = lw.compare_tip_policies(frame.pickups)
+                    logger.info(
+                        f"Rack swaps saved over first-fit in"
+                        f" {frame.rack.layout_name()}: {saved}"
+                    )
+
+
 def delete_lids(shelf: shelve.Shelf, position: str) -> None:
     """
     Deletes lids from stacks of plates with lids.
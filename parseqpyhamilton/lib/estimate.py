@@ -0,0 +1,170 @@
+"""
+This module estimates method runtimes without a robot. Methods are run against the
+simulator in a temporary run directory, incubations advance the virtual clock and a
+report with per-step times and labware counts is printed. Arm travel between labware is
+timed from the deck coordinates in the layout file (see motion.py).
+"""
+
+# Imports
+import logging, os, shutil, tempfile, datetime, types, time
+from unittest import mock
+
+import deck as dk
+import helpers as hp
+import state as st
+import simulator as sim
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def estimate_method(
+    script: types.ModuleType,
+    method: str,
+    layout_path: str,
+    state_path: str,
+    cache_dir_path: str,
+    durations: dict | None = None,
+    cache: bool = True,
+    store: bool = False,
+    policy: str = "first",
+) -> tuple[sim.HamiltonSimulator, list[tuple[int, str]]]:
+    """Run a method against the simulator, recording all commands and state changes.
+
+    Args:
+        - script: Method module with run function.
+        - method: Method name.
+        - layout_path: Path to layout file.
+        - state_path: Path to default state file.
+        - cache_dir_path: Path to deck cache directory.
+        - durations: Command durations in s, replacing simulator defaults.
+        - cache: Use deck cache. Defaults to True.
+        - store: Keep deck in a deck store in the run directory as main.py does, so
+        deck writes are included. Defaults to False.
+        - policy: Tip allocation policy of tip racks. Defaults to "first".
+
+    Returns:
+        - tuple: Simulator and steps in (history index, state key) format.
+    """
+    ham = sim.HamiltonSimulator()
+    for name, duration in (durations or {}).items():
+        if name not in ham.durations:
+            logger.warning(f"Unknown command in durations: {name}")
+        ham.durations[name] = float(duration)
+
+    steps = []
+
+    def observe(key, value):
+        steps.append((len(ham.history), key))
+
+    # Method modules create their own interface and time incubations (see schedule.py)
+    # Only sleep and monotonic of the time module follow the simulator clock
+    interface = script.HamiltonInterface
+    script.HamiltonInterface = lambda *args, **kwargs: ham
+    st.observers.append(observe)
+    hp.notifications = False
+
+    try:
+        with (
+            mock.patch.object(time, "sleep", ham.sleep),
+            mock.patch.object(time, "monotonic", lambda: ham.clock),
+            tempfile.TemporaryDirectory() as run_dir_path,
+        ):
+            run_state_path = os.path.join(run_dir_path, f"{method}.json")
+            shutil.copy(state_path, run_state_path)
+            state = st.load_state(run_state_path)
+
+            # Unless stored, methods work on the deck dictionary directly
+            deck = dk.get_cached_deck(
+                layout_path, cache_dir_path, cache=cache, policy=policy
+            )
+            ham.coordinates = dk.deck_coordinates(deck)
+            if store:
+                labware_path = os.path.join(run_dir_path, method)
+                st.save_deck_state(labware_path, deck)
+                with st.load_deck_state(labware_path) as shelf:
+                    script.run(shelf, state, run_dir_path)
+            else:
+                script.run(deck, state, run_dir_path)
+    finally:
+        script.HamiltonInterface = interface
+        st.observers.remove(observe)
+        hp.notifications = True
+
+    return ham, steps
+
+
+def step_times(
+    ham: sim.HamiltonSimulator, steps: list[tuple[int, str]]
+) -> dict[str, list]:
+    """
+    Group recorded commands into steps, each step ends when its state key is set.
+    Commands after the last state change are grouped under 'end'.
+
+    Returns:
+        - dict: Steps in {key: [commands, seconds]} format, in order of completion.
+    """
+    times = {}
+    start = 0
+    for end, key in steps + [(len(ham.history), "end")]:
+        commands = [c for c in ham.history[start:end] if c[0] != "SLEEP"]
+        seconds = sum(c[3] for c in ham.history[start:end])
+        if end > start:
+            times.setdefault(key, [0, 0.0])
+            times[key][0] += len(commands)
+            times[key][1] += seconds
+        start = end
+
+    return times
+
+
+def labware_counts(ham: sim.HamiltonSimulator) -> dict[str, int]:
+    """Count tips, gripper moves and plates handled in recorded commands."""
+    counts = {
+        "tips (channels)": 0,
+        "tip pickups (384 head)": 0,
+        "gripper moves": 0,
+        "plate moves": 0,
+        "lid moves": 0,
+        "plates handled": 0,
+    }
+    plates = set()
+    for name, command, _, _ in ham.history:
+        if name == "PICKUP":
+            counts["tips (channels)"] += command["channelVariable"].count("1")
+        elif name == "PICKUP384":
+            counts["tip pickups (384 head)"] += 1
+        elif name == "GRIP_GET":
+            counts["gripper moves"] += 1
+            if command["transportMode"] == 1:
+                counts["lid moves"] += 1
+            else:
+                counts["plate moves"] += 1
+                plates.add(command["plateLabwarePositions"].split(", ")[0])
+    counts["plates handled"] = len(plates)
+
+    return counts
+
+
+def print_estimate(ham: sim.HamiltonSimulator, steps: list[tuple[int, str]]) -> None:
+    """Print estimated time per step, total time and labware counts."""
+    print(f"{'step':<40}{'commands':<15}{'time':<25}")
+    print(f"{'-' * 80}")
+    for key, (commands, seconds) in step_times(ham, steps).items():
+        print(f"{key:<40}{commands:<15}{format_seconds(seconds):<25}")
+    print(f"{'-' * 80}")
+
+    commands = len([c for c in ham.history if c[0] != "SLEEP"])
+    incubations = sum(c[3] for c in ham.history if c[0] == "SLEEP")
+    print(f"{'total':<40}{commands:<15}{format_seconds(ham.clock):<25}")
+    print(f"{'incubations':<40}{'':<15}{format_seconds(incubations):<25}")
+    print(f"{'-' * 80}")
+
+    for key, count in labware_counts(ham).items():
+        print(f"{key:<40}{count:<15}")
+
+
+def format_seconds(seconds: float) -> str:
+    """Format seconds as H:MM:SS."""
+    return str(datetime.timedelta(seconds=round(seconds)))
@@ -4,174 +4,364 @@ This module contains helper functions for user interaction and file processing.
 
 import logging
 import os
-import requests
+import sys
 import pandas as pd
 
+import labware as lw
+import notifier as nt
+import state as st
+import visits as vs
+
 # Logging
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Column names of plate merging CSVs (no header)
+PM_COLUMNS = ["source_well", "source_plate", "target_well", "target_plate"]
+
+# Notifications are only printed when disabled (e.g. for runtime estimates)
+notifications = True
+
+# Answers to method prompts from the run config in {key: value} format (see main.py)
+parameters = {}
+
+# Prompts without an answer exit instead of waiting for input when disabled
+interactive = True
+
+# User actions are not waited for when disabled (e.g. for simulations)
+confirmations = True
+
+
+def ask(message: str, key: str | None = None) -> str:
+    """Answer prompt from run config parameters if key is set, otherwise ask user.
+    Exits if there is no answer and prompts are disabled.
+
+    Args:
+        - message: Message to prompt user.
+        - key: Parameter key in run config. Defaults to None.
+
+    Returns:
+        - str: Answer.
+    """
+    if key in parameters:
+        answer = str(parameters[key])
+        print(f"{message}: {answer}")
+        return answer
+
+    if not interactive:
+        logger.error(f"No answer in run config for prompt: {message}.")
+        sys.exit()
+
+    return input(f"{message}: ")
 
-def prompt_file_path(message: str) -> str:
+
+def check_answer(key: str | None, answer: str) -> None:
+    """Exit if an invalid answer came from the run config, it would be repeated."""
+    if key in parameters:
+        logger.error(f"Invalid value for {key} in run config: {answer}.")
+        sys.exit()
+
+
+def check_parameters(schema: dict[str, type], values: dict) -> None:
+    """Exit if run config parameters are not in the schema of a method or can't be
+    converted to their type.
+
+    Args:
+        - schema: Method parameters in {key: type} format.
+        - values: Run config parameters in {key: value} format.
+    """
+    for key, value in values.items():
+        if key not in schema:
+            logger.error(
+                f"Unknown parameter in run config: {key}. Method parameters are"
+                f" {list(schema)}."
+            )
+            sys.exit()
+        try:
+            schema[key](str(value))
+        except ValueError:
+            logger.error(
+                f"Invalid value for {key} in run config: {value}, expected"
+                f" {schema[key].__name__}."
+            )
+            sys.exit()
+
+
+def confirm(message: str) -> None:
+    """Wait for user to confirm an action by pressing enter. Skipped if confirmations
+    are disabled, exits if prompts are disabled.
+
+    Args:
+        - message: Message to prompt user.
+    """
+    if not confirmations:
+        logger.info(f"Not waiting for user: {message}")
+        return
+
+    if not interactive:
+        logger.error(f"Prompts are disabled, can't wait for user: {message}")
+        sys.exit()
+
+    # Robot is done before the user acts on the deck
+    st.wait_barriers()
+    input(message)
+
+
+def prompt_file_path(message: str, key: str | None = None) -> str:
     """Prompt user for file path and check if it exists.
 
     Args:
         - message: Message to prompt user.
+        - key: Parameter key in run config. Defaults to None.
 
     Returns:
         str: Path.
     """
     logger.debug("Prompting for path: %s", message)
     while True:
-        path = input(f"{message}: ")
+        path = ask(message, key)
         if os.path.isfile(path):
             break
         else:
             print("File does not exist.")
+            check_answer(key, path)
 
     logger.debug("Selected path: %s", path)
     return path
 
 
-def prompt_int(message: str, max_v: int, min_v: int = 0) -> int:
+def prompt_int(message: str, max_v: int, min_v: int = 0, key: str | None = None) -> int:
     """Prompt user for integer.
 
     Args:
         - message: Message to prompt user.
         - max: Maximum value.
         - min: Minimum value. Defaults to 0.
+        - key: Parameter key in run config. Defaults to None.
 
     Returns:
         - int: Integer.
     """
     logger.debug("Prompting for integer: %s", message)
     while True:
-        prompt = input(f"{message}: ")
+        prompt = ask(message, key)
         try:
             value = int(prompt)
             if value > max_v:
-                print(f"Please enter an integer smaller than {max}.")
-                continue
+                print(f"Please enter an integer smaller than {max_v}.")
             elif value < min_v:
                 print("Please enter a positive integer.")
-                continue
-            break
+            else:
+                break
         except ValueError:
             print("Please enter an integer.")
+        check_answer(key, prompt)
 
     logger.debug("%s: %s", message, value)
 
     return value
 
 
-def prompt_float(message: str, max_v: float, min_v: float = 0) -> float:
+def prompt_float(
+    message: str, max_v: float, min_v: float = 0, key: str | None = None
+) -> float:
     """Prompt user for float.
 
     Args:
         - message: Message to prompt user.
         - max: Maximum value.
         - min: Minimum value. Defaults to 0.
+        - key: Parameter key in run config. Defaults to None.
 
     Returns:
         - float: Float.
     """
     logger.debug("Prompting for float: %s", message)
     while True:
-        prompt = input(f"{message}: ")
+        prompt = ask(message, key)
         try:
             value = float(prompt)
             if value > max_v:
-                print(f"Please enter a float smaller than {max}.")
-                continue
+                print(f"Please enter a float smaller than {max_v}.")
             elif value < min_v:
                 print("Please enter a positive float.")
-                continue
-            break
+            else:
+                break
         except ValueError:
             print("Please enter a float.")
+        check_answer(key, prompt)
 
     logger.debug("%s: %s", message, value)
 
     return value
 
 
-def process_cherry_csv(csv_path: str, output_dir: str):
-    """Get plate names and wells from input CSV file. Save as CSV file.
-    Sort wells by name and then plate.
+def read_well_map(
+    csv_path: str,
+    names: list[str] | None = None,
+    wells: list[str] = [],
+    plates: list[str] = [],
+    size: int = 384,
+) -> pd.DataFrame:
+    """Read a well map CSV once into typed columns and validate well names.
+
+    Well columns are normalised (A01 to A1) and get an int index column in PyHamilton
+    format ("<column>_index"). Plate columns are categorical, in order of appearance.
+    Exits if a well name is invalid for the plate format.
 
     Args:
         - csv_path: Path to CSV file.
-        - output_dir: Path to output directory.
+        - names: Column names, None if the CSV file has a header.
+        - wells: Columns with well names.
+        - plates: Columns with plate names.
+        - size: Plate format (24, 96 or 384). Defaults to 384.
+
+    Returns:
+        - DataFrame: Well map.
     """
-    logger.debug("Processing CSV at %s.", csv_path)
+    logger.debug("Reading well map at %s.", csv_path)
+
+    df = pd.read_csv(csv_path, names=names, dtype=str, keep_default_na=False)
+
+    for column in wells:
+        index = df[column].str.strip().str.upper().map(lw.str_ints[size])
+        invalid = df.loc[index.isna(), column]
+        if not invalid.empty:
+            logger.error(
+                f"Invalid wells in column {column} for {size}-well plates:"
+                f" {invalid.unique().tolist()[:10]}."
+            )
+            sys.exit()
+        df[f"{column}_index"] = index.astype(int)
+        df[column] = pd.Series(lw.str_indexes[(size, "row")])[index].to_numpy()
+
+    for column in plates:
+        df[column] = pd.Categorical(df[column], categories=df[column].unique())
+
+    logger.debug("Read %s wells from %s.", len(df), csv_path)
 
-    df = pd.read_csv(csv_path)
+    return df
 
-    l = [t for t in df.itertuples(index=False, name=None)]
 
-    p = df["plate"].unique().tolist()
+def check_plates(well_map: pd.DataFrame, column: str, capacity: int) -> None:
+    """Exit if a well map has more plates in column than deck positions for them."""
+    n = well_map[column].nunique()
+    if n > capacity:
+        logger.error(
+            f"Well map has {n} plates in column {column}, deck holds {capacity}."
+        )
+        sys.exit()
 
-    df.to_csv(os.path.join(output_dir, "cherry.csv"), index=False, header=False)
 
-    logger.debug("Saved output CSV to %s.", output_dir)
+def index_wells(
+    well_map: pd.DataFrame, plate: str, columns: str | list[str]
+) -> dict[str, list]:
+    """Group wells by plate once, in order of first appearance.
 
-    return l, p
+    Args:
+        - well_map: Well map, see read_well_map.
+        - plate: Plate column.
+        - columns: Well column, or list of columns for rows of several wells.
 
+    Returns:
+        - dict: Wells in {plate: [wells]} format, JSON serializable.
+    """
+    groups = well_map.groupby(plate, sort=False, observed=True)[columns]
+    return {name: group.to_numpy().tolist() for name, group in groups}
 
-def process_pm_csv(csv_path: str, output_dir: str, prefix: str) -> None:
-    """Get plate names from CSV file. Save as CSV file.
+
+def process_cherry_csv(csv_path: str, output_dir: str) -> pd.DataFrame:
+    """Read and validate cherry picking CSV file, grouped by source plate so each
+    plate is fetched once. Save as CSV file.
 
     Args:
         - csv_path: Path to CSV file.
         - output_dir: Path to output directory.
+
+    Returns:
+        - DataFrame: Well map with source wells (well), targets and plates.
     """
     logger.debug("Processing CSV at %s.", csv_path)
 
-    df = pd.read_csv(
-        csv_path, names=["source_well", "source_plate", "target_well", "target_plate"]
-    )
+    df = read_well_map(csv_path, wells=["well", "target"], plates=["plate"])
 
-    plates = pd.DataFrame(
-        [df.source_plate.unique(), df.target_plate.unique()], index=["source", "target"]
-    ).T
+    # Plates keep their order of first appearance in the CSV, which is the order they
+    # are stacked in (bottom to top), so interleaved rows do not change the stack
+    df = df.sort_values("plate", kind="stable")
 
-    plates.to_csv(
-        os.path.join(output_dir, f"{prefix}_plate_map.csv"), index=False, header=False
-    )
+    save_well_map(df, os.path.join(output_dir, "cherry.csv"))
 
-    logger.debug("Saved output CSV to %s.", output_dir)
+    return df
 
 
-def notify(text) -> dict:
-    """Send a notification to Slack
+def process_pm_csv(
+    csv_path: str, output_dir: str, prefix: str, order: bool = False
+) -> pd.DataFrame:
+    """Read and validate plate merging CSV file. Save well map and plate map as CSV
+    files.
 
     Args:
-        - text: message to send
+        - csv_path: Path to CSV file.
+        - output_dir: Path to output directory.
+        - prefix: Prefix of output files.
+        - order: Order well map by source and target plate visits. Defaults to False.
 
     Returns:
-        - dict: response from Slack API
+        - DataFrame: Well map with PM_COLUMNS.
     """
-    slack_api_token = os.environ.get(
-        "SLACK_API_TOKEN"
-    )  # set as environment variable on Hamilton PC
-    slack_channel = "#hamilton-events"  # public channel
-    slack_icon_url = (  # icon downloaded from Biorender
-        "https://i.ibb.co/L59D5KZ/Group-2164.png"
+    logger.debug("Processing CSV at %s.", csv_path)
+
+    df = read_well_map(
+        csv_path,
+        PM_COLUMNS,
+        wells=["source_well", "target_well"],
+        plates=["source_plate", "target_plate"],
     )
-    slack_user_name = "Hamilton"
 
+    # Plates are fetched from the top of the stacks (last in CSV) first
+    if order:
+        df = vs.order_well_map(df.iloc[::-1], "source_plate", "target_plate")
+        df = df.iloc[::-1]
+
+    save_well_map(df, os.path.join(output_dir, f"{prefix}_sorted_well_map.csv"))
+    save_plate_map(df, os.path.join(output_dir, f"{prefix}_plate_map.csv"))
+
+    return df
+
+
+def save_well_map(well_map: pd.DataFrame, path: str) -> None:
+    """Save well map as CSV file without header and index columns."""
+    columns = [c for c in well_map.columns if not c.endswith("_index")]
+    well_map.to_csv(path, columns=columns, index=False, header=False)
+
+    logger.debug("Saved well map to %s.", path)
+
+
+def save_plate_map(well_map: pd.DataFrame, path: str) -> None:
+    """Save source and target plates of a plate merging well map as CSV file."""
+    plates = pd.DataFrame(
+        [
+            well_map.source_plate.unique().tolist(),
+            well_map.target_plate.unique().tolist(),
+        ],
+        index=["source", "target"],
+    ).T
+
+    plates.to_csv(path, index=False, header=False)
+
+    logger.debug("Saved plate map to %s.", path)
+
+
+def notify(text) -> None:
+    """Print a notification and send it to Slack in the background (see notifier.py).
+
+    Args:
+        - text: message to send
+    """
     console = text.replace("*", "")  # remove markdown bold formatting
     print(console)
 
-    return requests.post(
-        "https://slack.com/api/chat.postMessage",
-        {
-            "token": slack_api_token,
-            "channel": slack_channel,
-            "text": text,
-            "icon_url": slack_icon_url,
-            "username": slack_user_name,
-            "blocks": None,
-        },
-        timeout=10,
-    ).json()
+    if not notifications:
+        return
+
+    nt.notify(text)
@@ -1,4 +1,5 @@
-import logging, sys, itertools, string
+import logging, sys, collections, string
+import numpy as np
 import pandas as pd
 
 from pyhamilton import Plate96, Plate384, Tip96
@@ -9,31 +10,78 @@ from pyhamilton.deckresource import DeckResource
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Labware formats in (rows, columns) format
+FORMATS = {24: (4, 6), 96: (8, 12), 384: (16, 24)}
+
+# Tip allocation policies for 2-channel pickups, see select_ch2
+# 384-head pickups use "a1" block order with first policy and "fit" otherwise
+TIP_POLICIES = ("first", "best", "reserve")
+
 # Default labware indexes (labware with all positions available)
-default_index_24 = pd.DataFrame(
-    [[i for i in range(j, 24, 6)] for j in range(6)],
-    columns=list(string.ascii_uppercase)[:4],
-    index=range(1, 7),
-).T
-
-default_index_96 = pd.DataFrame(
-    [[i for i in range(j, 96, 8)] for j in range(8)],
-    index=list(string.ascii_uppercase)[:8],
-    columns=range(1, 13),
-)
-
-default_index_384 = pd.DataFrame(
-    [[i for i in range(j, 384, 16)] for j in range(16)],
-    index=list(string.ascii_uppercase)[:16],
-    columns=range(1, 25),
-)
-
-# Reversed 96 format for 384 head custom pick-up
-default_index_96_r = pd.DataFrame(
-    [[i for i in range(j, 96, 8)][::-1] for j in range(8)][::-1],
-    index=list(string.ascii_uppercase)[:8],
-    columns=range(1, 13),
-)
+# Arrays are in (row, column) format, values are int positions used by PyHamilton
+default_index_24 = np.arange(24).reshape(4, 6)
+
+default_index_96 = np.arange(96).reshape(12, 8).T
+
+default_index_384 = np.arange(384).reshape(24, 16).T
+
+# Precomputed string indexes in {(format, order): positions} format
+# Order is "row" (advance along rows then columns) or "col" (along columns then rows)
+str_indexes = {}
+for size, (rows, columns) in FORMATS.items():
+    str_indexes[(size, "row")] = tuple(
+        f"{letter}{number}"
+        for number in range(1, columns + 1)
+        for letter in string.ascii_uppercase[:rows]
+    )
+    str_indexes[(size, "col")] = tuple(
+        f"{letter}{number}"
+        for letter in string.ascii_uppercase[:rows]
+        for number in range(1, columns + 1)
+    )
+
+# Precomputed string to (row, column) lookups, accepts both A1 and A01 formats
+str_coords = {
+    (rows, columns): {
+        f"{string.ascii_uppercase[r]}{c + 1:0{width}d}": (r, c)
+        for r in range(rows)
+        for c in range(columns)
+        for width in [1, 2]
+    }
+    for rows, columns in FORMATS.values()
+}
+
+# Precomputed string to int lookups for conversion functions
+str_ints = {
+    size: {
+        position: r + c * rows
+        for position, (r, c) in str_coords[(rows, columns)].items()
+    }
+    for size, (rows, columns) in FORMATS.items()
+}
+
+# Precomputed 96 in 384 quadrants, see pos_96_in_384
+quadrant_indexes = {
+    q: tuple(
+        j + i * 16 - 1
+        for i in range(0 + q1, 24 + q1, 2)
+        for j in range(1 + q2, 17 + q2, 2)
+    )
+    for q, (q1, q2) in {1: (0, 0), 2: (0, 1), 3: (1, 0), 4: (1, 1)}.items()
+}
+
+quadrant_masks = {
+    q: np.isin(default_index_384, quadrant) for q, quadrant in quadrant_indexes.items()
+}
+
+# Precomputed arrays are shared by all labware, make them read-only
+for array in [
+    default_index_24,
+    default_index_96,
+    default_index_384,
+    *quadrant_masks.values(),
+]:
+    array.setflags(write=False)
 
 
 # Extract tuple from standard labeling format (A1, A01, etc.)
@@ -53,165 +101,347 @@ def pos(position: str):
 # Conversion functions between string (A1, A01, etc.) and integer (0, 1, etc.) format
 def str_to_int_384(position: str) -> int:
     """Convert single 384 position from string to int format."""
-    return string.ascii_uppercase[:16].index(position[0]) + (int(position[1:]) - 1) * 16
+    return str_ints[384][position]
 
 
 def int_to_str_384(position: int) -> str:
     """Convert single 384 position from string to int format."""
-    x, y = int(position) // 16, int(position) % 16
-    return string.ascii_uppercase[:16][y] + str(x + 1)
+    return str_indexes[(384, "row")][int(position)]
 
 
 def str_to_int_96(position: str) -> int:
     """Convert single 96 position from string to int format."""
-    return string.ascii_uppercase[:8].index(position[0]) + (int(position[1:]) - 1) * 8
+    return str_ints[96][position]
 
 
 def int_to_str_96(position: int) -> str:
     """Convert single 96 position from int to string format."""
-    x, y = int(position) // 8, int(position) % 8
-    return string.ascii_uppercase[:8][y] + str(x + 1)
+    return str_indexes[(96, "row")][int(position)]
 
 
 def str_to_int_24(position: str) -> int:
     """Convert single 24 position from string to int format."""
-    return string.ascii_uppercase[:4].index(position[0]) + (int(position[1:]) - 1) * 4
+    return str_ints[24][position]
 
 
 def int_to_str_24(position: int) -> str:
     """Convert single 24 position from int to string format."""
-    x, y = int(position) % 6, int(position) // 6
-    return string.ascii_uppercase[:4][y] + str(x + 1)
+    return str_indexes[(24, "col")][int(position)]
 
 
 # Labware index generators to pass to labware classes
-def pos_row_384(n: int = 384, skip: int = 0) -> list[str]:
+# Slices of precomputed indexes, returned as tuples
+def pos_row_384(n: int = 384, skip: int = 0) -> tuple[str, ...]:
     """
     String index for 384 positions, advance along rows then columns.
     Optionally skip n (default 0) positions in returned index.
     """
-    return [
-        f"{letter}{number}"
-        for number in range(1, 25)
-        for letter in list(string.ascii_uppercase)[:16]
-    ][skip : skip + n]
+    return str_indexes[(384, "row")][skip : skip + n]
 
 
-def pos_col_384(n: int = 384, skip: int = 0) -> list[str]:
+def pos_col_384(n: int = 384, skip: int = 0) -> tuple[str, ...]:
     """
     String index for 384 positions, advance along columns then rows.
     Optionally skip n (default 0) positions in returned index.
     """
-    return [
-        f"{letter}{number}"
-        for letter in list(string.ascii_uppercase)[:16]
-        for number in range(1, 25)
-    ][skip : skip + n]
+    return str_indexes[(384, "col")][skip : skip + n]
 
 
-def pos_row_96(n: int = 96, skip: int = 0) -> list[str]:
+def pos_row_96(n: int = 96, skip: int = 0) -> tuple[str, ...]:
     """
     String index for 96 positions, advance along rows then columns.
     Optionally skip n (default 0) positions in returned index.
     """
-    return [
-        f"{letter}{number}"
-        for number in range(1, 13)
-        for letter in list(string.ascii_uppercase)[:8]
-    ][skip : skip + n]
+    return str_indexes[(96, "row")][skip : skip + n]
 
 
-def pos_col_96(n: int = 96, skip: int = 0) -> list[str]:
+def pos_col_96(n: int = 96, skip: int = 0) -> tuple[str, ...]:
     """
     String index for 96 positions, advance along columns then rows.
     Optionally skip n (default 0) positions in returned index.
     """
-    return [
-        f"{letter}{number}"
-        for letter in list(string.ascii_uppercase)[:8]
-        for number in range(1, 13)
-    ][skip : skip + n]
+    return str_indexes[(96, "col")][skip : skip + n]
 
 
-def pos_row_24(n: int = 24, skip: int = 0) -> list[str]:
+def pos_row_24(n: int = 24, skip: int = 0) -> tuple[str, ...]:
     """
     String index for 24 positions, advance along rows then columns.
     Optionally skip n (default 0) positions in returned index.
     """
-    return [
-        f"{letter}{number}"
-        for number in range(1, 7)
-        for letter in list(string.ascii_uppercase)[:4]
-    ][skip : skip + n]
+    return str_indexes[(24, "row")][skip : skip + n]
 
 
-def pos_col_24(n: int = 24, skip: int = 0) -> list[str]:
+def pos_col_24(n: int = 24, skip: int = 0) -> tuple[str, ...]:
     """
     String index for 24 positions, advance along columns then rows.
     Optionally skip n (default 0) positions in returned index.
     """
-    return [
-        f"{letter}{number}"
-        for letter in list(string.ascii_uppercase)[:4]
-        for number in range(1, 7)
-    ][skip : skip + n]
+    return str_indexes[(24, "col")][skip : skip + n]
 
 
 # Index generators for less common labware formats
-def pos_96_in_384(q: int) -> list[int]:
+def pos_96_in_384(q: int) -> tuple[int, ...]:
     """
     Int index for 96 positions as a subset of a larger 384 position labware.
     Used with 384 head in 96-channel mode. Input argument q gives start position
     for the 96 positions: A01, B01, A02 or B02.
     """
-    pos = []
-    if q == 1:
-        q1, q2 = 0, 0
-    elif q == 2:
-        q1, q2 = 0, 1
-    elif q == 3:
-        q1, q2 = 1, 0
-    else:
-        q1, q2 = 1, 1
+    return quadrant_indexes[q if q in (1, 2, 3) else 4]
 
-    for i in range(0 + q1, 24 + q1, 2):
-        for j in range(1 + q2, 17 + q2, 2):
-            pos.append(j + i * 16 - 1)
-    return pos
 
-
-# Optimized sorting function for 2 channel pipettes
-def sort_list(indexes: list[int], sep: int):
+# Optimized sorting function for multi-channel pipettes
+def sort_list(indexes: list[int], sep: int, channels: int = 2) -> list[int]:
     """
     Sort a list of positions in int format into the best possible order for parallel pipetting.
     Input argument sep is the minimum number of positions needed between 2 channels for parallel
-    pipetting. This depends on labware format (4 for 384 and 1 for 96).
-    """
-    pairs = [
-        pair
-        for pair in itertools.combinations(indexes, 2)
-        if abs(pair[0] - pair[1]) >= sep
-    ]
-    pairs_sorted = sorted(pairs, key=lambda x: x[1])
-    pairs_unique = []
-
-    while pairs_sorted:
-        pair = pairs_sorted[0]
-        pairs_sorted.remove(pair)
-        pairs_unique.append(pair)
-        pairs_sorted = [
-            p for p in pairs_sorted if p[0] not in pair and p[1] not in pair
-        ]
+    pipetting. This depends on labware format (4 for 384 and 1 for 96). Positions are grouped
+    in sets of channels (default 2), adjacent positions in a group are at least sep apart.
+    Positions which can't be grouped are appended in input order. For 2 channels and
+    ascending input the order is the same as the pairwise greedy this replaced, so ch2
+    selects the same positions.
+    """
+    groups = group_list(sorted(indexes), sep, channels)
 
-    sorted_indexes = [i for t in pairs_unique for i in t]
-    unsorted_indexes = [i for i in indexes if i not in sorted_indexes]
+    sorted_indexes = [i for group in groups for i in group]
+    grouped = set(sorted_indexes)
+    unsorted_indexes = [i for i in indexes if i not in grouped]
 
     return sorted_indexes + unsorted_indexes
 
 
+def group_list(positions: list[int], sep: int, channels: int) -> list[list[int]]:
+    """
+    Greedily group sorted positions in sets of channels, each position extends the
+    largest open group it can. Runs in O(n * channels).
+    """
+    # Open groups by size, each queue is ordered by the last position of its groups
+    open_groups = {k: collections.deque() for k in range(1, channels)}
+    groups = []
+
+    for i in positions:
+        group = [i]
+        for k in range(channels - 1, 0, -1):
+            if open_groups[k] and i - open_groups[k][0][-1] >= sep:
+                group = open_groups[k].popleft() + group
+                break
+        if len(group) == channels:
+            groups.append(group)
+        else:
+            open_groups[len(group)].append(group)
+
+    return groups
+
+
+def pair_transfers(
+    transfers: list[tuple[str, str]], shape: tuple[int, int], sep: int
+) -> list[list[int]]:
+    """
+    Group (source well, target well) transfers into 2-channel cycles. Two transfers
+    are paired if their source wells share a column, their target wells share a column
+    and both are at least sep rows apart with the first channel on the lower row.
+    Transfers which can't be paired get a single channel cycle.
+
+    Args:
+        - transfers: Source and target wells in string format, e.g. ("A1", "C3").
+        - shape: Format of source and target plates in (rows, columns) format.
+        - sep: Minimum number of rows between 2 channels (4 for 384 and 1 for 96).
+
+    Returns:
+        - list: Cycles as lists of 1 or 2 indexes into transfers, in input order.
+    """
+    # Only transfers between the same source and target column can be paired
+    columns = collections.defaultdict(list)
+    for i, (source, target) in enumerate(transfers):
+        s_row, s_column = str_to_coords(source, shape)
+        t_row, t_column = str_to_coords(target, shape)
+        columns[(s_column, t_column)].append((s_row, t_row, i))
+
+    # Greedily pair each transfer with the next one far enough away on both plates
+    cycles = []
+    for rows in columns.values():
+        rows.sort()
+        paired = set()
+        for a, (s_row, t_row, i) in enumerate(rows):
+            if i in paired:
+                continue
+            cycle = [i]
+            for s_next, t_next, j in rows[a + 1 :]:
+                if j in paired or s_next - s_row < sep:
+                    continue
+                if t_next - t_row >= sep:
+                    cycle.append(j)
+                    paired.add(j)
+                    break
+            cycles.append(cycle)
+
+    return sorted(cycles)
+
+
+# Occupancy functions used by labware classes
+# Labware state is stored as a boolean array in (row, column) format, True if available
+def str_to_coords(position: str, shape: tuple[int, int]) -> tuple[int, int]:
+    """Convert single position from string to (row, column) format."""
+    return str_coords[shape][position]
+
+
+def fill_mask(positions: list[str], shape: tuple[int, int]) -> np.ndarray:
+    """Boolean occupancy array with only provided positions available."""
+    mask = np.zeros(shape, dtype=bool)
+    for pos in positions:
+        mask[str_to_coords(pos, shape)] = True
+    return mask
+
+
+def remove_mask(mask: np.ndarray, index: np.ndarray, positions: list[int]) -> None:
+    """Make provided int positions unavailable in boolean occupancy array."""
+    mask[np.isin(index, positions)] = False
+
+
+def select_ch2(
+    mask: np.ndarray, index: np.ndarray, n: int, sep: int, policy: str = "first"
+) -> list[int] | None:
+    """
+    Select up to n positions from a column picked by policy:
+
+    - first:    first column with n available positions
+    - best:     column with fewest available positions, at least n (best fit)
+    - reserve:  best fit, full columns are only used once no partial column is left
+
+    Falls back to columns with any available positions, returns None if labware is
+    empty.
+    """
+    if policy not in TIP_POLICIES:
+        raise ValueError(f"Unknown allocation policy: {policy}.")
+
+    counts = mask.sum(axis=0)
+    partial = counts < mask.shape[0]
+    if policy == "reserve" and (counts[partial] > 0).any():
+        counts = np.where(partial, counts, 0)
+
+    columns = np.flatnonzero(counts >= n)
+    if columns.size == 0:
+        columns = np.flatnonzero(counts >= 1)
+        if columns.size == 0:
+            return None
+
+    if policy == "first":
+        column = columns[0]
+    else:
+        column = columns[counts[columns].argmin()]
+    return sort_list(index[mask[:, column], column].tolist(), sep)[:n]
+
+
+def pickup_fits(mask: np.ndarray, mode: str, *args: int) -> bool:
+    """Check if a recorded pickup (ch2 or mph384) can be served from mask."""
+    if mode == "ch2":
+        return int(mask.sum()) >= args[0]
+    return select_rectangle(mask, *args) is not None
+
+
+def area_sums(
+    table: np.ndarray, rows: int, columns: int, shape: tuple[int, int]
+) -> np.ndarray:
+    """Sums of every rows x columns block in shape from a padded summed-area table."""
+    r, c = shape[0] - rows + 1, shape[1] - columns + 1
+    return (
+        table[rows : rows + r, columns : columns + c]
+        - table[:r, columns : columns + c]
+        - table[rows : rows + r, :c]
+        + table[:r, :c]
+    )
+
+
+def summed_area(mask: np.ndarray) -> np.ndarray:
+    """Zero-padded summed-area table of a boolean occupancy array."""
+    table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=int)
+    table[1:, 1:] = mask.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+
+def select_rectangle(
+    mask: np.ndarray, rows: int, columns: int, order: str = "a1", reverse: bool = False
+) -> tuple[int, int] | None:
+    """
+    Find (row, column) of the top left position of a block of rows x columns available
+    positions. Every block is checked at once with a summed-area table. Blocks are
+    ranked by order:
+
+    - a1:   closest to A1, advancing along rows then columns
+    - fit:  fewest available positions bordering the block (least fragmentation)
+
+    Reverse ranks blocks from the last position instead of A1, also used to break ties.
+    Returns None if no block is available.
+    """
+    if not (0 < rows <= mask.shape[0] and 0 < columns <= mask.shape[1]):
+        return None
+
+    sums = area_sums(summed_area(mask), rows, columns, mask.shape)
+    r, c = np.nonzero(sums == rows * columns)
+    if r.size == 0:
+        return None
+
+    keys = (-r, -c) if reverse else (r, c)
+    if order == "fit":
+        # Available positions around block, padded mask makes labware edges unavailable
+        padded = np.pad(mask, 1)
+        border = (
+            area_sums(summed_area(padded), rows + 2, columns + 2, padded.shape)[r, c]
+            - rows * columns
+            - padded[r, c].astype(int)
+            - padded[r, c + columns + 1]
+            - padded[r + rows + 1, c]
+            - padded[r + rows + 1, c + columns + 1]
+        )
+        keys = (*keys, border)
+    elif order != "a1":
+        raise ValueError(f"Unknown block order: {order}.")
+
+    best = np.lexsort(keys)[0]
+    return int(r[best]), int(c[best])
+
+
+def select_mph384(
+    mask: np.ndarray,
+    index: np.ndarray,
+    rows: int,
+    columns: int,
+    order: str = "a1",
+    reverse: bool = False,
+) -> list[int]:
+    """Select a block of rows x columns positions, empty if none is available."""
+    corner = select_rectangle(mask, rows, columns, order, reverse)
+    if corner is None:
+        return []
+    r, c = corner
+    return index[r : r + rows, c : c + columns].flatten().tolist()
+
+
+def select_quadrant(mask: np.ndarray) -> tuple[tuple[int, ...], np.ndarray]:
+    """
+    Select first quadrant (96 in 384 format) with all positions available.
+    Last quadrant is returned if none is complete.
+    """
+    for q in range(1, 5):
+        if mask[quadrant_masks[q]].sum() == 96:
+            break
+    return quadrant_indexes[q], quadrant_masks[q]
+
+
+def mask_frame(mask: np.ndarray) -> pd.DataFrame:
+    """DataFrame filled with 1s and 0s from boolean occupancy array."""
+    return pd.DataFrame(
+        mask.astype(int),
+        index=list(string.ascii_uppercase)[: mask.shape[0]],
+        columns=range(1, mask.shape[1] + 1),
+    )
+
+
 # Function to dynamically assign layout objects to their respective labware classes
-def assign_labware(labware):
+# Tip racks use the provided tip allocation policy, see select_ch2
+def assign_labware(labware, policy: str = "first"):
     labware_class = TYPES[type(labware)]
+    if labware_class == "tip_96":
+        return tip_96(labware, policy)
     return globals()[labware_class](labware)
 
 
@@ -288,7 +518,7 @@ TYPES = {
 }
 
 
-# Labware classes (DataFrame wrappers)
+# Labware classes (boolean array wrappers, DataFrames available for display)
 class tip_384:
     """
     384-tip rack, methods available for accessing positions:
@@ -301,22 +531,20 @@ class tip_384:
         labware: Tip384,
     ) -> None:
         self.rack = labware
-        self.df = pd.DataFrame(
-            1, index=list(string.ascii_uppercase)[:16], columns=range(1, 25)
-        )
-        self.og_df = self.df.copy()
+        self.mask = np.ones((16, 24), dtype=bool)
+        self.og_mask = self.mask.copy()
 
     def reset(self) -> None:
-        """Reset DataFrame to initial state."""
-        self.df = self.og_df.copy()
+        """Reset occupancy to initial state."""
+        self.mask = self.og_mask.copy()
 
     def frame(self) -> pd.DataFrame:
         """Return DataFrame filled with 1s and 0s for display purposes."""
-        return self.df.fillna(0).astype(int)
+        return mask_frame(self.mask)
 
     def full(self) -> list[tuple[Tip384, int]]:
         """Get all available positions."""
-        return [(self.rack, i) for i in default_index_384.values.flatten()]
+        return [(self.rack, i) for i in default_index_384.flatten().tolist()]
 
 
 class plate_384:
@@ -332,67 +560,44 @@ class plate_384:
 
     def __init__(self, labware: Plate384) -> None:
         self.plate = labware
-        self.df = pd.DataFrame(
-            1, index=list(string.ascii_uppercase)[:16], columns=range(1, 25)
-        )
-        self.og_df = self.df.copy()
+        self.mask = np.ones((16, 24), dtype=bool)
+        self.og_mask = self.mask.copy()
 
     def fill(self, positions: list[str]) -> None:
         """Make provided positions available to access functions."""
-        self.df[self.df > 0] = pd.NA
-        for pos in positions:
-            try:
-                row, col = pos[0], int(pos[1:])
-                self.df.loc[row][col] = 1
-            except (IndexError, ValueError, KeyError) as e:
-                logger.error(
-                    "Unable to parse positions. Make sure input is in list[str] format"
-                    " (['A1', 'B02']) or use index generator from labware module."
-                )
-                logger.exception(e)
-                sys.exit()
+        try:
+            self.mask = fill_mask(positions, self.mask.shape)
+        except (IndexError, ValueError, KeyError) as e:
+            logger.error(
+                "Unable to parse positions. Make sure input is in list[str] format"
+                " (['A1', 'B02']) or use index generator from labware module."
+            )
+            logger.exception(e)
+            sys.exit()
 
-        self.df.infer_objects()
-        self.og_df = self.df.copy()
+        self.og_mask = self.mask.copy()
 
     def reset(self) -> None:
-        self.df = self.og_df.copy()
+        self.mask = self.og_mask.copy()
 
     def frame(self) -> pd.DataFrame:
-        return self.df.fillna(0).astype(int)
+        return mask_frame(self.mask)
 
     def total(self) -> int:
-        return int(self.df.sum().sum())
+        return int(self.mask.sum())
 
     def ch2(self, n: int = 2, remove: bool = True) -> list[tuple[Plate384, int]]:
         """Get wells from a plate in 2 channel mode."""
 
-        # Try to get n tips, if less than n tips left try again with 1 tip
-        column = default_index_384.T[self.df.sum(axis=0) >= n].first_valid_index()
-        for _ in range(2):
-            try:
-                row = self.df.T.loc[column] == 1
-            except KeyError:
-                logger.debug(
-                    f"Column with {n} wells not found in"
-                    f" {self.plate.layout_name()}., trying again with 1"
-                    " well."
-                )
-                column = default_index_384.T[
-                    self.df.sum(axis=0) >= 1
-                ].first_valid_index()
-                continue
-            else:
-                break
-        else:
+        # Try to get n wells, if less than n wells left try again with 1 well
+        index = select_ch2(self.mask, default_index_384, n, 4)
+        if index is None:
             logger.error(f"Not enough wells in {self.plate.layout_name()}.")
             sys.exit()
 
-        index = sort_list(default_index_384.T.loc[column][row].tolist(), 4)[:n]
-
-        # Optionally remove wells from df
+        # Optionally remove wells from mask
         if remove:
-            self.df[default_index_384.isin(index)] = pd.NA
+            remove_mask(self.mask, default_index_384, index)
 
         # Check if correct number of wells was found, otherwise fetch another well
         # This happens if the number of wells left in a column is less than n
@@ -402,29 +607,22 @@ class plate_384:
             return wells
         elif n != len(index) and not remove:
             wells = [(self.plate, i) for i in index]
-            self.df[default_index_384.isin(index)] = pd.NA
+            og_mask = self.mask.copy()
+            remove_mask(self.mask, default_index_384, index)
             wells.extend(self.ch2(1, remove=False))
-            self.df[default_index_384.isin(index)] = 1
+            self.mask = og_mask
             return wells
 
         return [(self.plate, i) for i in index]
 
     def mph384(
-        self, rows: int = 1, columns: int = 1, remove: bool = True
+        self, rows: int = 1, columns: int = 1, remove: bool = True, order: str = "a1"
     ) -> list[tuple[Plate384, int]]:
         """Get wells from a 384-well plate in 384-head mode."""
 
         # Find matrix which supports provided row and column dimensions
-        row_df = self.df[self.df.sum(axis=1) >= columns].dropna(axis=1, how="any")
-        column_df = row_df.T[(row_df.T.sum(axis=1) >= rows)].T
-        mask = column_df.iloc[:rows, :columns] == 1
-        index = (
-            default_index_384[mask]
-            .convert_dtypes()
-            .dropna(axis=1, how="all")
-            .dropna(axis=0, how="all")
-            .values.flatten()
-        )
+        # Order is "a1" (closest to A1) or "fit" (least fragmentation)
+        index = select_mph384(self.mask, default_index_384, rows, columns, order)
 
         # Check if matrix actually contains wells
         try:
@@ -435,43 +633,31 @@ class plate_384:
             sys.exit()
 
         if remove:
-            self.df[default_index_384.isin(index)] = pd.NA
+            remove_mask(self.mask, default_index_384, index)
 
         return [(self.plate, i) for i in index]
 
     def quadrant(self, remove: bool = True) -> list[tuple[Plate384, int]]:
         """Get 96 positions from a reservoir with 384-head in 96-channel mode."""
         # Get first quadrant available
-        index, quadrant_df = None, None  # required to check if quadrant is returned
-        for q in range(1, 5):
-            index = pos_96_in_384(q)
-            mask = default_index_384.isin(index)
-            quadrant_df = self.df[mask]
-            if quadrant_df.sum().sum() == 96:
-                break
+        index, quadrant_mask = select_quadrant(self.mask)
 
-        # Check if quadrant was found
-        try:
-            assert index is not None
-            assert quadrant_df is not None
-        except AssertionError as e:
-            logger.error(f"Not enough wells in {self.plate.layout_name()}.")
-            logger.exception(e)
-            sys.exit()
-
-        # Optionally remove positions from df
+        # Optionally remove positions from mask
         if remove:
-            self.df[quadrant_df == 1] = pd.NA
+            self.mask[quadrant_mask] = False
 
         return [(self.plate, i) for i in index]
 
     def static(self, index: list[str]) -> list[tuple[Plate384, int]]:
         """Get specific plate wells from input list."""
-        return [(self.plate, default_index_384.at[i[0], int(i[1:])]) for i in index]
+        return [
+            (self.plate, int(default_index_384[str_to_coords(i, (16, 24))]))
+            for i in index
+        ]
 
     def full(self) -> list[tuple[Plate384, int]]:
         """Get all available positions."""
-        return [(self.plate, i) for i in default_index_384.values.flatten()]
+        return [(self.plate, i) for i in default_index_384.flatten().tolist()]
 
 
 class reservoir_300:
@@ -487,79 +673,51 @@ class reservoir_300:
 
     def __init__(self, labware: Reservoir300) -> None:
         self.reservoir = labware
-        self.df = pd.DataFrame(
-            1, index=list(string.ascii_uppercase)[:16], columns=range(1, 25)
-        )
-        self.og_df = self.df.copy()
+        self.mask = np.ones((16, 24), dtype=bool)
+        self.og_mask = self.mask.copy()
 
     def fill(self, positions: list[str]) -> None:
         """Make provided positions available to access functions."""
-        self.df[self.df > 0] = pd.NA
-        for pos in positions:
-            try:
-                row, col = pos[0], int(pos[1:])
-                self.df.loc[row][col] = 1
-            except (IndexError, ValueError, KeyError) as e:
-                logger.error(
-                    "Unable to parse positions. Make sure input is in list[str] format"
-                    " (['A1', 'B02']) or use index generator from labware module."
-                )
-                logger.exception(e)
-                sys.exit()
+        try:
+            self.mask = fill_mask(positions, self.mask.shape)
+        except (IndexError, ValueError, KeyError) as e:
+            logger.error(
+                "Unable to parse positions. Make sure input is in list[str] format"
+                " (['A1', 'B02']) or use index generator from labware module."
+            )
+            logger.exception(e)
+            sys.exit()
 
-        self.og_df = self.df.copy()
+        self.og_mask = self.mask.copy()
 
     def reset(self) -> None:
-        self.df = self.og_df.copy()
+        self.mask = self.og_mask.copy()
 
     def frame(self) -> pd.DataFrame:
-        return self.df.fillna(0).astype(int)
+        return mask_frame(self.mask)
 
     def total(self) -> int:
-        return int(self.df.sum().sum())
+        return int(self.mask.sum())
 
     def ch2(self, n: int = 2) -> list[tuple[Reservoir300, int]]:
         """Get positions from a reservoir in 2 channel mode."""
 
-        # Try to get n tips, if less than n tips left try again with 1 tip
-        column = default_index_384.T[self.df.sum(axis=0) >= n].first_valid_index()
-        for _ in range(2):
-            try:
-                row = self.df.T.loc[column] == 1
-            except KeyError:
-                logger.debug(
-                    f"Column with {n} positions not found in"
-                    f" {self.reservoir.layout_name()}., trying again with 1"
-                    " position."
-                )
-                column = default_index_384.T[
-                    self.df.sum(axis=0) >= 1
-                ].first_valid_index()
-                continue
-            else:
-                break
-        else:
+        # Try to get n positions, if less than n positions left try again with 1
+        index = select_ch2(self.mask, default_index_384, n, 4)
+        if index is None:
             logger.error(f"Not enough positions in {self.reservoir.layout_name()}.")
             sys.exit()
 
-        index = sort_list(default_index_384.T.loc[column][row].tolist(), 4)[:n]
-
         return [(self.reservoir, pos) for pos in index]
 
-    def mph384(self, rows: int = 1, columns: int = 1) -> list[tuple[Reservoir300, int]]:
+    def mph384(
+        self, rows: int = 1, columns: int = 1, order: str = "a1"
+    ) -> list[tuple[Reservoir300, int]]:
         """Get positions from a reservoir in 384 multi-probe head mode."""
 
         # Find matrix which supports provided row and column dimensions
-        row_df = self.df[self.df.sum(axis=1) >= columns].dropna(axis=1, how="any")
-        column_df = row_df.T[(row_df.T.sum(axis=1) >= rows)].T
-        mask = column_df.iloc[:rows, :columns] == 1
-        index = (
-            default_index_384[mask]
-            .convert_dtypes()
-            .dropna(axis=1, how="all")
-            .dropna(axis=0, how="all")
-            .values.flatten()
-        )
+        # Order is "a1" (closest to A1) or "fit" (least fragmentation)
+        index = select_mph384(self.mask, default_index_384, rows, columns, order)
 
         # Check if matrix actually contains positions
         try:
@@ -574,36 +732,24 @@ class reservoir_300:
         """Get 96 positions from a reservoir with 384-head in 96-channel mode."""
 
         # Get first quadrant available
-        index, quadrant_df = None, None  # required to check if quadrant is returned
-        for q in range(1, 5):
-            index = pos_96_in_384(q)
-            mask = default_index_384.isin(index)
-            quadrant_df = self.df[mask]
-            if quadrant_df.sum().sum() == 96:
-                break
+        index, quadrant_mask = select_quadrant(self.mask)
 
-        # Check if quadrant was found
-        try:
-            assert index is not None
-            assert quadrant_df is not None
-        except AssertionError as e:
-            logger.error(f"Not enough positions in {self.reservoir.layout_name()}.")
-            logger.exception(e)
-            sys.exit()
-
-        # Optionally remove positions from df
+        # Optionally remove positions from mask
         if remove:
-            self.df[quadrant_df == 1] = pd.NA
+            self.mask[quadrant_mask] = False
 
         return [(self.reservoir, i) for i in index]
 
     def static(self, index: list[str]) -> list[tuple[Reservoir300, int]]:
         """Get specific reservoir positions from input list."""
-        return [(self.reservoir, default_index_384.at[i[0], int(i[1:])]) for i in index]
+        return [
+            (self.reservoir, int(default_index_384[str_to_coords(i, (16, 24))]))
+            for i in index
+        ]
 
     def full(self) -> list[tuple[Reservoir300, int]]:
         """Get all available positions."""
-        return [(self.reservoir, i) for i in default_index_384.values.flatten()]
+        return [(self.reservoir, i) for i in default_index_384.flatten().tolist()]
 
 
 class tip_96:
@@ -614,105 +760,86 @@ class tip_96:
     - mph384:     384-head mode (max 96 positions)
     - static:     provided positions
     - full:       all positions
+
+    Policy (first, best or reserve) sets which tips are used first, see select_ch2.
+    Pickups are recorded to compare policies after a run.
     """
 
-    def __init__(self, labware: Tip96) -> None:
+    def __init__(self, labware: Tip96, policy: str = "first") -> None:
         self.rack = labware
-        self.df = pd.DataFrame(
-            1, index=list(string.ascii_uppercase)[:8], columns=range(1, 13)
-        )
-        self.og_df = self.df.copy()
+        self.mask = np.ones((8, 12), dtype=bool)
+        self.og_mask = self.mask.copy()
+        self.policy = policy
+        self.pickups = []
 
     def fill(self, positions: list[str]) -> None:
         """Make provided positions available to access functions."""
-        self.df[self.df > 0] = pd.NA
-        for pos in positions:
-            try:
-                row, col = pos[0], int(pos[1:])
-                self.df.loc[row][col] = 1
-            except (IndexError, ValueError, KeyError) as e:
-                logger.error(
-                    "Unable to parse positions. Make sure input is in list[str] format"
-                    " (['A1', 'B02']) or use index generator from labware module."
-                )
-                logger.exception(e)
-                sys.exit()
+        try:
+            self.mask = fill_mask(positions, self.mask.shape)
+        except (IndexError, ValueError, KeyError) as e:
+            logger.error(
+                "Unable to parse positions. Make sure input is in list[str] format"
+                " (['A1', 'B02']) or use index generator from labware module."
+            )
+            logger.exception(e)
+            sys.exit()
 
-        self.og_df = self.df.copy()
+        self.og_mask = self.mask.copy()
 
     def reset(self) -> None:
-        self.df = self.og_df.copy()
+        self.mask = self.og_mask.copy()
 
     def frame(self) -> pd.DataFrame:
-        return self.df.fillna(0).astype(int)
+        return mask_frame(self.mask)
 
     def total(self) -> int:
-        return int(self.df.sum().sum())
+        return int(self.mask.sum())
 
     def ch2(self, n: int = 2, remove: bool = True) -> list[tuple[Tip96, int]]:
         """Get tips from a 96-tip rack in 2-channel mode."""
 
         # Try to get n tips, if less than n tips left try again with 1 tip
-        column = default_index_96.T[self.df.sum(axis=0) >= n].first_valid_index()
-        for _ in range(2):
-            try:
-                row = self.df.T.loc[column] == 1
-            except KeyError:
-                logger.debug(
-                    f"Column with {n} tips not found in {self.rack.layout_name()}.,"
-                    " trying again with 1 tip."
-                )
-                column = default_index_96.T[
-                    self.df.sum(axis=0) >= 1
-                ].first_valid_index()
-                continue
-            else:
-                break
-        else:
+        index = select_ch2(self.mask, default_index_96, n, 2, self.policy)
+        if index is None:
             logger.error(f"Not enough tips in {self.rack.layout_name()}.")
             sys.exit()
 
-        index = sort_list(default_index_96.T.loc[column][row].tolist(), 2)[:n]
+        # Check if correct number of tips was found, otherwise fetch more tips
+        # This happens if the number of tips left in a column is less than n
+        mask = self.mask.copy()
+        remove_mask(mask, default_index_96, index)
+        while len(index) < n:
+            extra = select_ch2(mask, default_index_96, 1, 2, self.policy)
+            if extra is None:
+                logger.error(f"Not enough tips in {self.rack.layout_name()}.")
+                sys.exit()
+            remove_mask(mask, default_index_96, extra)
+            index.extend(extra)
 
-        # Optionally remove tips from df
+        # Optionally remove tips from mask
         if remove:
-            self.df[default_index_96.isin(index)] = pd.NA
-
-        # Check if correct number of tips was found, otherwise fetch another tip
-        # This happens if the number of tips left in a column is less than n
-        if n != len(index) and remove:
-            tips = [(self.rack, i) for i in index]
-            tips.extend(self.ch2(1))
-            return tips
-        elif n != len(index) and not remove:
-            tips = [(self.rack, i) for i in index]
-            self.df[default_index_96.isin(index)] = pd.NA
-            tips.extend(self.ch2(1, remove=False))
-            self.df[default_index_96.isin(index)] = 1
-            return tips
+            self.mask = mask
+            self.pickups.append(("ch2", n))
 
         return [(self.rack, i) for i in index]
 
     def mph384(
-        self, rows: int = 1, columns: int = 1, remove: bool = True
+        self,
+        rows: int = 1,
+        columns: int = 1,
+        remove: bool = True,
+        order: str | None = None,
     ) -> list[tuple[Tip96, int]]:
         """Get tips from a 96-tip rack in 384-head mode."""
 
         # Find matrix which supports provided row and column dimensions
-        self.df.columns = self.df.columns[
-            ::-1
-        ]  # reverse df to allow 384-head to approach from south
-        row_df = self.df.loc[self.df.sum(axis=1) >= columns].dropna(axis=1, how="any")
-        self.df.columns = self.df.columns[::-1]  # and reverse again for next steps
-        column_df = row_df.T[(row_df.T.sum(axis=1) >= rows)].T
-        column_df.columns = column_df.columns[::-1]
-        mask = column_df.iloc[:rows, :columns] == 1
+        # Rank blocks from last position to allow 384-head to approach from south
+        if order is None:
+            order = "a1" if self.policy == "first" else "fit"
         index = sorted(
-            default_index_96_r[mask]
-            .convert_dtypes()
-            .dropna(axis=1, how="all")
-            .dropna(axis=0, how="all")
-            .values.flatten(),
+            select_mph384(
+                self.mask, default_index_96, rows, columns, order, reverse=True
+            )
         )
 
         # Check if matrix actually contains wells
@@ -722,19 +849,23 @@ class tip_96:
             logger.error(f"Not enough wells in {self.rack.layout_name()}.")
             sys.exit()
 
-        # Optionally remove tips from df
+        # Optionally remove tips from mask
         if remove:
-            self.df[default_index_96.isin(index)] = pd.NA
+            remove_mask(self.mask, default_index_96, index)
+            self.pickups.append(("mph384", rows, columns))
 
         return [(self.rack, i) for i in index]
 
     def static(self, index: list[str]) -> list[tuple[Tip96, int]]:
         """Get specific tips from input list."""
-        return [(self.rack, default_index_96.at[i[0], int(i[1:])]) for i in index]
+        return [
+            (self.rack, int(default_index_96[str_to_coords(i, (8, 12))]))
+            for i in index
+        ]
 
     def full(self) -> list[tuple[Tip96, int]]:
         """Get all available positions."""
-        return [(self.rack, i) for i in default_index_96.values.flatten()]
+        return [(self.rack, i) for i in default_index_96.flatten().tolist()]
 
 
 class plate_96:
@@ -749,64 +880,44 @@ class plate_96:
 
     def __init__(self, labware: Plate96) -> None:
         self.plate = labware
-        self.df = pd.DataFrame(
-            1, index=list(string.ascii_uppercase)[:8], columns=range(1, 13)
-        )
+        self.mask = np.ones((8, 12), dtype=bool)
+        self.og_mask = self.mask.copy()
 
     def fill(self, positions: list[str]) -> None:
         """Make provided positions available to access functions."""
-        self.df[self.df > 0] = pd.NA
-        for pos in positions:
-            try:
-                row, col = pos[0], int(pos[1:])
-                self.df.loc[row][col] = 1
-            except (IndexError, ValueError, KeyError) as e:
-                logger.error(
-                    "Unable to parse positions. Make sure input is in list[str] format"
-                    " (['A1', 'B02']) or use index generator from labware module."
-                )
-                logger.exception(e)
-                sys.exit()
+        try:
+            self.mask = fill_mask(positions, self.mask.shape)
+        except (IndexError, ValueError, KeyError) as e:
+            logger.error(
+                "Unable to parse positions. Make sure input is in list[str] format"
+                " (['A1', 'B02']) or use index generator from labware module."
+            )
+            logger.exception(e)
+            sys.exit()
 
-        self.og_df = self.df.copy()
+        self.og_mask = self.mask.copy()
 
     def reset(self) -> None:
-        self.df = self.og_df.copy()
+        self.mask = self.og_mask.copy()
 
     def frame(self) -> pd.DataFrame:
-        return self.df.fillna(0).astype(int)
+        return mask_frame(self.mask)
 
     def total(self) -> int:
-        return int(self.df.sum().sum())
+        return int(self.mask.sum())
 
     def ch2(self, n: int = 2, remove=True) -> list[tuple[Plate96, int]]:
         """Get wells from a 96-well plate in 2-channel mode."""
 
         # Try to get n wells, if less than n wells left try again with 1 well
-        column = default_index_96.T[self.df.sum(axis=0) >= n].first_valid_index()
-        for _ in range(2):
-            try:
-                row = self.df.T.loc[column] == 1
-            except KeyError:
-                logger.debug(
-                    f"Column with {n} wells not found in"
-                    f" {self.plate.layout_name()}., trying again with 1 well."
-                )
-                column = default_index_96.T[
-                    self.df.sum(axis=0) >= 1
-                ].first_valid_index()
-                continue
-            else:
-                break
-        else:
+        index = select_ch2(self.mask, default_index_96, n, 2)
+        if index is None:
             logger.error(f"Not enough wells in {self.plate.layout_name()}.")
             sys.exit()
 
-        index = sort_list(default_index_96.T.loc[column][row].tolist(), 2)[:n]
-
-        # Optionally remove wells from df
+        # Optionally remove wells from mask
         if remove:
-            self.df[default_index_96.isin(index)] = pd.NA
+            remove_mask(self.mask, default_index_96, index)
 
         # Check if correct number of wells was found, otherwise fetch another well
         # This happens if the number of wells left in a column is less than n
@@ -816,29 +927,22 @@ class plate_96:
             return wells
         elif n != len(index) and not remove:
             wells = [(self.plate, i) for i in index]
-            self.df[default_index_96.isin(index)] = pd.NA
+            og_mask = self.mask.copy()
+            remove_mask(self.mask, default_index_96, index)
             wells.extend(self.ch2(1, remove=False))
-            self.df[default_index_96.isin(index)] = 1
+            self.mask = og_mask
             return wells
 
         return [(self.plate, i) for i in index]
 
     def mph384(
-        self, rows: int = 1, columns: int = 1, remove: bool = True
+        self, rows: int = 1, columns: int = 1, remove: bool = True, order: str = "a1"
     ) -> list[tuple[Plate96, int]]:
         """Get wells from a 96-well plate in 384-head mode."""
 
         # Find matrix which supports provided row and column dimensions
-        row_df = self.df[self.df.sum(axis=1) >= columns].dropna(axis=1, how="any")
-        column_df = row_df.T[(row_df.T.sum(axis=1) >= rows)].T
-        mask = column_df.iloc[:rows, :columns] == 1
-        index = (
-            default_index_96[mask]
-            .convert_dtypes()
-            .dropna(axis=1, how="all")
-            .dropna(axis=0, how="all")
-            .values.flatten()
-        )
+        # Order is "a1" (closest to A1) or "fit" (least fragmentation)
+        index = select_mph384(self.mask, default_index_96, rows, columns, order)
 
         # Check if matrix actually contains wells
         try:
@@ -847,19 +951,22 @@ class plate_96:
             logger.error(f"Not enough wells in {self.plate.layout_name()}.")
             sys.exit()
 
-        # Optionally remove wells from df
+        # Optionally remove wells from mask
         if remove:
-            self.df[default_index_96.isin(index)] = pd.NA
+            remove_mask(self.mask, default_index_96, index)
 
         return [(self.plate, i) for i in index]
 
     def static(self, index: list[str]) -> list[tuple[Plate96, int]]:
         """Get specific plate wells from input list."""
-        return [(self.plate, default_index_96.at[i[0], int(i[1:])]) for i in index]
+        return [
+            (self.plate, int(default_index_96[str_to_coords(i, (8, 12))]))
+            for i in index
+        ]
 
     def full(self):
         """Get all available positions."""
-        return [(self.plate, i) for i in default_index_96.values.flatten()]
+        return [(self.plate, i) for i in default_index_96.flatten().tolist()]
 
 
 class carrier_24:
@@ -875,71 +982,53 @@ class carrier_24:
         labware: EppiCarrier24,
     ) -> None:
         self.carrier = labware
-        self.df = pd.DataFrame(
-            1, index=list(string.ascii_uppercase)[:4], columns=range(1, 7)
-        )
-        self.og_df = self.df.copy()
+        self.mask = np.ones((4, 6), dtype=bool)
+        self.og_mask = self.mask.copy()
 
     def fill(self, positions: list[str]) -> None:
         """Make provided positions available to access functions."""
-        self.df[self.df > 0] = pd.NA
-        for pos in positions:
-            try:
-                row, col = pos[0], int(pos[1:])
-                self.df.loc[row][col] = 1
-            except (IndexError, ValueError, KeyError) as e:
-                logger.error(
-                    "Unable to parse positions. Make sure input is in list[str] format"
-                    " (['A1', 'B02']) or use index generator from labware module."
-                )
-                logger.exception(e)
-                sys.exit()
+        try:
+            self.mask = fill_mask(positions, self.mask.shape)
+        except (IndexError, ValueError, KeyError) as e:
+            logger.error(
+                "Unable to parse positions. Make sure input is in list[str] format"
+                " (['A1', 'B02']) or use index generator from labware module."
+            )
+            logger.exception(e)
+            sys.exit()
 
-        self.og_df = self.df.copy()
+        self.og_mask = self.mask.copy()
 
     def reset(self) -> None:
-        self.df = self.og_df.copy()
+        self.mask = self.og_mask.copy()
 
     def frame(self) -> pd.DataFrame:
-        return self.df.fillna(0).astype(int)
+        return mask_frame(self.mask)
 
     def total(self) -> int:
-        return int(self.df.sum().sum())
+        return int(self.mask.sum())
 
     def ch2(self, n: int = 2, remove=True) -> list[tuple[EppiCarrier24, int]]:
         """Get tubes from a 24-tube carrier in 2-channel mode."""
 
         # Try to get n tubes, if less than n tubes left try again with 1 tube
-        column = default_index_24.T[self.df.sum(axis=0) >= n].first_valid_index()
-        for _ in range(2):
-            try:
-                row = self.df.T.loc[column] == 1
-            except KeyError as e:
-                logger.debug(
-                    f"Column with {n} tubes not found in"
-                    f" {self.carrier.layout_name()}., trying again with 1 tube."
-                )
-                column = default_index_24.T[
-                    self.df.sum(axis=0) >= 1
-                ].first_valid_index()
-                continue
-            else:
-                break
-        else:
+        index = select_ch2(self.mask, default_index_24, n, 2)
+        if index is None:
             logger.error(f"Not enough tubes in {self.carrier.layout_name()}.")
             sys.exit()
 
-        index = sort_list(default_index_24.T.loc[column][row].tolist(), 2)[:n]
-
-        # Optionally remove tubes from df
+        # Optionally remove tubes from mask
         if remove:
-            self.df[default_index_24.isin(index)] = pd.NA
+            remove_mask(self.mask, default_index_24, index)
 
         return [(self.carrier, i) for i in index]
 
     def static(self, index: list[str]) -> list[tuple[EppiCarrier24, int]]:
         """Get specific tubes from input list."""
-        return [(self.carrier, default_index_24.at[i[0], int(i[1:])]) for i in index]
+        return [
+            (self.carrier, int(default_index_24[str_to_coords(i, (4, 6))]))
+            for i in index
+        ]
 
 
 class lid:
@@ -950,3 +1039,22 @@ class lid:
         labware: Lid,
     ) -> None:
         self.lid = labware
+
+
+def count_rack_swaps(pickups: list[tuple], policy: str) -> int:
+    """Replay recorded pickups on a full 96-tip rack, counting rack swaps."""
+    rack = tip_96(None, policy)
+    swaps = 0
+    for mode, *args in pickups:
+        if not pickup_fits(rack.mask, mode, *args):
+            rack.reset()
+            swaps += 1
+        getattr(rack, mode)(*args)
+
+    return swaps
+
+
+def compare_tip_policies(pickups: list[tuple]) -> dict[str, int]:
+    """Rack swaps saved by each allocation policy compared to first-fit."""
+    swaps = {policy: count_rack_swaps(pickups, policy) for policy in TIP_POLICIES}
+    return {policy: swaps["first"] - n for policy, n in swaps.items()}
@@ -0,0 +1,274 @@
+"""
+This module contains a motion cost model for the deck. Labware coordinates are read from
+layout files (TForm.3.X/Y fields) and used to estimate travel times of channel, 384 head
+and gripper moves between labware. Model parameters can be calibrated from recorded run
+logs.
+"""
+
+# Imports
+import logging, os, re, datetime
+
+import numpy as np
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Arm moved by each command wrapper in commands.py
+ARMS = {
+    "tip_pick_up": "channels",
+    "tip_eject": "channels",
+    "aspirate": "channels",
+    "dispense": "channels",
+    "tip_pick_up_384": "head384",
+    "tip_eject_384": "head384",
+    "aspirate_384": "head384",
+    "dispense_384": "head384",
+    "grip_get": "gripper",
+    "grip_place": "gripper",
+    "grip_get_tip_rack": "gripper",
+    "grip_place_tip_rack": "gripper",
+}
+
+# Default motion model, overheads in s per command and speeds in mm/s per arm
+# X and Y drives move together, travel is limited by the longest axis
+MODEL = {
+    "overheads": {
+        "tip_pick_up": 7.0,
+        "tip_eject": 5.0,
+        "aspirate": 5.0,
+        "dispense": 4.0,
+        "tip_pick_up_384": 12.0,
+        "tip_eject_384": 8.0,
+        "aspirate_384": 7.0,
+        "dispense_384": 6.0,
+        "grip_get": 10.0,
+        "grip_place": 10.0,
+        "grip_get_tip_rack": 12.0,
+        "grip_place_tip_rack": 12.0,
+    },
+    "speeds": {"channels": 400.0, "head384": 300.0, "gripper": 200.0},
+}
+
+# Longer intervals between commands in logs are user prompts or incubations
+MAX_INTERVAL = 120.0
+
+# Labware fields in binary layout files: key length, key, value length, value
+LAYOUT_FIELD = re.compile(
+    rb"(.)(Labware\.(\d+)\.(Id|TForm\.3\.X|TForm\.3\.Y))(.)", re.S
+)
+
+# Command lines in method logs written by main.py
+LOG_LINE = re.compile(
+    r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) - .* - Command: (\w+)"
+    r"(?: \| Labware: ([^|]+?))?(?: \||$)"
+)
+
+
+def read_coordinates(layout_file_path: str) -> dict:
+    """Read deck coordinates of all labware in a layout file.
+
+    Args:
+        - layout_file_path: Path to layout file.
+
+    Returns:
+        - dict: Labware coordinates in {layout name: (x, y)} format, in mm.
+    """
+    logger.debug(f"Reading coordinates from: {layout_file_path}")
+    with open(layout_file_path, "rb") as f:
+        data = f.read()
+
+    # Labware indices restart in each section, fields follow the Id of their labware
+    fields = []
+    labware = {}
+    for match in LAYOUT_FIELD.finditer(data):
+        key_length, key, idx, name, value_length = match.groups()
+        # Skip longer keys with the same prefix (e.g. Labware.1.IdGMagNASTARlet)
+        if key_length[0] != len(key):
+            continue
+        value = data[match.end() : match.end() + value_length[0]]
+        value = value.decode(errors="replace")
+        if name == b"Id":
+            labware[idx] = {"Id": value}
+            fields.append(labware[idx])
+        elif idx in labware:
+            labware[idx][name.decode()] = value
+
+    coordinates = {}
+    for field in fields:
+        try:
+            coordinates[field["Id"]] = (
+                float(field["TForm.3.X"]),
+                float(field["TForm.3.Y"]),
+            )
+        except (KeyError, ValueError):
+            logger.debug(f"No coordinates for labware: {field}")
+
+    return coordinates
+
+
+def distance(coordinates: dict, source: str | None, target: str) -> float:
+    """Travel distance in mm between two labware, limited by the longest axis.
+    Distance is 0 if the arm position is unknown (source is None)."""
+    if source is None:
+        return 0.0
+    x1, y1 = coordinates[source]
+    x2, y2 = coordinates[target]
+    return max(abs(x2 - x1), abs(y2 - y1))
+
+
+def travel_time(
+    coordinates: dict,
+    command: str,
+    source: str | None,
+    target: str,
+    model: dict = MODEL,
+) -> float:
+    """Estimate duration of a command moving an arm from source to target labware.
+
+    Args:
+        - coordinates: Labware coordinates from read_coordinates.
+        - command: Command wrapper name (see ARMS).
+        - source: Layout name of labware the arm is at, None if unknown.
+        - target: Layout name of labware the command is sent to.
+        - model: Motion model. Defaults to MODEL.
+
+    Returns:
+        - float: Estimated duration in s.
+    """
+    speed = model["speeds"][ARMS[command]]
+    return model["overheads"][command] + distance(coordinates, source, target) / speed
+
+
+def travel_matrix(
+    coordinates: dict, command: str, names: list[str], model: dict = MODEL
+) -> np.ndarray:
+    """Matrix of estimated durations of command between all pairs of labware.
+    Element [i, j] is the duration of moving from names[i] to names[j]."""
+    xy = np.array([coordinates[name] for name in names]).reshape(-1, 2)
+    distances = np.abs(xy[:, None, :] - xy[None, :, :]).max(axis=2)
+    speed = model["speeds"][ARMS[command]]
+    return model["overheads"][command] + distances / speed
+
+
+def read_log(log_path: str) -> list[tuple[datetime.datetime, str, str | None]]:
+    """Read commands from a method log.
+
+    Args:
+        - log_path: Path to method log.
+
+    Returns:
+        - list: Commands in (time, command, labware) format, labware is None if unknown.
+    """
+    commands = []
+    with open(log_path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            match = LOG_LINE.match(line)
+            if not match:
+                continue
+            time, command, labware = match.groups()
+            time = datetime.datetime.strptime(time, "%Y-%m-%d %H:%M:%S,%f")
+            if labware == "None":
+                labware = None
+            commands.append((time, command, labware))
+
+    return commands
+
+
+def log_samples(commands: list, coordinates: dict) -> list[tuple[str, float, float]]:
+    """
+    Get (command, distance, duration) samples from commands in a method log.
+    Duration of a command is the interval until the next command, distance is
+    travelled from the last labware visited by the same arm.
+    """
+    samples = []
+    positions = {}
+    for (time, command, labware), (next_time, _, _) in zip(commands, commands[1:]):
+        if command not in ARMS:
+            # Initialization and tool ejects move arms to unknown positions
+            positions = {}
+            continue
+
+        arm = ARMS[command]
+        source = positions.get(arm)
+        positions[arm] = labware if labware in coordinates else None
+
+        duration = (next_time - time).total_seconds()
+        if positions[arm] is None or not 0 < duration <= MAX_INTERVAL:
+            continue
+        if source is not None:
+            travel = distance(coordinates, source, labware)
+            samples.append((command, travel, duration))
+
+    return samples
+
+
+def calibrate(samples: list[tuple[str, float, float]], model: dict = MODEL) -> dict:
+    """
+    Fit command overheads and arm speeds to (command, distance, duration) samples
+    by least squares. Parameters without samples, or with non-physical fits, are
+    taken from the provided model.
+
+    Args:
+        - samples: Samples from log_samples.
+        - model: Motion model with default parameters. Defaults to MODEL.
+
+    Returns:
+        - dict: Calibrated motion model.
+    """
+    calibrated = {
+        "overheads": dict(model["overheads"]),
+        "speeds": dict(model["speeds"]),
+    }
+    if not samples:
+        return calibrated
+
+    # Columns are one overhead per command and one inverse speed per arm
+    commands = sorted({command for command, _, _ in samples})
+    arms = sorted({ARMS[command] for command in commands})
+    a = np.zeros((len(samples), len(commands) + len(arms)))
+    b = np.zeros(len(samples))
+    for i, (command, travel, duration) in enumerate(samples):
+        a[i, commands.index(command)] = 1.0
+        a[i, len(commands) + arms.index(ARMS[command])] = travel
+        b[i] = duration
+
+    fit, _, rank, _ = np.linalg.lstsq(a, b, rcond=None)
+    if rank < a.shape[1]:
+        logger.warning("Not enough samples to calibrate all motion parameters.")
+
+    for command, overhead in zip(commands, fit[: len(commands)]):
+        if overhead > 0:
+            calibrated["overheads"][command] = float(overhead)
+    for arm, pace in zip(arms, fit[len(commands) :]):
+        if pace > 0:
+            calibrated["speeds"][arm] = float(1 / pace)
+
+    logger.debug(f"Calibrated motion model from {len(samples)} samples: {calibrated}")
+    return calibrated
+
+
+def calibrate_runs(runs_dir_path: str, model: dict = MODEL) -> dict:
+    """Calibrate motion model from method logs and layout files of all recorded runs.
+
+    Args:
+        - runs_dir_path: Path to runs directory.
+        - model: Motion model with default parameters. Defaults to MODEL.
+
+    Returns:
+        - dict: Calibrated motion model.
+    """
+    samples = []
+    for run in sorted(os.listdir(runs_dir_path)):
+        run_dir_path = os.path.join(runs_dir_path, run)
+        if not os.path.isdir(run_dir_path):
+            continue
+        for f in sorted(os.listdir(run_dir_path)):
+            layout_path = os.path.join(run_dir_path, f"{f[:-4]}.lay")
+            if not f.endswith(".log") or not os.path.isfile(layout_path):
+                continue
+            coordinates = read_coordinates(layout_path)
+            commands = read_log(os.path.join(run_dir_path, f))
+            samples.extend(log_samples(commands, coordinates))
+
+    return calibrate(samples, model)
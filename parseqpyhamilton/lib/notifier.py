@@ -0,0 +1,183 @@
+"""
+This module sends notifications in the background. Messages are queued and a dispatcher
+thread delivers them to a sink (Slack, a local file or a list), so methods never wait
+for the network. Messages queued in quick succession are sent as one and failed sends
+are retried with backoff.
+"""
+
+# Imports
+import logging, os, queue, threading, time, datetime, atexit
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Messages queued within this time (s) of the first one are sent together
+COALESCE = 2.0
+
+# Send attempts per batch, retries wait BACKOFF s doubled after each attempt
+ATTEMPTS = 4
+BACKOFF = 1.0
+
+# Time (s) to wait for queued messages at exit
+FLUSH_TIMEOUT = 30.0
+
+
+class SlackSink:
+    """Post messages to a Slack channel, token is read from SLACK_API_TOKEN."""
+
+    def __init__(
+        self,
+        channel: str = "#hamilton-events",  # public channel
+        icon_url: str = "https://i.ibb.co/L59D5KZ/Group-2164.png",  # from Biorender
+        user_name: str = "Hamilton",
+    ) -> None:
+        self.token = os.environ.get("SLACK_API_TOKEN")  # set on Hamilton PC
+        self.channel = channel
+        self.icon_url = icon_url
+        self.user_name = user_name
+
+    def send(self, text: str) -> None:
+        # Imported on first send by the dispatcher thread, keeps start-up fast
+        import requests
+
+        response = requests.post(
+            "https://slack.com/api/chat.postMessage",
+            {
+                "token": self.token,
+                "channel": self.channel,
+                "text": text,
+                "icon_url": self.icon_url,
+                "username": self.user_name,
+                "blocks": None,
+            },
+            timeout=10,
+        ).json()
+        if not response.get("ok"):
+            raise RuntimeError(f"Slack error: {response.get('error')}")
+
+
+class FileSink:
+    """Append timestamped messages to a local file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def send(self, text: str) -> None:
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{now} {text}\n")
+
+
+class ListSink:
+    """Keep messages in memory, stand-in for Slack in scripts and checks."""
+
+    def __init__(self) -> None:
+        self.messages = []
+
+    def send(self, text: str) -> None:
+        self.messages.append(text)
+
+
+class Dispatcher:
+    """
+    Background thread delivering queued messages to a sink. Messages arriving within
+    coalesce seconds of the first message in a batch are joined into one. Batches are
+    dropped with an error after all attempts fail.
+    """
+
+    def __init__(
+        self,
+        sink,
+        coalesce: float = COALESCE,
+        attempts: int = ATTEMPTS,
+        backoff: float = BACKOFF,
+    ) -> None:
+        self.sink = sink
+        self.coalesce = coalesce
+        self.attempts = attempts
+        self.backoff = backoff
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="notifier", daemon=True)
+        self.thread.start()
+
+    def put(self, text: str) -> None:
+        """Queue message, never blocks."""
+        self.queue.put(text)
+
+    def close(self, timeout: float = FLUSH_TIMEOUT) -> None:
+        """Send queued messages and stop thread, waiting at most timeout seconds."""
+        self.queue.put(None)
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            logger.warning("Notifications not sent before timeout.")
+
+    def run(self) -> None:
+        stop = False
+        while not stop:
+            text = self.queue.get()
+            if text is None:
+                break
+
+            # Collect burst of messages
+            batch = [text]
+            deadline = time.monotonic() + self.coalesce
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    text = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if text is None:
+                    stop = True
+                    break
+                batch.append(text)
+
+            self.send("\n".join(batch))
+
+    def send(self, text: str) -> None:
+        """Send message to sink, retrying with exponential backoff."""
+        for attempt in range(self.attempts):
+            try:
+                self.sink.send(text)
+                return
+            except Exception as e:
+                logger.warning(f"Notification attempt {attempt + 1} failed: {e}")
+                if attempt + 1 < self.attempts:
+                    time.sleep(self.backoff * 2**attempt)
+        logger.error(f"Notification dropped: {text}")
+
+
+# Dispatcher started by the first notification
+dispatcher = None
+
+
+def configure(sink, **kwargs) -> None:
+    """Send notifications to sink, e.g. FileSink or ListSink instead of Slack.
+
+    Args:
+        - sink: Object with a send(text) method.
+        - kwargs: Dispatcher settings (coalesce, attempts, backoff).
+    """
+    global dispatcher
+    if dispatcher is not None:
+        dispatcher.close()
+    dispatcher = Dispatcher(sink, **kwargs)
+
+
+def notify(text: str) -> None:
+    """Queue notification, starting a dispatcher with the Slack sink if needed."""
+    if dispatcher is None:
+        configure(SlackSink())
+    dispatcher.put(text)
+
+
+def flush(timeout: float = FLUSH_TIMEOUT) -> None:
+    """Send queued notifications and stop the dispatcher."""
+    global dispatcher
+    if dispatcher is not None:
+        dispatcher.close(timeout)
+        dispatcher = None
+
+
+# Queued notifications are sent before exit (e.g. after sys.exit in main)
+atexit.register(flush)
@@ -0,0 +1,297 @@
+"""
+This module runs a queue of methods back to back in one run. Queued methods share a
+HamiltonInterface session, so the robot is started and initialized once for methods
+with identical layout files, and the deck and state of the next method are prepared in
+the background while the current one runs. The bundled layouts all differ, so bundled
+methods each restart the interface and only share background preparation.
+"""
+
+# Imports
+import logging, os, shutil, filecmp, datetime, importlib, types, concurrent.futures
+
+import commands as cmd
+import deck as dk
+import helpers as hp
+import state as st
+import tracing as tr
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Attempts per method before the queue is stopped, as in main.py
+ATTEMPTS = 3
+
+
+class Session:
+    """
+    HamiltonInterface shared by queued methods. Methods create and enter it like their
+    own interface, which is started on first use and kept open after the method ends.
+    The interface is stopped when a method fails, so its next attempt starts from an
+    initialized robot, and before a method with a different layout, since layouts are
+    loaded by the Hamilton software when the interface starts. Only methods with
+    identical layout files share the interface (e.g. methods given one layout with the
+    labware of both), see shared_layouts.
+    """
+
+    def __init__(self, interface) -> None:
+        self.interface = interface
+        self.ham = None
+        self.layout_path = None
+
+    def __call__(self, *args, **kwargs) -> "Session":
+        if self.ham is None:
+            self.ham = self.interface(*args, **kwargs)
+            self.ham.start()
+        return self
+
+    def __enter__(self):
+        return self.ham
+
+    def __exit__(self, type, value, tb) -> None:
+        if type is not None:
+            self.close()
+
+    def use_layout(self, layout_path: str) -> None:
+        """Install layout of the next method, restarting the interface if it differs."""
+        if self.layout_path is not None and filecmp.cmp(
+            self.layout_path, layout_path, shallow=False
+        ):
+            logger.debug("Keeping interface, same layout: %s", layout_path)
+            return
+
+        self.close()
+        dk.install_layout(layout_path)
+        self.layout_path = layout_path
+
+    def keep(self) -> None:
+        """Mark interface as initialized once a method completed (cmd.initialize)."""
+        if self.ham is not None and not any(self.ham is h for h in cmd.initialized):
+            cmd.initialized.append(self.ham)
+
+    def close(self) -> None:
+        if self.ham is not None:
+            cmd.initialized[:] = [h for h in cmd.initialized if h is not self.ham]
+            self.ham.stop()
+            self.ham = None
+
+
+def shared_layouts(layout_paths: list[str]) -> list[bool]:
+    """For each layout after the first, True if the interface of the previous method
+    is kept (identical layout files), False if it is restarted."""
+    return [
+        filecmp.cmp(a, b, shallow=False) for a, b in zip(layout_paths, layout_paths[1:])
+    ]
+
+
+def prepare_method(
+    method: str,
+    run_dir_path: str,
+    layout_dir_path: str,
+    state_dir_path: str,
+    cache_dir_path: str,
+    cache: bool = True,
+    policy: str = "first",
+) -> dict:
+    """Copy default layout and state files of a method to the run directory and save its
+    deck. Files of an earlier run of the method are backed up first. The layout is not
+    installed, so methods can be prepared while another method runs.
+
+    Args:
+        - method: Method name.
+        - run_dir_path: Path to run directory.
+        - layout_dir_path: Path to default layout files.
+        - state_dir_path: Path to default state files.
+        - cache_dir_path: Path to deck cache directory.
+        - cache: Use deck cache. Defaults to True.
+        - policy: Tip allocation policy of tip racks. Defaults to "first".
+
+    Returns:
+        - dict: Method state.
+    """
+    layout_path = os.path.join(run_dir_path, f"{method}.lay")
+    state_path = os.path.join(run_dir_path, f"{method}.json")
+    labware_path = os.path.join(run_dir_path, method)
+
+    if os.path.exists(state_path):
+        now = datetime.datetime.now().strftime("%y.%m.%d_%H%M")
+        backup_dir_path = os.path.join(run_dir_path, now)
+        os.makedirs(backup_dir_path, exist_ok=True)
+        for f in os.listdir(run_dir_path):
+            if f.find(method) > -1:
+                shutil.move(
+                    os.path.join(run_dir_path, f),
+                    os.path.join(backup_dir_path, f"{f}.bak"),
+                )
+
+    shutil.copy(os.path.join(layout_dir_path, f"{method}.lay"), layout_path)
+    shutil.copy(os.path.join(state_dir_path, f"{method}.json"), state_path)
+    state = st.load_state(state_path)
+    st.save_state(state, state_path)
+
+    deck = dk.get_cached_deck(
+        layout_path, cache_dir_path, cache=cache, install=False, policy=policy
+    )
+    st.save_deck_state(labware_path, deck)
+    logger.debug("Prepared %s method in: %s", method, run_dir_path)
+
+    return state
+
+
+def run_queue(
+    queue: list[str],
+    run_id: str,
+    run_dir_path: str,
+    layout_dir_path: str,
+    state_dir_path: str,
+    cache_dir_path: str,
+    recover: dict[str, dict | None],
+    parameters: dict[str, dict],
+    cache: bool = True,
+    interface=None,
+    pipeline: bool = False,
+    policy: str = "first",
+) -> bool:
+    """Run methods one after another in a run, sharing one interface session. The next
+    method is prepared in a background thread while the current one runs. Failed
+    methods are restarted and the queue stops once a method failed ATTEMPTS times.
+
+    Args:
+        - queue: Method names in run order.
+        - run_id: Run id, used in notifications.
+        - run_dir_path: Path to run directory.
+        - layout_dir_path: Path to default layout files.
+        - state_dir_path: Path to default state files.
+        - cache_dir_path: Path to deck cache directory.
+        - recover: Methods to recover from the run directory, with state values to set
+        (None to prompt). Other methods start from default layout and state files.
+        - parameters: Run config parameters by method name, see helpers.parameters.
+        - cache: Use deck cache. Defaults to True.
+        - interface: Interface class, defaults to HamiltonInterface of the methods.
+        - pipeline: Run methods in pipelined mode, see commands.pipeline.
+        - policy: Tip allocation policy of tip racks in new decks. Defaults to "first".
+
+    Returns:
+        - bool: True if all methods completed.
+    """
+    scripts = {m: importlib.import_module(f".{m}", "methods") for m in queue}
+
+    # Recovered states are set up front, prompts are not answered in the background
+    states = {
+        m: st.recover_state(os.path.join(run_dir_path, f"{m}.json"), values)
+        for m, values in recover.items()
+    }
+
+    # Layouts of recovered methods are already in the run directory
+    layouts = [
+        os.path.join(run_dir_path if m in recover else layout_dir_path, f"{m}.lay")
+        for m in queue
+    ]
+    shared = shared_layouts(layouts)
+    restarts = [m for m, keep in zip(queue[1:], shared) if not keep]
+    if restarts:
+        logger.info(f"Interface is restarted for other layouts before: {restarts}")
+
+    def prepare(method: str) -> dict:
+        if method in states:
+            return states[method]
+        return prepare_method(
+            method,
+            run_dir_path,
+            layout_dir_path,
+            state_dir_path,
+            cache_dir_path,
+            cache,
+            policy,
+        )
+
+    session = Session(interface or scripts[queue[0]].HamiltonInterface)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(prepare, queue[0])
+        try:
+            for i, method in enumerate(queue):
+                state = future.result()
+                if i + 1 < len(queue):
+                    future = executor.submit(prepare, queue[i + 1])
+
+                session.use_layout(os.path.join(run_dir_path, f"{method}.lay"))
+                hp.parameters = parameters.get(method, {})
+                logger.info(f"Starting method {method} ({i + 1}/{len(queue)}).")
+                script = scripts[method]
+                if not run_method(
+                    script, state, run_id, run_dir_path, session, pipeline
+                ):
+                    hp.notify(
+                        f"Method {method} for run {run_id} failed {ATTEMPTS} times."
+                        f" Stopping queue before: {queue[i + 1:]}"
+                    )
+                    return False
+        finally:
+            session.close()
+            future.cancel()
+
+    hp.notify(f"Queue {queue} for run {run_id} completed successfully!")
+    return True
+
+
+def run_method(
+    script: types.ModuleType,
+    state: dict,
+    run_id: str,
+    run_dir_path: str,
+    session: Session,
+    pipeline: bool = False,
+) -> bool:
+    """Run a queued method with the session as its interface, as main.py runs methods.
+
+    Args:
+        - script: Method module with run function.
+        - state: Method state.
+        - run_id: Run id, used in notifications.
+        - run_dir_path: Path to run directory.
+        - session: Interface session shared by queued methods.
+        - pipeline: Run method in pipelined mode, see commands.pipeline.
+
+    Returns:
+        - bool: True if the method completed within ATTEMPTS attempts.
+    """
+    method = script.__name__.rsplit(".", 1)[-1]
+
+    # Persistent logging
+    root_logger = logging.getLogger()
+    handler = logging.FileHandler(os.path.join(run_dir_path, f"{method}.log"))
+    handler.setLevel(logging.DEBUG)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    root_logger.addHandler(handler)
+
+    interface = script.HamiltonInterface
+    script.HamiltonInterface = cmd.pipelined(session) if pipeline else session
+    try:
+        for attempt in range(ATTEMPTS):
+            try:
+                with (
+                    st.load_deck_state(os.path.join(run_dir_path, method)) as shelf,
+                    tr.Tracer(
+                        os.path.join(run_dir_path, f"{method}_trace.jsonl"),
+                        os.path.join(run_dir_path, f"{method}_trace.json"),
+                    ),
+                ):
+                    script.run(shelf, state, run_dir_path)
+                    dk.report_tip_policies(shelf)
+            except ValueError as e:
+                logger.exception(e)
+                hp.notify(
+                    f"Method {method} for run {run_id} failed. Restarting"
+                    f" ({attempt + 1}/{ATTEMPTS})..."
+                )
+                continue
+            session.keep()
+            hp.notify(f"Method {method} for run {run_id} completed successfully!")
+            return True
+        return False
+    finally:
+        script.HamiltonInterface = interface
+        root_logger.removeHandler(handler)
+        handler.close()
@@ -0,0 +1,82 @@
+"""
+This module schedules incubations without blocking the robot. An incubation starts a
+timer, work that does not depend on it runs in the meantime and the method only sleeps
+for the time that is left. Minimum incubation times are guaranteed and actual times are
+logged.
+"""
+
+# Imports
+import logging, time
+
+import state as st
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class Incubation:
+    """
+    Timer for an incubation, used as a context manager. Work in the body runs while the
+    incubation lasts, on exit the remaining time is waited. If the body raises, nothing
+    is waited.
+
+    Methods pass their time module as clock, so estimates can replace it with the
+    simulator clock.
+    """
+
+    def __init__(self, name: str, seconds: float, clock=time) -> None:
+        self.name = name
+        self.seconds = seconds
+        self.clock = clock
+        self.start = None
+
+    def __enter__(self) -> "Incubation":
+        # Pipelined commands started the incubation, timer starts once they are done
+        st.wait_barriers()
+        self.start = self.clock.monotonic()
+        logger.debug("Incubation started: %s (%s s)", self.name, self.seconds)
+        return self
+
+    def __exit__(self, type, value, tb) -> None:
+        if type is None:
+            self.finish()
+
+    def remaining(self) -> float:
+        """Time left until minimum incubation time is reached, in s."""
+        return self.start + self.seconds - self.clock.monotonic()
+
+    def wait(self, lead: float = 0.0) -> None:
+        """Sleep until lead seconds of incubation are left, e.g. to premix beads."""
+        remaining = self.remaining() - lead
+        if remaining > 0:
+            self.clock.sleep(remaining)
+
+    def finish(self) -> float:
+        """Wait for the remaining incubation time and log actual time, in s."""
+        self.wait()
+        actual = self.clock.monotonic() - self.start
+        logger.info(
+            "Incubation %s: %.0f s (minimum %.0f s)", self.name, actual, self.seconds
+        )
+        return actual
+
+
+def incubate(name: str, seconds: float, clock=time) -> Incubation:
+    """Start an incubation of at least seconds, to be used in a with statement.
+
+    Args:
+        - name: Incubation name for logs.
+        - seconds: Minimum incubation time.
+        - clock: Module with monotonic and sleep functions. Defaults to time.
+
+    Returns:
+        - Incubation: Incubation timer.
+    """
+    return Incubation(name, seconds, clock)
+
+
+def wait(name: str, seconds: float, clock=time) -> None:
+    """Incubate without other work, logging actual time."""
+    with incubate(name, seconds, clock):
+        pass
@@ -0,0 +1,303 @@
+"""
+This module provides a local stand-in for the PyHamilton HamiltonInterface. Commands are
+validated against the templates in commands.py and timed on a virtual clock, so methods
+and command wrappers can run without VENUS.
+"""
+
+# Imports
+import logging
+
+import commands as cmd
+import motion as mo
+
+from pyhamilton import HamiltonCmdTemplate
+from pyhamilton.oemerr import (
+    HamiltonTimeoutError,
+    LabwareGrippedError,
+    NoLabwareError,
+    NoTipError,
+    TipPresentError,
+)
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Estimated base duration of each command in seconds
+DURATIONS = {
+    "INITIALIZE": 60.0,
+    "PICKUP": 8.0,
+    "EJECT": 6.0,
+    "ASPIRATE": 6.0,
+    "DISPENSE": 5.0,
+    "PICKUP384": 14.0,
+    "EJECT384": 10.0,
+    "ASPIRATE384": 8.0,
+    "DISPENSE384": 7.0,
+    "GRIP_GET": 12.0,
+    "GRIP_PLACE": 12.0,
+}
+
+# Liquid flow rate in uL/s, added to aspirate and dispense durations (with mixing)
+FLOW_RATE = 100.0
+
+# Maximum volume in uL for 384-head tips (50 uL)
+MAX_VOLUME_384 = 50.0
+
+# Arm moved by each command, travel between labware is timed with motion.MODEL speeds
+ARMS = {
+    "PICKUP": "channels",
+    "EJECT": "channels",
+    "ASPIRATE": "channels",
+    "DISPENSE": "channels",
+    "PICKUP384": "head384",
+    "EJECT384": "head384",
+    "ASPIRATE384": "head384",
+    "DISPENSE384": "head384",
+    "GRIP_GET": "gripper",
+    "GRIP_PLACE": "gripper",
+}
+
+# Commands which need labware positions unless sent to a sequence or waste
+POSITION_COMMANDS = [
+    "PICKUP",
+    "ASPIRATE",
+    "DISPENSE",
+    "PICKUP384",
+    "ASPIRATE384",
+    "DISPENSE384",
+]
+
+
+class HamiltonSimulator:
+    """
+    Drop-in replacement for HamiltonInterface. Every command is checked when sent:
+
+    - parameters must match the command template in commands.py
+    - labware positions, channels and volumes must be consistent
+    - tips and gripped labware are tracked, so picking up tips twice or aspirating
+      without tips fails like on the robot (raised by wait_on_response)
+
+    Each command advances a virtual clock by its estimated duration, see DURATIONS.
+    If labware coordinates are set (see deck.deck_coordinates), travel of the arm from
+    the last labware it visited is added. Commands and incubations are kept in history
+    as (name, command, start, duration).
+    """
+
+    def __init__(self, address=None, port=None, simulate=False, debug=False) -> None:
+        self.simulate = simulate
+        self.debug = debug
+        self.active = False
+        self.clock = 0.0
+        self.history = []
+        self.responses = {}
+        self.durations = dict(DURATIONS)
+        self.coordinates = {}
+        self.speeds = dict(mo.MODEL["speeds"])
+        self.arms = {}
+        self.channels = set()
+        self.head_tips = False
+        self.gripped = False
+
+    def __enter__(self) -> "HamiltonSimulator":
+        self.start()
+        return self
+
+    def __exit__(self, type, value, tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        logger.debug("Starting simulator...")
+        self.active = True
+
+    def stop(self) -> None:
+        logger.debug("Stopping simulator at %.1f s", self.clock)
+        self.active = False
+
+    def is_open(self) -> bool:
+        return self.active
+
+    def send_command(
+        self,
+        template: HamiltonCmdTemplate | None = None,
+        block_until_sent: bool = False,
+        *args,
+        **cmd_dict,
+    ) -> str:
+        """Validate and execute a command on the virtual clock, returning its id."""
+        if not self.is_open():
+            raise RuntimeError("Cannot send a command from a closed HamiltonInterface")
+        if template is None:
+            raise ValueError("Simulator commands must be sent with a template")
+
+        # Raises ValueError if parameters do not match template
+        command = template.assemble_cmd(**cmd_dict)
+        name = cmd.command_templates[template.cmd_name][0]
+        check_command(name, command)
+
+        error = self.execute(name, command)
+        duration = command_duration(name, command, self.durations)
+        duration += self.travel(name, command)
+        self.history.append((name, command, self.clock, duration))
+        self.responses[command["id"]] = (command, error)
+        self.clock += duration
+
+        if self.debug:
+            print(name, command)
+
+        return command["id"]
+
+    def wait_on_response(
+        self, id: str, timeout=60, raise_first_exception=False, return_data=None
+    ) -> dict:
+        """Return command with its error (None if successful), raising if requested."""
+        if id not in self.responses:
+            raise HamiltonTimeoutError(
+                f"Timed out after {timeout} sec while waiting for response id {id}"
+            )
+
+        command, error = self.responses.pop(id)
+        if error is not None and raise_first_exception:
+            raise error
+
+        return {"command": command, "error": error}
+
+    def travel(self, name: str, command: dict) -> float:
+        """Travel time of the arm moved by command from the last labware it visited.
+        Zero if either labware has no coordinates, arm positions are unknown after
+        initialization and moves to waste or sequences."""
+        if name == "INITIALIZE":
+            self.arms = {}
+        if name not in ARMS:
+            return 0.0
+
+        arm = ARMS[name]
+        positions = command_positions(command)
+        target = positions[0].split(", ")[0] if positions else None
+        if target not in self.coordinates:
+            self.arms[arm] = None
+            return 0.0
+
+        source, self.arms[arm] = self.arms.get(arm), target
+        return mo.distance(self.coordinates, source, target) / self.speeds[arm]
+
+    def sleep(self, seconds: float) -> None:
+        """Advance virtual clock, for incubations."""
+        self.history.append(("SLEEP", {}, self.clock, seconds))
+        self.clock += seconds
+
+    def execute(self, name: str, command: dict) -> Exception | None:
+        """Update tip and gripper state, returning the error the robot would raise."""
+        pattern = command.get("channelVariable", "")
+        channels = {i for i, c in enumerate(pattern) if c == "1"}
+
+        if name == "PICKUP":
+            if self.channels & channels:
+                return TipPresentError(f"Tips already present on channels {channels}")
+            self.channels |= channels
+
+        elif name == "EJECT":
+            # Gripper tool is ejected with the same command
+            if command["wasteSequence"] == cmd.DEFAULT_GRIP_TOOL_SEQUENCE:
+                return None
+            if not self.channels:
+                return NoTipError("No tips to eject")
+            self.channels = set()
+
+        elif name in ["ASPIRATE", "DISPENSE"]:
+            if not channels <= self.channels:
+                return NoTipError(f"No tips on channels {channels - self.channels}")
+
+        elif name == "PICKUP384":
+            if self.head_tips:
+                return TipPresentError("Tips already present on 384 head")
+            self.head_tips = True
+
+        elif name == "EJECT384":
+            if not self.head_tips:
+                return NoTipError("No tips to eject from 384 head")
+            self.head_tips = False
+
+        elif name in ["ASPIRATE384", "DISPENSE384"]:
+            if not self.head_tips:
+                return NoTipError("No tips on 384 head")
+
+        elif name == "GRIP_GET":
+            if self.gripped:
+                return LabwareGrippedError("Gripper already holds labware")
+            self.gripped = True
+
+        elif name == "GRIP_PLACE":
+            if not self.gripped:
+                return NoLabwareError("Gripper does not hold labware")
+            self.gripped = False
+
+        return None
+
+
+def command_positions(command: dict) -> list[str]:
+    """Labware positions of an assembled command in 'layout name, position' format."""
+    return [
+        p
+        for key in ["labwarePositions", "plateLabwarePositions", "lidLabwarePositions"]
+        for p in command.get(key, "").split(";")
+        if p
+    ]
+
+
+def check_command(name: str, command: dict) -> None:
+    """Check labware positions, channels and volumes of an assembled command."""
+    positions = command_positions(command)
+    for position in positions:
+        if len(position.split(", ")) != 2:
+            raise ValueError(f"{name}: invalid labware position '{position}'")
+
+    if name in POSITION_COMMANDS and not positions:
+        raise ValueError(f"{name}: no labware positions")
+
+    if name == "EJECT384" and command["tipEjectToKnownPosition"] == 0 and not positions:
+        raise ValueError(f"{name}: no labware positions")
+
+    if name == "GRIP_GET" and not positions:
+        raise ValueError(f"{name}: no labware positions")
+
+    if name == "GRIP_PLACE" and not positions and not command["plateSequence"]:
+        raise ValueError(f"{name}: no labware positions or sequence")
+
+    if name in ["PICKUP", "ASPIRATE", "DISPENSE"]:
+        if command["channelVariable"].count("1") != len(positions):
+            raise ValueError(
+                f"{name}: {len(positions)} positions for channels"
+                f" {command['channelVariable']}"
+            )
+
+    if name in ["ASPIRATE", "DISPENSE"]:
+        volumes = command["volumes"]
+        if len(volumes) != len(positions) or any(v < 0 for v in volumes):
+            raise ValueError(f"{name}: invalid volumes {volumes}")
+
+    if name in ["ASPIRATE384", "DISPENSE384"]:
+        volume = command.get("aspirateVolume", command.get("dispenseVolume"))
+        if not 0 <= volume <= MAX_VOLUME_384:
+            raise ValueError(f"{name}: invalid volume {volume}")
+
+    if "liquidClass" in command and not command["liquidClass"]:
+        raise ValueError(f"{name}: no liquid class")
+
+
+def command_duration(name: str, command: dict, durations: dict = DURATIONS) -> float:
+    """Estimated duration of an assembled command in seconds."""
+    duration = durations[name]
+
+    if name in ["ASPIRATE", "DISPENSE"]:
+        volume = max(command["volumes"])
+    elif name == "ASPIRATE384":
+        volume = command["aspirateVolume"]
+    elif name == "DISPENSE384":
+        volume = command["dispenseVolume"]
+    else:
+        return duration
+
+    # Each mixing cycle is one aspiration and one dispense
+    volume += 2 * command["mixCycles"] * command["mixVolume"]
+    return duration + volume / FLOW_RATE
@@ -3,22 +3,37 @@ This module provides functionality for managing method and deck states.
 """
 
 # Imports
+import os
+import sys
 import logging
-import shelve
+import collections.abc
+import pickle
+import sqlite3
 import json
 
 # Logging
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Called before state is set, used to wait for pipelined commands (see commands.py)
+barriers = []
+
+# Called with key and value after state is set, used to split estimates into steps
+observers = []
+
+# State changes are appended to a journal next to the state file
+# Journal is folded back into the state file once it grows past this size (bytes)
+JOURNAL_SIZE = 16384
+
 
 # Functions
-def recover_state(path) -> dict:
+def recover_state(path, values: dict | None = None) -> dict:
     """
     Recovers state from a JSON file at the provided path and allows the user to manually set values.
 
     Args:
         path (str): The path to the JSON file containing the state.
+        values (dict | None): Values to set without prompting, e.g. from run config.
 
     Returns:
         dict: The recovered state.
@@ -26,6 +41,20 @@ def recover_state(path) -> dict:
     logger.debug("Recovering state from: %s", path)
     state = load_state(path)
 
+    if values is not None:
+        for key, value in values.items():
+            if key not in state:
+                logger.error(f"Unknown state key in run config: {key}.")
+                sys.exit()
+            try:
+                value = int(value)
+            except ValueError:
+                logger.error(f"Invalid state value in run config: {key}={value}.")
+                sys.exit()
+            set_state(state, path, key, value)
+        print_state(state)
+        return state
+
     while True:
         print_state(state)
         question = input(
@@ -54,7 +83,7 @@ def recover_state(path) -> dict:
 
 def load_state(path: str) -> dict:
     """
-    Loads state from a JSON file at the provided path.
+    Loads state from a JSON file at the provided path and replays its journal.
 
     Args:
         path (str): The path to the JSON file containing the state.
@@ -66,31 +95,119 @@ def load_state(path: str) -> dict:
         with open(path, "r", encoding="utf-8") as file:
             logger.debug("Path is valid! Loading state...")
             state = json.load(file)
-        return state
     except (FileNotFoundError, IsADirectoryError) as e:
         logger.exception(e)
         raise e
 
+    replay_journal(state, path)
+    return state
+
+
+def replay_journal(state: dict, path: str) -> None:
+    """
+    Applies state changes recorded in journal to state.
+
+    Args:
+        state (dict): The state to be updated.
+        path (str): The path to the state file of the journal.
+    """
+    try:
+        with open(f"{path}.journal", "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last record can be incomplete if writing was interrupted
+                    logger.warning("Skipping incomplete journal record: %s", line)
+                    break
+                state[record["key"]] = record["value"]
+    except FileNotFoundError:
+        return
+
 
 def save_state(state: dict, path: str) -> None:
     """
-    Saves state in memory to disk.
+    Saves state in memory to disk, replacing the state file and its journal.
 
     Args:
         state (dict): The state to be saved.
         path (str): The path to the file where the state will be saved.
     """
     try:
-        with open(path, "w", encoding="utf-8") as file:
+        # Write to temporary file first so an interrupted write never corrupts state
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
             json.dump(state, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f"{path}.tmp", path)
+        sync_dir(path)
     except (FileNotFoundError, IsADirectoryError) as e:
         logger.exception(e)
         raise e
 
+    # State file now contains all journal records
+    try:
+        os.remove(f"{path}.journal")
+    except FileNotFoundError:
+        pass
+
+
+def load_well_index(path: str) -> dict | None:
+    """
+    Loads a per-plate well index saved with a run.
+
+    Args:
+        path (str): The path to the JSON file containing the index.
+
+    Returns:
+        dict | None: The loaded index, None if the run has no index yet.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            logger.debug("Loading well index: %s", path)
+            data = file.read()
+    except FileNotFoundError:
+        return None
+
+    index = json.loads(data)
+    well_indexes[path] = (index, data)
+    return index
+
+
+def save_well_index(index: dict, path: str) -> None:
+    """
+    Saves a per-plate well index with a run, so recovery does not regroup the well map.
+    Deck states are saved first. Methods update the index in place as plates are
+    processed, changes are saved with deck states at the next set_state.
+
+    Args:
+        index (dict): The index in {group: {plate: wells}} format.
+        path (str): The path to the file where the index will be saved.
+    """
+    well_indexes[path] = (index, None)
+    sync_deck_states()
+
+
+def write_well_index(path: str, data: str) -> None:
+    """
+    Replaces a well index file with serialized index data.
+
+    Args:
+        path (str): The path to the file where the index will be saved.
+        data (str): The index in JSON format.
+    """
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(f"{path}.tmp", path)
+    sync_dir(path)
+
 
 def set_state(state: dict, path: str, key: str, value: int) -> None:
     """
-    Sets state variables from key: value pair.
+    Sets state variables from key: value pair, after pipelined commands have finished.
+    Change is appended to journal, which is compacted into state file when large.
 
     Args:
         state (dict): The state to be updated.
@@ -98,8 +215,48 @@ def set_state(state: dict, path: str, key: str, value: int) -> None:
         key (str): The key of the state variable to be updated.
         value (int): The new value of the state variable.
     """
+    wait_barriers()
+
     state[key] = value
-    save_state(state, path)
+    for observer in observers:
+        observer(key, value)
+
+    sync_deck_states()
+    try:
+        with open(f"{path}.journal", "a", encoding="utf-8") as file:
+            file.write(json.dumps({"key": key, "value": value}) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+            size = file.tell()
+    except (FileNotFoundError, IsADirectoryError) as e:
+        logger.exception(e)
+        raise e
+
+    if size > JOURNAL_SIZE:
+        logger.debug("Compacting state journal: %s", path)
+        save_state(state, path)
+
+
+def wait_barriers() -> None:
+    """Waits for pipelined commands to finish, see commands.pipeline."""
+    for barrier in barriers:
+        barrier()
+
+
+def sync_dir(path: str) -> None:
+    """
+    Flushes directory entry of a replaced file to disk. Not supported on Windows.
+
+    Args:
+        path (str): The path to the replaced file.
+    """
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 def print_state(state: dict) -> None:
@@ -122,30 +279,174 @@ def save_deck_state(path: str, deck: dict) -> None:
     Saves deck state in memory to disk.
 
     Args:
-        path (str): The path to the file where the deck state will be saved.
+        path (str): The path to the deck store where the deck state will be saved.
         deck (dict): The deck state to be saved.
     """
+    # Written on update and closed here, so the store is not synced at set_state and
+    # decks can be saved from another thread
     try:
-        with shelve.open(path, writeback=True) as shelf:
-            shelf.update(deck)
-    except (FileNotFoundError, IsADirectoryError) as e:
+        with DeckStore(path, track=False) as store:
+            store.update(deck)
+    except (sqlite3.Error, IsADirectoryError) as e:
         logger.exception(e)
         raise e
 
 
-def load_deck_state(path: str) -> shelve.Shelf:
+def load_deck_state(path: str) -> "DeckStore":
     """
-    Loads deck state from a shelve db at the provided path.
+    Loads deck state from a deck store at the provided path. Slots are loaded on access.
 
     Args:
-        path (str): The path to the shelve db containing the deck state.
+        path (str): The path to the deck store containing the deck state.
 
     Returns:
-        shelve.Shelf: The loaded deck state.
+        DeckStore: The loaded deck state.
     """
-    try:
-        logger.debug("Path is valid! Loading deck...")
-        return shelve.open(path, writeback=True, flag="r")
-    except (FileNotFoundError, IsADirectoryError) as e:
-        logger.exception(e)
-        raise e
+    if not os.path.exists(f"{path}.db"):
+        raise FileNotFoundError(f"Deck store not found: {path}.db")
+
+    logger.debug("Path is valid! Loading deck...")
+    return DeckStore(path)
+
+
+def sync_deck_states() -> None:
+    """
+    Writes changed deck slots of all open deck stores to disk, then well indexes that
+    changed. State changes are journaled after this, so a journaled change is never
+    ahead of the deck and well index it depends on.
+    """
+    for store in deck_stores:
+        store.sync()
+
+    for path, (index, data) in well_indexes.items():
+        new_data = json.dumps(index)
+        if new_data != data:
+            logger.debug("Saving well index: %s", path)
+            write_well_index(path, new_data)
+            well_indexes[path] = (index, new_data)
+
+
+# Open deck stores, synced when state is set
+deck_stores = []
+
+# Loaded or saved well indexes in {path: (index, saved JSON)} format, saved with decks
+well_indexes = {}
+
+
+class DeckStore(collections.abc.MutableMapping):
+    """
+    Deck state in a SQLite db with one row per deck slot, replacing shelve writeback.
+    Used like a shelf in dict["Column": list[slots]] format. Slots are unpickled on
+    first access and only slots that changed are written back by sync, which is called
+    at every set_state (if tracked in deck_stores) and on close.
+    """
+
+    def __init__(self, path: str, track: bool = True) -> None:
+        self.path = f"{path}.db"
+        self.db = sqlite3.connect(self.path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS slots"
+            " (col TEXT, row INTEGER, data BLOB, PRIMARY KEY (col, row))"
+        )
+        self.columns = {}
+        self.loaded = {}
+        self.track = track
+        if track:
+            deck_stores.append(self)
+
+    def __enter__(self) -> "DeckStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __getitem__(self, col: str) -> "DeckColumn":
+        if col not in self.columns:
+            (n,) = self.db.execute(
+                "SELECT COUNT(*) FROM slots WHERE col = ?", (col,)
+            ).fetchone()
+            if n == 0:
+                raise KeyError(col)
+            self.columns[col] = DeckColumn(self, col, n)
+        return self.columns[col]
+
+    def __setitem__(self, col: str, slots: list[dict]) -> None:
+        # Replace column in one transaction, a crash keeps the old or new slots
+        with self.db:
+            self.db.execute("DELETE FROM slots WHERE col = ?", (col,))
+            self.db.executemany(
+                "INSERT INTO slots VALUES (?, ?, ?)",
+                [(col, row, pickle.dumps(slot)) for row, slot in enumerate(slots)],
+            )
+        self.unload(col)
+
+    def __delitem__(self, col: str) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM slots WHERE col = ?", (col,))
+        self.unload(col)
+
+    def __iter__(self):
+        rows = self.db.execute("SELECT DISTINCT col FROM slots ORDER BY col")
+        return iter([col for (col,) in rows])
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(DISTINCT col) FROM slots").fetchone()[0]
+
+    def unload(self, col: str) -> None:
+        """Drop loaded slots of a column, e.g. after it was replaced."""
+        self.columns.pop(col, None)
+        self.loaded = {k: v for k, v in self.loaded.items() if k[0] != col}
+
+    def load_slot(self, col: str, row: int) -> dict:
+        """Unpickle a deck slot, keeping pickled data to detect changes."""
+        if (col, row) not in self.loaded:
+            (data,) = self.db.execute(
+                "SELECT data FROM slots WHERE col = ? AND row = ?", (col, row)
+            ).fetchone()
+            self.loaded[(col, row)] = (pickle.loads(data), data)
+        return self.loaded[(col, row)][0]
+
+    def sync(self) -> None:
+        """Write loaded deck slots that changed since last sync."""
+        changed = []
+        for (col, row), (slot, data) in self.loaded.items():
+            new_data = pickle.dumps(slot)
+            if new_data != data:
+                self.loaded[(col, row)] = (slot, new_data)
+                changed.append((new_data, col, row))
+
+        if changed:
+            logger.debug("Saving %s changed deck slots...", len(changed))
+            with self.db:
+                self.db.executemany(
+                    "UPDATE slots SET data = ? WHERE col = ? AND row = ?", changed
+                )
+
+    def close(self) -> None:
+        self.sync()
+        self.db.close()
+
+        # Mappings compare by contents, remove by identity
+        if self.track:
+            deck_stores[:] = [store for store in deck_stores if store is not self]
+
+
+class DeckColumn(collections.abc.Sequence):
+    """Deck column of a DeckStore, loading slots on access."""
+
+    def __init__(self, store: DeckStore, col: str, n: int) -> None:
+        self.store = store
+        self.col = col
+        self.n = n
+
+    def __getitem__(self, row: int) -> dict:
+        if isinstance(row, slice):
+            return [self[i] for i in range(self.n)[row]]
+        if row < 0:
+            row += self.n
+        if not 0 <= row < self.n:
+            raise IndexError(row)
+        return self.store.load_slot(self.col, row)
+
+    def __len__(self) -> int:
+        return self.n
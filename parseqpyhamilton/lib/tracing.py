@@ -0,0 +1,213 @@
+"""
+This module records a trace of every command sent to the robot. Commands are written to
+a JSONL file in the run directory with start and end time, round-trip latency,
+parameters, method step and error. Traces are exported to the Chrome trace format,
+which can be opened in Perfetto (ui.perfetto.dev) or chrome://tracing.
+"""
+
+# Imports
+import logging, os, json, time
+
+import commands as cmd
+import state as st
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Process and thread ids of steps and commands in Chrome traces
+TRACE_PID = 1
+STEPS_TID = 1
+COMMANDS_TID = 2
+
+
+class Tracer:
+    """
+    Record commands sent through commands.py to a JSONL file, used as a context manager
+    around a method run. Runs of a method append to the same file. Commands are
+    labelled with the state key set after them, so events are written when the step
+    finishes. Commands of an unfinished step are written on close with step None.
+
+    In pipelined mode responses are collected at barriers, so commands end when their
+    response is received at a barrier. Commands dropped after an error have no end.
+    """
+
+    def __init__(self, path: str, export_path: str | None = None) -> None:
+        self.path = path
+        self.export_path = export_path
+        self.file = None
+        self.pending = {}
+        self.done = []
+
+    def __enter__(self) -> "Tracer":
+        self.open()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def open(self) -> None:
+        self.file = open(self.path, "a", encoding="utf-8")
+        cmd.tracers.append(self)
+        st.observers.append(self.observe)
+
+    def close(self) -> None:
+        """Write remaining commands and export trace if an export path is set."""
+        cmd.tracers.remove(self)
+        st.observers.remove(self.observe)
+
+        self.done.extend(self.pending.values())
+        self.pending = {}
+        self.write(None)
+        self.file.close()
+
+        if self.export_path is not None:
+            export_chrome(self.path, self.export_path)
+
+    def sent(
+        self,
+        cid: str | None,
+        name: str,
+        params: dict,
+        start: float,
+        error: Exception | None = None,
+    ) -> None:
+        """Record command sent at start (s since epoch), error if sending failed."""
+        event = {
+            "cid": cid,
+            "name": name,
+            "step": None,
+            "start": start,
+            "end": None,
+            "latency": None,
+            "params": params,
+            "error": None,
+        }
+        if error is None:
+            self.pending[cid] = event
+        else:
+            self.done.append(end_event(event, error))
+
+    def received(self, cid: str, error: Exception | None = None) -> None:
+        """Record response of command, sent before tracing started if unknown."""
+        if cid in self.pending:
+            self.done.append(end_event(self.pending.pop(cid), error))
+
+    def observe(self, key: str, value: int) -> None:
+        """State observer, commands since the last state change belong to step key."""
+        self.write(key)
+
+    def write(self, step: str | None) -> None:
+        """Write finished commands of step to trace file."""
+        for event in self.done:
+            event["step"] = step
+            self.file.write(json.dumps(event, default=str) + "\n")
+        self.file.flush()
+        self.done = []
+
+
+def end_event(event: dict, error: Exception | None = None) -> dict:
+    """Set end time, latency and error of a command event."""
+    event["end"] = time.time()
+    event["latency"] = event["end"] - event["start"]
+    if error is not None:
+        event["error"] = f"{type(error).__name__}: {error}"
+    return event
+
+
+def load_trace(path: str) -> list[dict]:
+    """
+    Loads command events from a trace file.
+
+    Args:
+        - path: Path to JSONL trace file.
+
+    Returns:
+        - list: Command events in order of completion.
+    """
+    events = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Last event can be incomplete if writing was interrupted
+                logger.warning("Skipping incomplete trace event: %s", line)
+                break
+
+    return events
+
+
+def export_chrome(path: str, export_path: str) -> None:
+    """
+    Export a trace file to the Chrome trace format. Commands are shown as slices on a
+    commands track and steps span their commands on a steps track, so gaps show
+    incubations and prompts. Commands dropped after an error are shown as instants.
+
+    Args:
+        - path: Path to JSONL trace file.
+        - export_path: Path to Chrome trace JSON file.
+    """
+    events = load_trace(path)
+    origin = min((e["start"] for e in events), default=0.0)
+
+    trace = [
+        thread_name(STEPS_TID, "steps"),
+        thread_name(COMMANDS_TID, "commands"),
+    ]
+    for event in events:
+        args = {"cid": event["cid"], "step": event["step"], **event["params"]}
+        if event["error"] is not None:
+            args["error"] = event["error"]
+
+        command = {
+            "name": event["name"],
+            "cat": "command" if event["error"] is None else "error",
+            "ts": (event["start"] - origin) * 1e6,
+            "pid": TRACE_PID,
+            "tid": COMMANDS_TID,
+            "args": args,
+        }
+        if event["end"] is None:
+            command.update({"ph": "i", "s": "t", "cat": "dropped"})
+        else:
+            command.update({"ph": "X", "dur": event["latency"] * 1e6})
+        trace.append(command)
+
+    # Consecutive commands with the same step key form one step
+    steps = []
+    for event in events:
+        end = event["end"] or event["start"]
+        if steps and steps[-1][0] == event["step"]:
+            steps[-1][2] = max(steps[-1][2], end)
+        else:
+            steps.append([event["step"], event["start"], end])
+
+    for step, start, end in steps:
+        trace.append(
+            {
+                "name": step or "unfinished",
+                "cat": "step",
+                "ph": "X",
+                "ts": (start - origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": TRACE_PID,
+                "tid": STEPS_TID,
+            }
+        )
+
+    with open(f"{export_path}.tmp", "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+    os.replace(f"{export_path}.tmp", export_path)
+    logger.debug("Exported %s trace events to: %s", len(trace), export_path)
+
+
+def thread_name(tid: int, name: str) -> dict:
+    """Chrome trace metadata event naming a track."""
+    return {
+        "name": "thread_name",
+        "ph": "M",
+        "pid": TRACE_PID,
+        "tid": tid,
+        "args": {"name": name},
+    }
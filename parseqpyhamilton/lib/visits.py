@@ -0,0 +1,91 @@
+"""
+This module orders well maps by plate visits. Plates are fetched from LIFO stacks onto
+the active positions and returned to done stacks, so a plate can't be fetched again
+once its work is left. Well maps are ordered so that transfers between the same source
+and target plates are grouped and each plate is fetched once where possible, which
+sets the order plates must be stacked in.
+"""
+
+# Imports
+import logging, collections
+
+import numpy as np
+import pandas as pd
+
+# Logging
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def order_blocks(blocks: list[tuple[str, str | None]]) -> list[tuple[str, str | None]]:
+    """
+    Greedily order (source plate, target plate) blocks to minimise plate swaps. The
+    next block keeps one of the active plates if possible, preferring blocks that leave
+    a plate without work left. Ties are broken by input order.
+
+    Args:
+        - blocks: Unique (source plate, target plate) pairs, target is None for methods
+        with a single target plate.
+
+    Returns:
+        - list: Blocks in visit order.
+    """
+    left = list(blocks)
+    counts = collections.Counter(p for block in left for p in enumerate(block))
+
+    def cost(block, active):
+        """Blocks left on active plates which are swapped out for block."""
+        return sum(
+            counts[(i, p)]
+            for i, p in enumerate(active)
+            if p is not None and p != block[i]
+        )
+
+    order = []
+    active = (None, None)
+    while left:
+        shared = [b for b in left if b[0] == active[0] or b[1] == active[1]]
+        if shared:
+            block = min(shared, key=lambda b: cost(b, active))
+        else:
+            # Start with plates which have the fewest blocks, i.e. ends of chains
+            block = min(left, key=lambda b: counts[(0, b[0])] + counts[(1, b[1])])
+
+        left.remove(block)
+        counts.subtract(enumerate(block))
+        order.append(block)
+        active = block
+
+    return order
+
+
+def order_well_map(
+    well_map: pd.DataFrame, source: str, target: str | None = None
+) -> pd.DataFrame:
+    """
+    Order well map rows by plate visits, keeping row order within each block.
+
+    Args:
+        - well_map: Well map, see helpers.read_well_map.
+        - source: Source plate column.
+        - target: Target plate column, None for a single target plate.
+
+    Returns:
+        - DataFrame: Ordered well map.
+    """
+    columns = source if target is None else [source, target]
+    groups = well_map.groupby(columns, sort=False, observed=True).indices
+    blocks = {
+        (key, None) if target is None else key: rows for key, rows in groups.items()
+    }
+
+    order = order_blocks(list(blocks))
+    logger.debug(f"Plate visits: {order}")
+
+    return well_map.iloc[np.concatenate([blocks[block] for block in order])]
+
+
+def count_swaps(well_map: pd.DataFrame, column: str) -> int:
+    """Number of plates fetched onto the active position, visiting rows in order."""
+    names = well_map[column].astype(str)
+    return int((names != names.shift()).sum())
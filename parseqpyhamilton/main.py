@@ -9,18 +9,24 @@ object is then used to execute the method and update the state file.
 # Imports
 import os
 import sys
-import shelve
+import argparse
 import importlib
 import shutil
 import time
+import json
 import datetime
 import logging
 import logging.config
 
 # Local imports
-from .lib import deck as dk
-from .lib import helpers as hp
-from .lib import state as st
+# Lib modules are imported by name as in methods, so both share module state (open deck
+# stores, tracers, notifications and run config answers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))
+
+# Modules importing pandas and pyhamilton (deck, estimate, helpers, tracing) are
+# imported once all prompts are answered, so methods and runs are listed without delay
+import notifier as nt
+import state as st
 
 # Paths
 root = os.path.dirname(os.path.abspath(__file__))
@@ -28,6 +34,7 @@ state_dir_path = os.path.join(root, "states")
 layout_dir_path = os.path.join(root, "layouts")
 script_dir_path = os.path.join(root, "scripts")
 runs_dir_path = os.path.join(root, "runs")
+cache_dir_path = os.path.join(root, "cache")
 
 # Logging configuration
 LOGGING = {
@@ -57,9 +64,146 @@ logging.getLogger("parse").setLevel(logging.WARNING)
 logging.config.dictConfig(LOGGING)
 logger = logging.getLogger()
 
+# Keys of run config files, answering prompts of main.py and methods (see README)
+CONFIG_KEYS = [
+    "method",
+    "queue",
+    "run",
+    "recover",
+    "state",
+    "parameters",
+    "confirm",
+    "input",
+    "pipeline",
+    "tip_policy",
+]
+
+
+def prompt(message: str, answer: str | None, interactive: bool = True) -> str:
+    """Return answer from run config if set, otherwise prompt user.
+
+    Args:
+        - message: Message to prompt user.
+        - answer: Answer from run config, None if not set.
+        - interactive: Exit instead of prompting if False. Defaults to True.
+
+    Returns:
+        - str: Answer.
+    """
+    if answer is not None:
+        print(f"{message}{answer}")
+        return answer
+
+    if not interactive:
+        logger.error(f"No answer in run config for prompt: {message}")
+        sys.exit()
+
+    return input(message)
+
 
 # Main entry point
 if __name__ == "__main__":
+    # Command line arguments
+    parser = argparse.ArgumentParser(description="Run a method on the Hamilton.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse layout file instead of using cached deck",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="estimate runtime of method with simulated robot, without running it",
+    )
+    parser.add_argument(
+        "--durations",
+        help="JSON file with command durations in s for estimates (see simulator.py)",
+    )
+    parser.add_argument(
+        "--notify-file",
+        help="append notifications to a local file instead of sending them to Slack",
+    )
+    parser.add_argument(
+        "--config",
+        help="JSON run config answering prompts, flags below take precedence",
+    )
+    parser.add_argument("--method", help="method name")
+    parser.add_argument(
+        "--queue",
+        nargs="+",
+        metavar="METHOD",
+        help="run methods back to back in one run, sharing the robot session",
+    )
+    parser.add_argument("--run", help="run id of an existing run or new")
+    parser.add_argument(
+        "--recover",
+        action=argparse.BooleanOptionalAction,
+        help="recover or overwrite (--no-recover) a run which contains the method",
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="method parameter, METHOD.KEY=VALUE for queues, can be repeated",
+    )
+    parser.add_argument(
+        "--no-confirm",
+        action="store_true",
+        help="do not wait for user actions to be confirmed, e.g. for simulations",
+    )
+    parser.add_argument(
+        "--no-input",
+        action="store_true",
+        help="exit instead of prompting when the run config has no answer",
+    )
+    parser.add_argument(
+        "--tip-policy",
+        help="tip allocation policy of tip racks in new decks: first, best or reserve",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="send commands without waiting for each one, see commands.pipeline",
+    )
+    args = parser.parse_args()
+
+    # Run config answers prompts, flags take precedence over the config file
+    config = {}
+    if args.config:
+        with open(args.config, "rt", encoding="utf-8") as f:
+            config = json.load(f)
+        unknown = [key for key in config if key not in CONFIG_KEYS]
+        if unknown:
+            logger.error(f"Unknown keys in run config: {unknown}.")
+            sys.exit()
+
+    for key in ["method", "queue", "run", "recover"]:
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    queue = config.get("queue", [])
+    for parameter in args.set:
+        key, _, value = parameter.partition("=")
+        parameters = config.setdefault("parameters", {})
+        if queue:
+            method, _, key = key.partition(".")
+            parameters = parameters.setdefault(method, {})
+        parameters[key] = value
+    if args.no_confirm:
+        config["confirm"] = False
+    if args.no_input:
+        config["input"] = False
+    if args.pipeline:
+        config["pipeline"] = True
+    if args.tip_policy is not None:
+        config["tip_policy"] = args.tip_policy
+    tip_policy = config.get("tip_policy", "first")
+    interactive = config.get("input", True)
+
+    # Notifications are sent in the background, see notifier.py
+    if args.notify_file:
+        nt.configure(nt.FileSink(args.notify_file))
+
     # Find existing methods
     methods = [
         f[:-3]
@@ -67,6 +211,9 @@ if __name__ == "__main__":
         if f.endswith(".py") and not f.startswith("__")
     ]
 
+    # State files of methods in run directories, other JSON files are method data
+    state_files = [f"{method}.json" for method in methods]
+
     # Display valid methods
     if len(methods) > 0:
         print(f"{'#':<5}{'method':<25}")
@@ -78,9 +225,30 @@ if __name__ == "__main__":
         logger.error("No methods found!")
         sys.exit()
 
-    # Prompt user for method
-    while True:
-        idx = input("Method id: ")
+    # Queued methods need default layout and state files and run once per queue
+    for method in queue:
+        if method not in methods or not os.path.exists(
+            os.path.join(layout_dir_path, f"{method}.lay")
+        ):
+            logger.error(f"Unknown method or no default layout in queue: {method}.")
+            sys.exit()
+    if len(set(queue)) < len(queue):
+        logger.error("Methods can only be queued once.")
+        sys.exit()
+    if queue and args.estimate:
+        logger.error("Runtime estimates are made for one method, not a queue.")
+        sys.exit()
+
+    # Prompt user for method, unless set in run config or methods are queued
+    method_answer = None
+    if "method" in config:
+        if config["method"] not in methods:
+            logger.error(f"Unknown method in run config: {config['method']}.")
+            sys.exit()
+        method_answer = str(methods.index(config["method"]) + 1)
+
+    while not queue:
+        idx = prompt("Method id: ", method_answer, interactive)
         try:
             method_idx = int(idx)
             method = methods[method_idx - 1]
@@ -89,6 +257,64 @@ if __name__ == "__main__":
             continue
         break
 
+    # Method parameters are checked before a run is created, answers are used by
+    # helpers.prompt_* in methods. Parameters of queued methods are set by method name
+    if config:
+        import helpers as hp
+        import labware as lw
+
+        if tip_policy not in lw.TIP_POLICIES:
+            logger.error(f"Unknown tip policy: {tip_policy}, use {lw.TIP_POLICIES}.")
+            sys.exit()
+
+        parameters = config.get("parameters", {})
+        if not queue:
+            parameters = {method: parameters}
+        for name in parameters:
+            if name not in (queue or [method]):
+                logger.error(f"Parameters in run config for unqueued method: {name}.")
+                sys.exit()
+        for name in queue or [method]:
+            script = importlib.import_module(f".{name}", "methods")
+            hp.check_parameters(
+                getattr(script, "PARAMETERS", {}), parameters.get(name, {})
+            )
+        if not queue:
+            hp.parameters = parameters[method]
+        hp.interactive = interactive
+        hp.confirmations = config.get("confirm", True)
+
+    # Estimate runtime with default layout and state files, no run is created
+    if args.estimate:
+        import estimate as es
+
+        durations = {}
+        if args.durations:
+            with open(args.durations, "rt", encoding="utf-8") as f:
+                durations = json.load(f)
+
+        script = importlib.import_module(f".{method}", "methods")
+        start = time.perf_counter()
+        try:
+            ham, steps = es.estimate_method(
+                script,
+                method,
+                os.path.join(layout_dir_path, f"{method}.lay"),
+                os.path.join(state_dir_path, f"{method}.json"),
+                cache_dir_path,
+                durations,
+                cache=not args.no_cache,
+                policy=tip_policy,
+            )
+        except ValueError as e:
+            logger.exception(e)
+            logger.error(f"Method {method} failed in simulation.")
+            sys.exit()
+
+        logger.debug("Estimated in %.2f s", time.perf_counter() - start)
+        es.print_estimate(ham, steps)
+        sys.exit()
+
     # Find existing runs
     runs = [
         d
@@ -104,14 +330,91 @@ if __name__ == "__main__":
             methods = [
                 f[:-5]
                 for f in os.listdir(os.path.join(runs_dir_path, run))
-                if f.endswith(".json")
+                if f in state_files
             ]
             print(f"{i + 1:<5}{run:<25}{methods}")
         print(f"{'-' * 80}")
 
-    # Prompt user for run
+    # Prompt user for run, unless set in run config (new or run id)
+    run_answer = None
+    if "run" in config:
+        if config["run"] != "new" and config["run"] not in runs:
+            logger.error(f"Unknown run in run config: {config['run']}.")
+            sys.exit()
+        run_answer = "0"
+        if config["run"] != "new":
+            run_answer = str(runs.index(config["run"]) + 1)
+
+    recover_answer = None
+    if "recover" in config:
+        recover_answer = "y" if config["recover"] else "n"
+
+    # Run queue, see runqueue.py. Methods already in the run are recovered or
+    # overwritten as answered here, decks of new methods are parsed in the background
+    if queue:
+        while True:
+            idx = prompt("Run id (0 for new): ", run_answer, interactive)
+            run_answer = None
+            try:
+                run_idx = int(idx)
+                run_id = runs[run_idx - 1] if run_idx else None
+            except (ValueError, IndexError):
+                logger.error("Invalid run id.")
+                continue
+            break
+
+        if run_id is None:
+            run_id = hex(int((time.time() % 3600e4) * 1e6))
+        run_dir_path = os.path.join(runs_dir_path, run_id)
+        os.makedirs(run_dir_path, exist_ok=True)
+
+        recover = {}
+        for name in queue:
+            if os.path.exists(os.path.join(run_dir_path, f"{name}.json")):
+                while True:
+                    answer = prompt(
+                        f"Run {run_id} already contains {name} method."
+                        " Recover this run? (y/n) ",
+                        recover_answer,
+                        interactive,
+                    )
+                    if answer in ["y", "n"]:
+                        break
+                    logger.error("Please type y or n.")
+                if answer == "y":
+                    recover[name] = config.get("state", {}).get(
+                        name, None if interactive else {}
+                    )
+
+        import helpers as hp
+        import runqueue as rq
+
+        try:
+            completed = rq.run_queue(
+                queue,
+                run_id,
+                run_dir_path,
+                layout_dir_path,
+                state_dir_path,
+                cache_dir_path,
+                recover,
+                config.get("parameters", {}),
+                cache=not args.no_cache,
+                pipeline=config.get("pipeline", False),
+                policy=tip_policy,
+            )
+        except KeyboardInterrupt:
+            logger.warning("Keyboard interrupt received. Exiting...")
+            hp.notify(f"Queue {queue} for run {run_id} interrupted by user.")
+            sys.exit()
+        sys.exit(0 if completed else 1)
+
+    # Deck is parsed after the last prompt for new runs
     while True:
-        idx = input("Run id (0 for new): ")
+        parse_deck = False
+        idx = prompt("Run id (0 for new): ", run_answer, interactive)
+        # Answer is used once, failed run selections prompt or exit instead of looping
+        run_answer = None
         try:
             run_idx = int(idx)
 
@@ -131,9 +434,7 @@ if __name__ == "__main__":
                 state = st.load_state(state_path)
                 st.save_state(state, state_path)
 
-                deck = dk.get_deck(layout_path)
-                deck = dk.add_dataframes(deck)
-                st.save_deck_state(labware_path, deck)
+                parse_deck = True
 
             # Recover or overwrite existing run
             else:
@@ -142,14 +443,16 @@ if __name__ == "__main__":
                     methods = [
                         f[:-5]
                         for f in os.listdir(os.path.join(runs_dir_path, run_id))
-                        if f.endswith(".json")
+                        if f in state_files
                     ]
 
                     if method in methods:
                         while True:
-                            recover = input(
+                            recover = prompt(
                                 f"Run {run_id} already contains {method} method."
-                                " Recover this run? (y/n) "
+                                " Recover this run? (y/n) ",
+                                recover_answer,
+                                interactive,
                             )
 
                             if recover == "y":
@@ -167,7 +470,11 @@ if __name__ == "__main__":
                                         f"State file not found for {method} method. Was"
                                         " the correct method specified?"
                                     ) from e
-                                state = st.recover_state(state_path)
+                                # State values from run config are set without prompt
+                                state = st.recover_state(
+                                    state_path,
+                                    config.get("state", None if interactive else {}),
+                                )
 
                                 layout_path = os.path.join(
                                     run_dir_path, f"{method}.lay"
@@ -184,9 +491,7 @@ if __name__ == "__main__":
 
                                 labware_path = os.path.join(run_dir_path, f"{method}")
                                 try:
-                                    with open(
-                                        f"{labware_path}.dat", "rt", encoding="utf-8"
-                                    ) as f:
+                                    with open(f"{labware_path}.db", "rb") as f:
                                         logger.debug("Labware path: %s", labware_path)
                                 except FileNotFoundError as e:
                                     logger.exception(e)
@@ -234,9 +539,7 @@ if __name__ == "__main__":
                                 state = st.load_state(state_path)
                                 st.save_state(state, state_path)
 
-                                deck = dk.get_deck(layout_path)
-                                deck = dk.add_dataframes(deck)
-                                st.save_deck_state(labware_path, deck)
+                                parse_deck = True
 
                             else:
                                 logger.error("Please type y or n.")
@@ -261,9 +564,7 @@ if __name__ == "__main__":
                         state = st.load_state(state_path)
                         st.save_state(state, state_path)
 
-                        deck = dk.get_deck(layout_path)
-                        deck = dk.add_dataframes(deck)
-                        st.save_deck_state(labware_path, deck)
+                        parse_deck = True
 
                 except IndexError:
                     logger.error("Invalid run id.")
@@ -273,6 +574,18 @@ if __name__ == "__main__":
             continue
         break
 
+    import commands as cmd
+    import deck as dk
+    import helpers as hp
+    import tracing as tr
+
+    # Tip racks of recovered runs keep the policy their deck was created with
+    if parse_deck:
+        deck = dk.get_cached_deck(
+            layout_path, cache_dir_path, cache=not args.no_cache, policy=tip_policy
+        )
+        st.save_deck_state(labware_path, deck)
+
     # Persistent logging
     f_method_handler = logging.FileHandler(os.path.join(run_dir_path, f"{method}.log"))
     f_method_handler.setLevel(logging.DEBUG)
@@ -282,12 +595,24 @@ if __name__ == "__main__":
     f_method_handler.setFormatter(f__method_format)
     logger.addHandler(f_method_handler)
 
+    # Commands are traced to JSONL and exported for Perfetto, see tracing.py
+    trace_path = os.path.join(run_dir_path, f"{method}_trace.jsonl")
+    chrome_trace_path = os.path.join(run_dir_path, f"{method}_trace.json")
+
+    # Methods create their interface, which enters pipelined mode if enabled
+    script = importlib.import_module(f".{method}", "methods")
+    if config.get("pipeline", False):
+        script.HamiltonInterface = cmd.pipelined(script.HamiltonInterface)
+
     # Run method
     for attempt in range(3):
-        script = importlib.import_module(f".{method}", "methods")
         try:
-            with shelve.open(labware_path, writeback=True) as shelf:
+            with (
+                st.load_deck_state(labware_path) as shelf,
+                tr.Tracer(trace_path, chrome_trace_path),
+            ):
                 script.run(shelf, state, run_dir_path)
+                dk.report_tip_policies(shelf)
         except KeyboardInterrupt:
             logger.warning("Keyboard interrupt received. Exiting...")
             hp.notify(f"Method {method} for run {run_id} interrupted by user.")
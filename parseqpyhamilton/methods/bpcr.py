@@ -12,6 +12,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"plates": int}
+
 # Liquid classes
 MIXING = "50ulTip_conductive_384COREHead_Water_DispenseSurface_Empty"
 
@@ -25,7 +28,7 @@ def run(
     state_file_path = os.path.join(run_dir_path, "bpcr.json")
 
     # Plate information and variables
-    plates = hp.prompt_int("Plates to process", 4)
+    plates = hp.prompt_int("Plates to process", 4, key="plates")
 
     # Delete unused labware
     n = 4 - plates
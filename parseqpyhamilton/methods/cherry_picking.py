@@ -15,6 +15,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"csv_path": str}
+
 # Liquid classes
 WATER = "Tip_50ul_Water_DispenseJet_Empty"
 
@@ -26,32 +29,64 @@ def run(
 ):
     # File paths
     state_file_path = os.path.join(run_dir_path, "cherry_picking.json")
-    csv_path = hp.prompt_file_path("Input CSV file (cherry.csv)")
-
-    # Get plates and well map from csv files
-    l, source_plates = hp.process_cherry_csv(csv_path, run_dir_path)
-
-    well_map = [(t[2], t[5], t[1]) for t in l]
-
-    # Delete unused labware
-    for p in ["E1", "E2", "E3", "F1", "F2", "F3"]:
-        dk.delete_lids(shelf, p)
+    index_path = os.path.join(run_dir_path, "cherry_picking_wells.json")
 
+    # Plate stack positions
     src_pos = [("E1", "F1"), ("E2", "F2")]
-    remove = len(src_pos) * 6 - len(source_plates)
-    for t in src_pos[::-1]:
-        n = min(remove, 6)
-        dk.delete_unused(shelf, t[0], n)
-        dk.delete_unused(shelf, t[1], n)
-        remove -= n
 
-    n = 6 - math.ceil(len(well_map) / 384)
-    dk.delete_unused(shelf, "E3", n)
-    dk.delete_unused(shelf, "F3", n)
+    # Get plates and well map from csv files, grouped by source plate
+    # Transfers are planned once and saved with the run, removed as they are done
+    # Done transfers are saved with the deck (tip masks) at the next state change
+    index = st.load_well_index(index_path)
+    if index is None:
+        csv_path = hp.prompt_file_path("Input CSV file (cherry.csv)", "csv_path")
+        well_map = hp.process_cherry_csv(csv_path, run_dir_path)
+        hp.check_plates(well_map, "plate", 12)
+
+        # Plan transfers for each source plate, pairing wells for both channels
+        plans = {}
+        wells = hp.index_wells(well_map, "plate", ["well", "target"])
+        for plate, transfers in wells.items():
+            cycles = lw.pair_transfers(transfers, (16, 24), 4)
+            plans[plate] = [[transfers[i] for i in cycle] for cycle in cycles]
+
+        index = {"plans": plans, "plates": list(plans), "wells": len(well_map)}
+
+        # Delete unused labware, deck is saved before the index
+        for p in ["E1", "E2", "E3", "F1", "F2", "F3"]:
+            dk.delete_lids(shelf, p)
+
+        remove = len(src_pos) * 6 - len(index["plates"])
+        for t in src_pos[::-1]:
+            n = min(remove, 6)
+            dk.delete_unused(shelf, t[0], n)
+            dk.delete_unused(shelf, t[1], n)
+            remove -= n
+
+        n = 6 - math.ceil(index["wells"] / 384)
+        dk.delete_unused(shelf, "E3", n)
+        dk.delete_unused(shelf, "F3", n)
+
+        st.save_well_index(index, index_path)
+
+        cycles = sum(len(plan) for plan in plans.values())
+        logger.info(
+            f"Cherry picking {len(well_map)} wells in {cycles} pipetting cycles"
+            f" ({len(well_map) - cycles} fewer than with a single channel)."
+        )
+        logger.info(f"Load source plates {index['plates']} bottom to top.")
+
+    # Source plates left to process
+    source_plates = list(index["plans"])
 
     # Labware aliases
+    # Source plates already fetched or returned in a recovered run are skipped
+    stacked = len(source_plates) - state["active_src_plate"]
+    returned = len(index["plates"]) - len(source_plates)
     src_plates = [l for i in range(len(src_pos)) for l in shelf["F"][i]["frame"]]
+    src_plates = src_plates[:stacked]
     src_plates_done = [l for i in range(len(src_pos)) for l in shelf["E"][i]["frame"]]
+    src_plates_done = src_plates_done[returned:]
 
     tgt_plates = shelf["E"][2]["frame"]
     tgt_plates_done = shelf["F"][2]["frame"]
@@ -66,9 +101,9 @@ def run(
     active_rack_96_50, transport_rack_96_50 = shelf["F"][4]["frame"]
 
     # Check if there are enough tips on deck to pick all wells
-    if len(well_map) > (len(racks_96_50) + 1) * 96:
+    if index["wells"] > (len(racks_96_50) + 1) * 96:
         logger.warning(
-            f"Number of tips needed ({len(well_map)}) is larger than number of"
+            f"Number of tips needed ({index['wells']}) is larger than number of"
             f" tips available ({(len(racks_96_50) + 1) * 96})."
         )
         logger.info("Script will prompt user to add more tip racks when needed.")
@@ -78,6 +113,10 @@ def run(
         # Initialize Hamilton
         cmd.initialize(hammy)
 
+        # Transfers left on the active source plate of a recovered run
+        if state["active_src_plate"]:
+            current_map = index["plans"][source_plates[-1]]
+
         # Loop over plates as long as there are still source plates to process
         while source_plates:
             # Get next source plate if not already done
@@ -89,7 +128,7 @@ def run(
                 )
                 cmd.grip_place(hammy, tmp_src_lid.lid, mode=1)
 
-                current_map = [t for t in well_map if t[2] == source_plates[-1]]
+                current_map = index["plans"][source_plates[-1]]
 
                 dk.delete_labware(shelf, src_plates.pop().plate)
                 st.set_state(state, state_file_path, "active_src_plate", 1)
@@ -118,7 +157,7 @@ def run(
                 )
                 cmd.grip_place(hammy, src_plates_done[0].plate)
 
-                del source_plates[-1]
+                del index["plans"][source_plates.pop()]
 
                 dk.delete_labware(shelf, src_plates_done.pop(0).plate)
                 st.set_state(state, state_file_path, "active_src_plate", 0)
@@ -135,12 +174,18 @@ def run(
                 dk.delete_labware(shelf, racks_96_50.pop().rack)
                 active_rack_96_50.reset()
 
-            # Transfer culture media from source well to target well
-            cmd.tip_pick_up(hammy, active_rack_96_50.ch2(1))
+            # Transfer culture media from source wells to target wells
+            # Split pairs if only one tip is left in the active rack
+            transfer = current_map.pop(0)
+            if len(transfer) > active_rack_96_50.total():
+                current_map.insert(0, transfer[1:])
+                transfer = transfer[:1]
+
+            cmd.tip_pick_up(hammy, active_rack_96_50.ch2(len(transfer)))
             cmd.aspirate(
                 hammy,
-                active_src_plate.static([current_map[0][0]]),
-                [5],
+                active_src_plate.static([t[0] for t in transfer]),
+                [5] * len(transfer),
                 liquidHeight=0.5,
                 mixCycles=3,
                 mixVolume=20.0,
@@ -148,8 +193,8 @@ def run(
             )
             cmd.dispense(
                 hammy,
-                active_tgt_plate.static([current_map.pop(0)[1]]),
-                [5],
+                active_tgt_plate.static([t[1] for t in transfer]),
+                [5] * len(transfer),
                 liquidHeight=0.5,
                 dispenseMode=9,
                 liquidClass=WATER,
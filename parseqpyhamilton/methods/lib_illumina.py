@@ -4,6 +4,7 @@ import commands as cmd
 import deck as dk
 import state as st
 import helpers as hp
+import schedule as sc
 
 from pyhamilton import (
     HamiltonInterface,
@@ -17,6 +18,14 @@ from pyhamilton import (
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {
+    "pools": int,
+    "ratio": float,
+    "sample_volume": float,
+    "elute_volume": float,
+}
+
 # Constants
 
 TIPS = 96
@@ -28,12 +37,12 @@ ETHANOL = "StandardVolume_EtOH_DispenseJet_Empty"
 def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: str):
     # Pool information and variables
 
-    pools = hp.prompt_int("Pools to purify", 24)
+    pools = hp.prompt_int("Pools to purify", 24, key="pools")
     eppies = [f"P{i}" for i in range(1, pools + 1)]
 
-    ratio = hp.prompt_float("Ratio of beads to sample", 1.8)
-    sample = hp.prompt_float("Sample volume (uL)", 150)
-    elute_volume = hp.prompt_float("Elution volume (uL)", 50)
+    ratio = hp.prompt_float("Ratio of beads to sample", 1.8, key="ratio")
+    sample = hp.prompt_float("Sample volume (uL)", 150, key="sample_volume")
+    elute_volume = hp.prompt_float("Elution volume (uL)", 50, key="elute_volume")
 
     # Calculate volumes required for purification
 
@@ -108,7 +117,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
 
     logger.info(f"Make sure Alpaqua Magnum EX (magnetic plate) is in position D3.")
 
-    input(f"Press enter to start method!")
+    hp.confirm(f"Press enter to start method!")
 
     logger.debug("Starting Hamilton method...")
 
@@ -131,7 +140,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
                     f"*User action required:* add {TUBE_VOLUME} uL of beads to"
                     " eppendorf carrier. "
                 )
-                input(
+                hp.confirm(
                     f"Add 1 tube filled with {TUBE_VOLUME} uL"
                     " beads to eppendorf carrier position 23. Press enter to continue:"
                     f" {hp.color.END  }"
@@ -168,7 +177,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
                             f"*User action required:* add {TUBE_VOLUME} uL of beads"
                             " to bead tube."
                         )
-                        input(
+                        hp.confirm(
                             f"Refill bead tube with {TUBE_VOLUME} uL of"
                             " beads. Press enter to continue: "
                         )
@@ -215,7 +224,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
                     f"*User action required:* add {pools} pooled sample tubes to"
                     " eppendorf carrier."
                 )
-                input(
+                hp.confirm(
                     "\nRemove beads from eppendorf carrier and add"
                     f" {pools} pooled sample tubes. Press enter to continue:"
                     " "
@@ -269,7 +278,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
 
             # Incubate at RT for 5 minutes
 
-            time.sleep(300)
+            sc.wait("bead binding", 300, time)
 
             # Move plate to magnetic plate
 
@@ -289,7 +298,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
 
             # Wait for 1 minute to allow beads to separate
 
-            time.sleep(60)
+            sc.wait("bead separation", 60, time)
 
             # Remove supernatant
 
@@ -336,7 +345,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
             if not state["add_wash1"]:
                 logger.debug("Adding ethanol to pools for wash 1...")
 
-                input(
+                hp.confirm(
                     f"Add {ethanol_tubes} tube(s) filled with"
                     f" {ethanol_volume} uL 70% ethanol to eppendorf carrier. Press"
                     " enter to continue: "
@@ -391,7 +400,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
             # FIXME: not necessary as removing from all wells > 30 s
             # Incubate 30 seconds
 
-            time.sleep(30)
+            sc.wait("ethanol wash", 30, time)
 
             # Remove ethanol for wash 1
 
@@ -488,7 +497,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
             # FIXME: not necessary as removing from all wells > 30 s
             # Incubate 30 seconds
 
-            time.sleep(30)
+            sc.wait("ethanol wash", 30, time)
 
             # Remove ethanol for wash 2
 
@@ -549,10 +558,10 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
 
             # Dry beads for 5-10 minutes
 
-            time.sleep(300)
+            sc.wait("bead drying", 300, time)
 
             # Add 21 uL of elution buffer to each pool
-            input(
+            hp.confirm(
                 f"Add 1 tube filled with {teb_volume} uL TE Buffer"
                 " to eppendorf carrier position 24. Press enter to"
                 f" continue: {hp.color.END  }"
@@ -606,7 +615,7 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
 
             # Incubate 1 minute
 
-            time.sleep(60)
+            sc.wait("elution", 60, time)
 
             # Move plate back to magnet
 
@@ -626,12 +635,12 @@ def run(shelf: shelve.Shelf, state: dict, state_file_path: str, run_dir_path: st
 
             # Incubate 1 minute
 
-            time.sleep(60)
+            sc.wait("elution separation", 60, time)
 
             # Store purified samples in low volume sample tubes
             # Prompt user to add sample tubes to eppendorf carrier
 
-            input(
+            hp.confirm(
                 f"Add {pools} sample collection tubes to eppendorf"
                 f" carrier. Press enter to continue: {hp.color.END  }"
             )
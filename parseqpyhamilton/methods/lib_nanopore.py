@@ -5,6 +5,7 @@ import commands as cmd
 import deck as dk
 import helpers as hp
 import labware as lw
+import schedule as sc
 import state as st
 
 from pyhamilton import HamiltonInterface
@@ -13,6 +14,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"csv_path": str, "sample_moles": int}
+
 # Liquid classes
 ETHANOL = "50ulTip_conductive_384COREHead_EtOH_DispenseJet_Part"
 ALIQUOT_300 = "StandardVolume_Water_DispenseSurface_Part"
@@ -28,10 +32,12 @@ def run(
 ):
     # File paths
     state_file_path = os.path.join(run_dir_path, "lib_nanopore.json")
-    csv_path = hp.prompt_file_path("Input CSV file (lib_nanopore_concentrations.csv)")
+    csv_path = hp.prompt_file_path(
+        "Input CSV file (lib_nanopore_concentrations.csv)", "csv_path"
+    )
 
     # Sample info
-    sample_moles = hp.prompt_int("Moles per sample (fmol)", 200)
+    sample_moles = hp.prompt_int("Moles per sample (fmol)", 200, key="sample_moles")
 
     # Concentrations and normalization calculations
     sample_c = pd.read_csv(csv_path, names=["Sample", "C [ng/uL]", "bp"])
@@ -119,7 +125,7 @@ def run(
             tips_holder_96in384_50.reset()
 
     # Start method!
-    input(f"Press enter to start method!")
+    hp.confirm(f"Press enter to start method!")
 
     # Main script starts here
     with HamiltonInterface(simulate=True) as hammy:
@@ -173,7 +179,7 @@ def run(
             f"*User action required:* Remove end-prep reagents & add sample tubes"
             f" to carrier."
         )
-        input(f"Press enter to continue: ")
+        hp.confirm(f"Press enter to continue: ")
 
         # Add samples to end prep master mix
         if not state["end_prep_add_samples"]:
@@ -210,7 +216,7 @@ def run(
             f"*User action required:* Incubate end-prep plate in thermocycler, "
             f" remove sample tubes, and add end-prep clean-up reagents."
         )
-        input(f"Press enter to continue: ")
+        hp.confirm(f"Press enter to continue: ")
 
         # Add beads to samples
         if not state["end_prep_add_beads"]:
@@ -243,8 +249,10 @@ def run(
 
             st.set_state(state, state_file_path, "end_prep_add_beads", 1)
 
-        # Incubate for 3 minutes at room temperature
-        time.sleep(60 * 3)
+        # Incubate for 3 minutes at room temperature, refill tip holder in the meantime
+        with sc.incubate("end-prep bead binding", 60 * 3, time):
+            if not state["end_prep_cleanup_supernatant"]:
+                check_tip_holder()
 
         # Move to magnet & remove supernatant
         if not state["end_prep_cleanup_supernatant"]:
@@ -252,7 +260,7 @@ def run(
             cmd.grip_place(hammy, d3.plate)
 
             # Incubate for 3 minutes at room temperature
-            time.sleep(60 * 3)
+            sc.wait("end-prep bead separation", 60 * 3, time)
 
             check_tip_holder()
 
@@ -279,7 +287,7 @@ def run(
                         liquidHeight=9.0,
                     )
 
-                time.sleep(60)
+                sc.wait("end-prep ethanol wash", 60, time)
 
                 for _ in range(3):
                     cmd.aspirate_384(
@@ -295,7 +303,7 @@ def run(
             st.set_state(state, state_file_path, "end_prep_cleanup_wash", 1)
 
         # Dry samples
-        time.sleep(30)
+        sc.wait("end-prep bead drying", 30, time)
 
         # Elute samples
         if not state["end_prep_cleanup_elute"]:
@@ -340,15 +348,14 @@ def run(
             hp.notify(
                 f"*User action required:* Check if elution buffer is mixed with beads."
             )
-            input(f"Press enter to continue: ")
+            hp.confirm(f"Press enter to continue: ")
 
             cmd.grip_get(hammy, c3.plate)
             cmd.grip_place(hammy, d3.plate)
 
-            # Incubate for 2 minutes at room temperature
-            time.sleep(60 * 2)
-
-            check_tip_holder()
+            # Incubate for 2 minutes at room temperature, refill tip holder meanwhile
+            with sc.incubate("end-prep elution", 60 * 2, time):
+                check_tip_holder()
 
             cmd.tip_pick_up_384(hammy, tips_holder_96in384_50.mph384(rows, columns))
             cmd.aspirate_384(hammy, d3.static(end_prep_index), 7.5, liquidHeight=0.1)
@@ -362,7 +369,7 @@ def run(
             f"*User action required:* Remove end-prep clean-up reagents & add"
             f" barcodes to carrier."
         )
-        input(f"Press enter to continue: ")
+        hp.confirm(f"Press enter to continue: ")
 
         # Add barcodes to samples
         if not state["barcode_ligation_add_barcodes"]:
@@ -399,7 +406,7 @@ def run(
             f"*User action required:* Remove barcodes & add ligation reagents to"
             f" carrier."
         )
-        input(f"Press enter to continue: ")
+        hp.confirm(f"Press enter to continue: ")
 
         # Add ligation master mix to samples
         if not state["barcode_ligation_add_mm"]:
@@ -429,7 +436,7 @@ def run(
             st.set_state(state, state_file_path, "barcode_ligation_add_mm", 1)
 
         # Incubate samples for 20 minutes at room temperature
-        time.sleep(60 * 20)
+        sc.wait("barcode ligation", 60 * 20, time)
 
         # Add EDTA to samples
         if not state["barcode_ligation_add_edta"]:
@@ -482,7 +489,7 @@ def run(
 
         # User takes over from here to finish clean-up
         hp.notify("*User action required:* Finish clean-up of barcode ligation.")
-        input(f"Press enter to continue: ")
+        hp.confirm(f"Press enter to continue: ")
 
         # Add adapter reagents to pool
         if not state["adapter_ligation_add_reagents"]:
@@ -533,11 +540,14 @@ def run(
             st.set_state(state, state_file_path, "adapter_ligation_add_reagents", 1)
 
         # Incubate for 20 minutes at room temperature
-        time.sleep(60 * 20)
+        # Beads are premixed during the last minute so they do not settle before use
+        with sc.incubate("adapter ligation", 60 * 20, time) as incubation:
+            if not state["adapter_ligation_add_beads"]:
+                incubation.wait(lead=60)
+                mix_beads()
 
         # Add beads to library
         if not state["adapter_ligation_add_beads"]:
-            mix_beads()
             cmd.tip_pick_up(hammy, tips_96_50.ch2(1))
             cmd.aspirate(
                 hammy,
@@ -559,7 +569,7 @@ def run(
             st.set_state(state, state_file_path, "adapter_ligation_add_beads", 1)
 
         # Incubate for 10 minutes at room temperature
-        time.sleep(60 * 10)
+        sc.wait("adapter ligation bead binding", 60 * 10, time)
 
         # Move to magnet & remove supernatant
         if not state["adapter_ligation_cleanup_supernatant"]:
@@ -600,7 +610,7 @@ def run(
                     mixVolume=75.0,
                 )
 
-                time.sleep(60)
+                sc.wait("fragment buffer wash", 60, time)
 
                 cmd.aspirate(hammy, d3_pool, [150.0], liquidHeight=0.1)
                 cmd.tip_eject(hammy, waste=True)
@@ -608,7 +618,7 @@ def run(
             st.set_state(state, state_file_path, "adapter_ligation_cleanup_wash", 1)
 
         # Dry pool
-        time.sleep(30)
+        sc.wait("adapter ligation bead drying", 30, time)
 
         # Remove from magnet & add elution buffer
         if not state["adapter_ligation_cleanup_elute"]:
@@ -12,6 +12,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"plates": int, "volume": int}
+
 
 def run(
     shelf: shelve.Shelf[list[dict[str, list]]],
@@ -22,8 +25,8 @@ def run(
     state_file_path = os.path.join(run_dir_path, "plate_filling.json")
 
     # Get plate and volume info from prompt
-    plates = hp.prompt_int("Plates to fill", 18)
-    volume = hp.prompt_int("Volume to add", 100)
+    plates = hp.prompt_int("Plates to fill", 18, key="plates")
+    volume = hp.prompt_int("Volume to add", 100, key="volume")
 
     cycles = math.ceil(volume / 50)
     reservoir_volume = volume * plates * 384 / 1000 * 1.2
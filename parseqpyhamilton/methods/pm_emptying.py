@@ -1,4 +1,4 @@
-import os, shutil, csv, logging, shelve, math
+import os, logging, shelve, math
 
 import commands as cmd
 import deck as dk
@@ -13,6 +13,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"csv_path": str}
+
 # Liquid classes
 ETHANOL_ASPIRATE = "StandardVolume_EtOH_DispenseJet_Empty"
 ETHANOL_DISPENSE = "StandardVolume_EtOH_DispenseJet_Part"
@@ -25,41 +28,49 @@ def run(
 ):
     # File paths
     state_file_path = os.path.join(run_dir_path, "pm_emptying.json")
-    csv_path = hp.prompt_file_path("Input CSV file (sorted_well_map.csv)")
-
-    # Get plates and well map from csv files
-    hp.process_pm_csv(csv_path, run_dir_path, "emptying")
-    plate_map_path = os.path.join(run_dir_path, "emptying_plate_map.csv")
-    well_map_path = os.path.join(run_dir_path, "emptying_sorted_well_map.csv")
-    shutil.copy(csv_path, well_map_path)
-
-    with open(plate_map_path, "r") as f:
-        reader = csv.reader(f)
-        plate_map = [tuple(row) for row in reader]
-
-    plates = [t[1] for t in plate_map if t[1] != ""]
-
-    with open(well_map_path, "r") as f:
-        reader = csv.reader(f)
-        well_map = [tuple(row) for row in reader]
-
-    wells = [(t[2], t[3]) for t in well_map]
-
-    # Delete unused labware
-    for p in ["E1", "E2", "E3", "F1", "F2", "F3"]:
-        dk.delete_lids(shelf, p)
+    index_path = os.path.join(run_dir_path, "pm_emptying_wells.json")
 
+    # Plate stack positions
     pos = [("E1", "F1"), ("E2", "F2"), ("E3", "F3")]
-    remove = len(pos) * 6 - len(plates)
-    for t in pos[::-1]:
-        n = min(remove, 6)
-        dk.delete_unused(shelf, t[0], n)
-        dk.delete_unused(shelf, t[1], n)
-        remove -= n
+
+    # Get plates and well map from csv files
+    # Wells are grouped by plate once and saved with the run for recovery
+    index = st.load_well_index(index_path)
+    if index is None:
+        csv_path = hp.prompt_file_path(
+            "Input CSV file (sorted_well_map.csv)", "csv_path"
+        )
+        well_map = hp.process_pm_csv(csv_path, run_dir_path, "emptying")
+        hp.check_plates(well_map, "target_plate", 18)
+
+        index = {
+            "plates": hp.index_wells(well_map, "target_plate", "target_well"),
+            "fetched": {"plates": []},
+        }
+
+        # Delete unused labware, deck is saved before the index
+        for p in ["E1", "E2", "E3", "F1", "F2", "F3"]:
+            dk.delete_lids(shelf, p)
+
+        remove = len(pos) * 6 - len(index["plates"])
+        for t in pos[::-1]:
+            n = min(remove, 6)
+            dk.delete_unused(shelf, t[0], n)
+            dk.delete_unused(shelf, t[1], n)
+            remove -= n
+
+        st.save_well_index(index, index_path)
+
+    # Plates left in stacks
+    plates = [p for p in index["plates"] if p not in index["fetched"]["plates"]]
 
     # Labware aliases
+    # Plates already fetched or returned in a recovered run are skipped
+    returned = len(index["fetched"]["plates"]) - state["active_plate"]
     bact_plates = [l for i in range(len(pos)) for l in shelf["F"][i]["frame"]]
+    bact_plates = bact_plates[: len(plates)]
     bact_plates_done = [l for i in range(len(pos)) for l in shelf["E"][i]["frame"]]
+    bact_plates_done = bact_plates_done[returned:]
 
     active_lid, active_plate = shelf["E"][4]["frame"]
     tmp_lid = shelf["E"][3]["frame"][0]
@@ -76,7 +87,7 @@ def run(
         cmd.initialize(hammy)
 
         # Loop over plates as long as there are plates left to empty
-        while plates:
+        while plates or state["active_plate"]:
             # Get next plate if not already done
             if not state["active_plate"]:
                 cmd.grip_get(hammy, bact_plates[-1].plate, gripWidth=82.0)
@@ -87,9 +98,9 @@ def run(
                 cmd.grip_place(hammy, tmp_lid.lid, mode=1)
 
                 # Build well list for current plate
-                active_plate.fill([t[0] for t in wells if t[1] == plates[-1]])
+                active_plate.fill(index["plates"][plates[-1]])
 
-                del plates[-1]
+                index["fetched"]["plates"].append(plates.pop())
                 dk.delete_labware(shelf, bact_plates.pop().plate)
                 st.set_state(state, state_file_path, "active_plate", 1)
                 st.set_state(state, state_file_path, "remove_media", 0)
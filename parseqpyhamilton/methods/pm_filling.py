@@ -1,10 +1,11 @@
-import os, shutil, csv, logging, shelve, math
+import os, logging, shelve, math
 
 import commands as cmd
 import deck as dk
 import helpers as hp
 import labware as lw
 import state as st
+import visits as vs
 
 from pyhamilton import HamiltonInterface
 
@@ -13,6 +14,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"csv_path": str}
+
 
 def run(
     shelf: shelve.Shelf[list[dict[str, list]]],
@@ -21,52 +25,68 @@ def run(
 ):
     # File paths
     state_file_path = os.path.join(run_dir_path, "pm_filling.json")
-    csv_path = hp.prompt_file_path("Input CSV file (sorted_well_map.csv)")
-
-    # Get plates and well map from csv files
-    hp.process_pm_csv(csv_path, run_dir_path, "filling")
-    plate_map_path = os.path.join(run_dir_path, "filling_plate_map.csv")
-    well_map_path = os.path.join(run_dir_path, "filling_sorted_well_map.csv")
-    shutil.copy(csv_path, well_map_path)
-
-    with open(plate_map_path, "r") as f:
-        reader = csv.reader(f)
-        plate_map = [tuple(row) for row in reader]
-
-    source_plates = [t[0] for t in plate_map if t[0] != ""]
-    target_plates = [t[1] for t in plate_map if t[1] != ""]
-
-    with open(well_map_path, "r") as f:
-        reader = csv.reader(f)
-        well_map = [tuple(row) for row in reader]
-
-    source_wells = [(t[0], t[1]) for t in well_map]
-    target_wells = [(t[2], t[3]) for t in well_map]
+    index_path = os.path.join(run_dir_path, "pm_filling_wells.json")
 
-    # Delete unused labware
-    for p in ["E1", "E2", "E3", "F1", "F2", "F3"]:
-        dk.delete_lids(shelf, p)
+    # Plate stack positions
+    tgt_pos = [("E2", "F2"), ("E3", "F3")]
 
-    n = 6 - len(source_plates)
-    dk.delete_unused(shelf, "E1", n)
-    dk.delete_unused(shelf, "F1", n)
+    # Get plates and well map from csv files, ordered by plate visits
+    # Wells are grouped by plate once and saved with the run for recovery
+    index = st.load_well_index(index_path)
+    if index is None:
+        csv_path = hp.prompt_file_path(
+            "Input CSV file (sorted_well_map.csv)", "csv_path"
+        )
+        well_map = hp.process_pm_csv(csv_path, run_dir_path, "filling", order=True)
+        hp.check_plates(well_map, "source_plate", 6)
+        hp.check_plates(well_map, "target_plate", 12)
+
+        index = {
+            "source": hp.index_wells(well_map, "source_plate", "source_well"),
+            "target": hp.index_wells(well_map, "target_plate", "target_well"),
+            "fetched": {"source": [], "target": []},
+        }
+
+        # Delete unused labware, deck is saved before the index
+        for p in ["E1", "E2", "E3", "F1", "F2", "F3"]:
+            dk.delete_lids(shelf, p)
+
+        n = 6 - len(index["source"])
+        dk.delete_unused(shelf, "E1", n)
+        dk.delete_unused(shelf, "F1", n)
+
+        remove = len(tgt_pos) * 6 - len(index["target"])
+        for t in tgt_pos[::-1]:
+            n = min(remove, 6)
+            dk.delete_unused(shelf, t[0], n)
+            dk.delete_unused(shelf, t[1], n)
+            remove -= n
+
+        st.save_well_index(index, index_path)
+
+        swaps = vs.count_swaps(well_map, "source_plate")
+        swaps += vs.count_swaps(well_map, "target_plate")
+        logger.info(
+            f"Load source plates {list(index['source'])} and target plates"
+            f" {list(index['target'])} bottom to top, {swaps} plate swaps for"
+            f" {len(index['source']) + len(index['target'])} plates."
+        )
 
-    tgt_pos = [("E2", "F2"), ("E3", "F3")]
-    remove = len(tgt_pos) * 6 - len(target_plates)
-    for t in tgt_pos[::-1]:
-        n = min(remove, 6)
-        dk.delete_unused(shelf, t[0], n)
-        dk.delete_unused(shelf, t[1], n)
-        remove -= n
+    # Plates left in stacks
+    source_plates = [p for p in index["source"] if p not in index["fetched"]["source"]]
+    target_plates = [p for p in index["target"] if p not in index["fetched"]["target"]]
 
     # Labware aliases
     src_plates = shelf["F"][0]["frame"]
     src_plates_done = shelf["E"][0]["frame"]
 
+    # Target plates already fetched or returned in a recovered run are skipped
+    returned = len(index["fetched"]["target"]) - state["active_tgt_plate"]
     tgt_plates = [l for i in range(len(tgt_pos)) for l in shelf["F"][i + 1]["frame"]]
+    tgt_plates = tgt_plates[: len(target_plates)]
     tgt_plates_done = [
         l for i in range(len(tgt_pos)) for l in shelf["E"][i + 1]["frame"]
-    ]
+    ][returned:]
 
     active_src_lid, active_src_plate = shelf["E"][4]["frame"]
     active_tgt_lid, active_tgt_plate = shelf["E"][3]["frame"]
@@ -78,9 +98,10 @@ def run(
     active_rack_96_300, transport_rack_96_300 = shelf["F"][4]["frame"]
 
     # Check if there are enough tips on deck to pick all wells
-    if len(source_wells) > (len(racks_96_300) + 1) * 96:
+    tips = sum(len(wells) for wells in index["source"].values())
+    if tips > (len(racks_96_300) + 1) * 96:
         logger.warning(
-            f"Number of tips needed ({len(source_wells)}) is larger than number of"
+            f"Number of tips needed ({tips}) is larger than number of"
             f" tips available ({(len(racks_96_300) + 1) * 96})."
         )
         logger.info("Script will prompt user to add more tip racks when needed.")
@@ -93,7 +114,7 @@ def run(
         # Loop over plates as long as there are still plates (source or target) to process
         while src_plates_done or tgt_plates_done:
             # Get next source plate if not already done
-            if not state["active_src_plate"]:
+            if not state["active_src_plate"] and source_plates:
                 cmd.grip_get(hammy, src_plates[-1].plate, gripWidth=82.0)
                 cmd.grip_place(hammy, active_src_plate.plate)
                 cmd.grip_get(
@@ -102,11 +123,9 @@ def run(
                 cmd.grip_place(hammy, tmp_src_lid.lid, mode=1)
 
                 # Build list source wells for current plate
-                active_src_plate.fill(
-                    [t[0] for t in source_wells if t[1] == source_plates[-1]]
-                )
+                active_src_plate.fill(index["source"][source_plates[-1]])
 
-                del source_plates[-1]
+                index["fetched"]["source"].append(source_plates.pop())
                 del src_plates[-1]
                 st.set_state(state, state_file_path, "active_src_plate", 1)
 
@@ -120,17 +139,15 @@ def run(
                 cmd.grip_place(hammy, tmp_tgt_lid.lid, mode=1)
 
                 # Build list of target wells for current plates
-                active_tgt_plate.fill(
-                    [t[0] for t in target_wells if t[1] == target_plates[-1]]
-                )
+                active_tgt_plate.fill(index["target"][target_plates[-1]])
 
-                del target_plates[-1]
+                index["fetched"]["target"].append(target_plates.pop())
                 dk.delete_labware(shelf, tgt_plates.pop().plate)
                 st.set_state(state, state_file_path, "active_tgt_plate", 1)
 
             # Check if there are still wells to process in the current source plate
             # Swich to next source plate if current one is empty
-            if active_src_plate.total() == 0:
+            if state["active_src_plate"] and active_src_plate.total() == 0:
                 cmd.grip_get(
                     hammy, tmp_src_lid.lid, mode=1, gripWidth=85.2, gripHeight=5.0
                 )
@@ -145,8 +162,8 @@ def run(
                 continue
 
             # Check if there are still wells available in the current target plate
-            # Swich to next target plate if current one is full
-            if active_tgt_plate.total() == 0:
+            # Swich to next target plate if current one is full or all sources are done
+            if active_tgt_plate.total() == 0 or not src_plates_done:
                 cmd.grip_get(
                     hammy, tmp_tgt_lid.lid, mode=1, gripWidth=85.2, gripHeight=5.0
                 )
@@ -12,6 +12,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"plates": int, "tip_column": int}
+
 
 def run(
     shelf: shelve.Shelf[list[dict[str, list]]],
@@ -22,7 +25,7 @@ def run(
     state_file_path = os.path.join(run_dir_path, "pooling.json")
 
     # Plate information and variables
-    plates = hp.prompt_int("Plates to pool", 8)
+    plates = hp.prompt_int("Plates to pool", 8, key="plates")
 
     # Delete unused labware
     n = 8 - plates
@@ -63,7 +66,9 @@ def run(
         cmd.initialize(hammy)
 
         # Load tips into column holder
-        tip_column = hp.prompt_int("Current tip column in holder (0 for new rack)", 12)
+        tip_column = hp.prompt_int(
+            "Current tip column in holder (0 for new rack)", 12, key="tip_column"
+        )
 
         if tip_column > 0:
             tips_holder_96in384_50.fill(lw.pos_row_96(8 * tip_column))
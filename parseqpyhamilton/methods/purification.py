@@ -4,6 +4,7 @@ import commands as cmd
 import deck as dk
 import helpers as hp
 import labware as lw
+import schedule as sc
 import state as st
 
 from pyhamilton import HamiltonInterface
@@ -12,6 +13,9 @@ from pyhamilton import HamiltonInterface
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# Run parameters in {key: type} format, answered by the run config (see main.py)
+PARAMETERS = {"pools": int, "tip_column": int}
+
 # Liquid classes
 ETHANOL = "StandardVolume_EtOH_DispenseJet_Empty"
 MIX_300 = "StandardVolume_Water_DispenseSurface_Empty"
@@ -27,7 +31,7 @@ def run(
     state_file_path = os.path.join(run_dir_path, "purification.json")
 
     # Pool information and variables
-    pools = hp.prompt_int("Pools to purify", 24)
+    pools = hp.prompt_int("Pools to purify", 24, key="pools")
     bead_ratio = 1.0  # hp.prompt_float("Ratio of beads to sample", 1.8)
     sample_volume = 75.0  # hp.prompt_float("Sample volume (uL)", 150)
     elute_volume = 20.0  # hp.prompt_float("Elution volume (uL)", 50)
@@ -94,7 +98,7 @@ def run(
         tips_holder_96in384_50.reset()
 
     # Start method!
-    input(f"Press enter to start method!")
+    hp.confirm(f"Press enter to start method!")
 
     # Main script starts here
     with HamiltonInterface(simulate=True) as hammy:
@@ -102,7 +106,9 @@ def run(
         cmd.initialize(hammy)
 
         # Load tips into column holder
-        tip_column = hp.prompt_int("Current tip column in holder (0 for new rack)", 12)
+        tip_column = hp.prompt_int(
+            "Current tip column in holder (0 for new rack)", 12, key="tip_column"
+        )
 
         if tip_column > 0:
             tips_holder_96in384_50.fill(lw.pos_row_96(rows * tip_column))
@@ -117,7 +123,7 @@ def run(
             # Add beads to 96-well plate
             if not state["add_beads"]:
                 # Prompt user to add beads to carrier
-                input(f"Add bead tube to carrier in position C6.")
+                hp.confirm(f"Add bead tube to carrier in position C6.")
 
                 mix_beads()
 
@@ -145,7 +151,7 @@ def run(
 
             # Add samples to 96-well plate
             if not state["add_samples"]:
-                input(f"Add sample tubes to carrier in positions: {sample_index}.")
+                hp.confirm(f"Add sample tubes to carrier in positions: {sample_index}.")
 
                 while carrier.total() > 0:
                     channels = min(carrier.total(), 2)
@@ -189,8 +195,10 @@ def run(
 
                 st.set_state(state, state_file_path, "mix_beads", 1)
 
-            # Incubate at RT for 2 minutes
-            time.sleep(60 * 2)
+            # Incubate at RT for 2 minutes, refill tip holder in the meantime
+            with sc.incubate("bead binding", 60 * 2, time):
+                if not state["remove_supernatant"]:
+                    check_tip_holder()
 
             # Move plate to magnetic plate
             if not state["move_beads"]:
@@ -200,7 +208,7 @@ def run(
                 st.set_state(state, state_file_path, "move_beads", 1)
 
             # Wait for 1 minute to allow beads to separate
-            time.sleep(60)
+            sc.wait("bead separation", 60, time)
 
             # Remove supernatant
             if not state["remove_supernatant"]:
@@ -229,7 +237,7 @@ def run(
                     cmd.dispense_384(hammy, magnet.static(sample_index), 50.0)
 
                 # Incubate 30 seconds
-                time.sleep(30)
+                sc.wait("ethanol wash", 30, time)
 
                 # Remove ethanol
                 for _ in range(cycles):
@@ -252,7 +260,7 @@ def run(
                     cmd.dispense_384(hammy, magnet.static(sample_index), 50.0)
 
                 # Incubate 30 seconds
-                time.sleep(30)
+                sc.wait("ethanol wash", 30, time)
 
                 # Remove ethanol
                 for _ in range(cycles):
@@ -269,14 +277,15 @@ def run(
 
                 st.set_state(state, state_file_path, "move_wash", 1)
 
-            # Dry beads for 2 minutes
-            time.sleep(60 * 2)
+            # Dry beads for 2 minutes, prompt user to add buffer in the meantime
+            with sc.incubate("bead drying", 60 * 2, time):
+                if not state["add_buffer"]:
+                    hp.confirm(f"Add buffer tube to carrier in position D6.")
+                if not state["mix_buffer"]:
+                    check_tip_holder()
 
             # Add elution buffer to sample wells
             if not state["add_buffer"]:
-                # Prompt user to add buffer to carrier
-                input(f"Add buffer tube to carrier in position D6.")
-
                 cmd.tip_pick_up(hammy, tips_96_300.ch2(1))
                 # Loop over wells, aspirating max bead volume and dispensing consecutively
                 while plate.total() > 0:
@@ -290,7 +299,10 @@ def run(
                     )
                     for _ in range(cycles):
                         cmd.dispense(
-                            hammy, teb, [elute_volume], liquidClass=ALIQUOT_300
+                            hammy,
+                            plate.ch2(1),
+                            [elute_volume],
+                            liquidClass=ALIQUOT_300,
                         )
                     cmd.dispense(
                         hammy, teb, [elute_volume * cycles * 0.2], dispenseMode=9
@@ -317,7 +329,7 @@ def run(
                 st.set_state(state, state_file_path, "mix_buffer", 1)
 
             # Incubate 1 minute
-            time.sleep(60)
+            sc.wait("elution", 60, time)
 
             # Move plate back to magnet
             if not state["move_elute"]:
@@ -326,14 +338,16 @@ def run(
 
                 st.set_state(state, state_file_path, "move_elute", 1)
 
-            # Incubate 1 minute
-            time.sleep(60)
+            # Incubate 1 minute, prompt user to add sample tubes in the meantime
+            with sc.incubate("elution separation", 60, time):
+                if not state["elute_samples"]:
+                    positions = sample_index
+                    hp.confirm(
+                        f"Add sample tubes to carrier in positions: {positions}."
+                    )
 
             # Store purified samples in low volume sample tubes
             if not state["elute_samples"]:
-                # Prompt user to add sample tubes to eppendorf carrier
-                input(f"Add sample tubes to carrier in positions: {sample_index}.")
-
                 while plate.total() > 0:
                     channels = min(carrier.total(), 2)
                     cmd.tip_pick_up(hammy, tips_96_300.ch2(channels))
@@ -0,0 +1,12 @@
+"""
+Tests import lib modules by name, as methods and main.py do.
+"""
+
+# Imports
+import os, sys
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+lib_dir_path = os.path.join(root, "parseqpyhamilton", "lib")
+
+sys.path.insert(0, lib_dir_path)
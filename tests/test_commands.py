@@ -0,0 +1,92 @@
+"""
+Tests for pipelined command submission in commands.py, against the simulator.
+"""
+
+# Imports
+import os
+
+import pytest
+from pyhamilton import Tip96
+from pyhamilton.oemerr import TipPresentError
+
+import commands as cmd
+import schedule as sc
+import simulator as sim
+import state as st
+
+# Tips of a 96-tip rack, in (labware, index) format
+RACK = Tip96("rack")
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    """Barriers and open deck stores are module globals, start each test empty."""
+    monkeypatch.setattr(st, "barriers", [])
+    monkeypatch.setattr(st, "deck_stores", [])
+    monkeypatch.setattr(st, "well_indexes", {})
+
+
+def new_state(tmp_path) -> tuple[dict, str]:
+    path = os.path.join(tmp_path, "method.json")
+    state = {"step": 0}
+    st.save_state(state, path)
+    return state, path
+
+
+def test_set_state_waits_for_pending_commands(tmp_path):
+    state, path = new_state(tmp_path)
+
+    with cmd.pipelined(sim.HamiltonSimulator)() as ham:
+        cmd.tip_pick_up(ham, [(RACK, 0), (RACK, 1)])
+        cmd.tip_eject(ham, waste=True)
+        assert len(cmd.pipelines[ham]) == 2
+        assert len(ham.responses) == 2
+
+        st.set_state(state, path, "step", 1)
+        assert cmd.pipelines[ham] == []
+        assert ham.responses == {}
+
+    assert ham not in cmd.pipelines
+    assert st.barriers == []
+
+
+def test_failed_pending_command_raises_at_barrier(tmp_path):
+    state, path = new_state(tmp_path)
+
+    with pytest.raises(TipPresentError):
+        with cmd.pipelined(sim.HamiltonSimulator)() as ham:
+            # Second pickup fails on the robot, but is only waited on at set_state
+            cmd.tip_pick_up(ham, [(RACK, 0)])
+            cmd.tip_pick_up(ham, [(RACK, 1)])
+            try:
+                st.set_state(state, path, "step", 1)
+            finally:
+                # State is not changed when pending commands failed
+                assert state["step"] == 0
+                assert st.load_state(path) == {"step": 0}
+
+    assert ham not in cmd.pipelines
+
+
+def test_failed_pending_command_raises_when_leaving_block():
+    with pytest.raises(TipPresentError):
+        with cmd.pipelined(sim.HamiltonSimulator)() as ham:
+            cmd.tip_pick_up(ham, [(RACK, 0)])
+            cmd.tip_pick_up(ham, [(RACK, 1)])
+
+
+def test_incubation_starts_after_pending_commands():
+    with cmd.pipelined(sim.HamiltonSimulator)() as ham:
+        cmd.tip_pick_up(ham, [(RACK, 0)])
+        with sc.incubate("test", 0) as incubation:
+            assert cmd.pipelines[ham] == []
+        assert incubation.start is not None
+
+
+def test_commands_wait_without_pipeline():
+    with sim.HamiltonSimulator() as ham:
+        cmd.tip_pick_up(ham, [(RACK, 0)])
+        assert ham not in cmd.pipelines
+        assert ham.responses == {}
+        with pytest.raises(TipPresentError):
+            cmd.tip_pick_up(ham, [(RACK, 1)])
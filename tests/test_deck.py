@@ -0,0 +1,164 @@
+"""
+Regression tests for layout parsing in deck.py. The single-pass parse must match the
+original parse, which assigned labware one resource at a time with PyHamilton's
+assign_unused_resource, for every layout in data/layouts. Cached decks must match
+parsed decks and be parsed again once their layout changes.
+"""
+
+# Imports
+import os, json, shutil, concurrent.futures
+
+import numpy as np
+import pytest
+from pyhamilton import LayoutManager, ResourceType
+from pyhamilton.oemerr import ResourceUnavailableError
+
+import deck as dk
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+layout_dir_path = os.path.join(root, "data", "layouts")
+
+LAYOUTS = sorted(f for f in os.listdir(layout_dir_path) if f.endswith(".lay"))
+
+
+def original_parse(deck: dict, lmgr: LayoutManager) -> dict:
+    """Parse layout as before the single-pass index (user-006)."""
+    for col in deck.keys():
+        for row in range(len(deck[col])):
+            position = col + str(row + 1)
+            resource_list = []
+
+            for resource in dk.TYPES.values():
+                resource_test = lambda line: dk.extract_resource_from_field(
+                    LayoutManager.name_from_line(line), resource, position
+                )
+                resource_type = ResourceType(
+                    resource, resource_test, LayoutManager.name_from_line
+                )
+                while True:
+                    try:
+                        resource_list.append(
+                            LayoutManager.assign_unused_resource(
+                                lmgr, resource_type, reverse=False
+                            )
+                        )
+                    except ResourceUnavailableError:
+                        break
+
+            deck[col][row]["labware"] = resource_list
+
+    return deck
+
+
+def labware(deck: dict) -> dict:
+    """Labware of each slot as (type, layout name) pairs."""
+    return {
+        col: [
+            [(type(l).__name__, l.layout_name()) for l in slot["labware"]]
+            for slot in deck[col]
+        ]
+        for col in deck
+    }
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_parse_layout_file_matches_original(layout):
+    path = os.path.join(layout_dir_path, layout)
+    parsed = dk.parse_layout_file(dk.new_deck(), LayoutManager(path, install=False))
+    original = original_parse(dk.new_deck(), LayoutManager(path, install=False))
+
+    assert labware(parsed) == labware(original)
+    assert labware(dk.clean_deck(parsed)) == labware(dk.clean_deck(original))
+    assert any(slot for slots in labware(parsed).values() for slot in slots)
+
+
+def tip_policies(deck: dict) -> set[str]:
+    return {
+        frame.policy
+        for slots in deck.values()
+        for slot in slots
+        for frame in slot["frame"]
+        if isinstance(frame, dk.lw.tip_96)
+    }
+
+
+def test_get_cached_deck_tip_policy(tmp_path):
+    path = os.path.join(layout_dir_path, "cherry_picking.lay")
+
+    # Policy is set on tip racks of parsed and cached decks, it is not part of the key
+    parsed = dk.get_cached_deck(path, tmp_path, install=False, policy="reserve")
+    cached = dk.get_cached_deck(path, tmp_path, install=False, policy="best")
+
+    assert tip_policies(parsed) == {"reserve"}
+    assert tip_policies(cached) == {"best"}
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_get_deck_keeps_empty_deck():
+    paths = [os.path.join(layout_dir_path, layout) for layout in LAYOUTS]
+    decks = [labware(dk.get_deck(path, install=False)) for path in paths]
+
+    # Decks parsed at the same time, as by the run queue, do not share slots
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        parsed = executor.map(lambda p: dk.get_deck(p, install=False), paths * 2)
+        assert [labware(deck) for deck in parsed] == decks * 2
+
+    assert all(slot["labware"] is None for slots in dk.DECK.values() for slot in slots)
+
+
+def contents(deck: dict) -> dict:
+    """Labware with coordinates and frames with occupancy of each slot."""
+    return {
+        col: [
+            (
+                [
+                    (type(l).__name__, l.layout_name(), l.coordinates)
+                    for l in slot["labware"]
+                ],
+                [
+                    (type(f).__name__, getattr(f, "mask", np.zeros(0)).tolist())
+                    for f in slot["frame"] or []
+                ],
+            )
+            for slot in deck[col]
+        ]
+        for col in deck
+    }
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_snapshot_round_trip(layout):
+    deck = dk.get_deck(os.path.join(layout_dir_path, layout), install=False)
+    snapshot = dk.deck_to_snapshot(deck)
+    rebuilt = dk.deck_from_snapshot(json.loads(json.dumps(snapshot)))
+
+    assert contents(rebuilt) == contents(deck)
+    assert contents(dk.add_dataframes(rebuilt)) == contents(dk.add_dataframes(deck))
+
+
+def test_cache_key_changes_with_layout(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "pooling.lay")
+    shutil.copy(os.path.join(layout_dir_path, "pooling.lay"), path)
+    cache_dir_path = os.path.join(tmp_path, "cache")
+
+    parsed = []
+    get_deck = dk.get_deck
+    monkeypatch.setattr(
+        dk, "get_deck", lambda *args: parsed.append(args[0]) or get_deck(*args)
+    )
+
+    first = dk.get_cached_deck(path, cache_dir_path, install=False)
+    cached = dk.get_cached_deck(path, cache_dir_path, install=False)
+    assert len(parsed) == 1
+    assert contents(cached) == contents(first)
+
+    # Edited layout misses the cache and is parsed again
+    key = dk.deck_cache_key(path)
+    with open(path, "ab") as f:
+        f.write(b"\n")
+    assert dk.deck_cache_key(path) != key
+
+    dk.get_cached_deck(path, cache_dir_path, install=False)
+    assert len(parsed) == 2
+    assert len(os.listdir(cache_dir_path)) == 2
@@ -0,0 +1,55 @@
+"""
+Tests for runtime estimates in estimate.py, with a method module timing an incubation.
+"""
+
+# Imports
+import os, json, time, types
+
+import commands as cmd
+import deck as dk
+import estimate as es
+import schedule as sc
+import state as st
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+layout_path = os.path.join(root, "data", "layouts", "pooling.lay")
+
+
+def method_module() -> types.ModuleType:
+    """Method module like those in methods, incubating between two commands."""
+    script = types.ModuleType("method")
+    script.time = time
+    script.HamiltonInterface = None
+
+    def run(shelf, state, run_dir_path):
+        with script.HamiltonInterface() as hammy:
+            cmd.initialize(hammy)
+            sc.wait("incubation", 600, script.time)
+            st.set_state(state, os.path.join(run_dir_path, "method.json"), "step", 1)
+
+    script.run = run
+    return script
+
+
+def test_incubations_use_simulator_clock(tmp_path):
+    state_path = os.path.join(tmp_path, "method.json")
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"step": 0}, f)
+
+    # Cached deck, so the layout is not installed
+    dk.get_cached_deck(layout_path, tmp_path, install=False)
+
+    script = method_module()
+    start = time.monotonic()
+    ham, steps = es.estimate_method(
+        script, "method", layout_path, state_path, tmp_path, store=True
+    )
+
+    assert [c[0] for c in ham.history] == ["INITIALIZE", "SLEEP"]
+    assert ham.clock == ham.durations["INITIALIZE"] + 600
+    assert steps == [(2, "step")]
+
+    # Time module and method module are restored
+    assert time.monotonic() - start < 600
+    assert script.time is time and script.HamiltonInterface is None
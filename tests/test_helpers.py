@@ -0,0 +1,81 @@
+"""
+Tests for well map reading and ordering in helpers.py.
+"""
+
+# Imports
+import os
+
+import pytest
+
+import helpers as hp
+
+# Cherry picking well map with source plate P1 interleaved with P2
+CHERRY_CSV = """id,plate,well,target
+0,P1,A01,A1
+1,P2,B1,A2
+2,P1,C1,A3
+3,P3,D1,A4
+4,P2,E1,A5
+"""
+
+# Plate merging well map (source well, source plate, target well, target plate)
+PM_CSV = """A1,S1,A1,T1
+B1,S2,A2,T1
+C1,S1,A3,T2
+D1,S3,A4,T1
+E1,S2,A5,T2
+"""
+
+
+def write(tmp_path, text: str) -> str:
+    path = os.path.join(tmp_path, "input.csv")
+    with open(path, "wt", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def test_read_well_map(tmp_path):
+    well_map = hp.read_well_map(
+        write(tmp_path, CHERRY_CSV), wells=["well", "target"], plates=["plate"]
+    )
+
+    assert well_map["well"].tolist() == ["A1", "B1", "C1", "D1", "E1"]
+    assert well_map["well_index"].tolist() == [0, 1, 2, 3, 4]
+    assert well_map["target_index"].tolist() == [0, 16, 32, 48, 64]
+    assert well_map["plate"].cat.categories.tolist() == ["P1", "P2", "P3"]
+
+
+def test_read_well_map_invalid_well(tmp_path):
+    with pytest.raises(SystemExit):
+        hp.read_well_map(
+            write(tmp_path, CHERRY_CSV.replace("E1", "Q1")),
+            wells=["well", "target"],
+            plates=["plate"],
+        )
+
+
+def test_cherry_csv_interleaved_plates(tmp_path):
+    """Interleaved source plates keep their order of first appearance (stack order)."""
+    well_map = hp.process_cherry_csv(write(tmp_path, CHERRY_CSV), tmp_path)
+    wells = hp.index_wells(well_map, "plate", ["well", "target"])
+
+    assert list(wells) == ["P1", "P2", "P3"]
+    assert wells == {
+        "P1": [["A1", "A1"], ["C1", "A3"]],
+        "P2": [["B1", "A2"], ["E1", "A5"]],
+        "P3": [["D1", "A4"]],
+    }
+
+
+def test_pm_csv_order(tmp_path):
+    """Ordered plate merging maps keep every row, each plate block visited once."""
+    path = write(tmp_path, PM_CSV)
+    unordered = hp.process_pm_csv(path, tmp_path, "filling")
+    ordered = hp.process_pm_csv(path, tmp_path, "filling", order=True)
+
+    assert unordered["source_well"].tolist() == ["A1", "B1", "C1", "D1", "E1"]
+    assert sorted(ordered.index) == sorted(unordered.index)
+
+    blocks = list(zip(ordered["source_plate"], ordered["target_plate"]))
+    visits = [b for i, b in enumerate(blocks) if i == 0 or b != blocks[i - 1]]
+    assert len(visits) == len(set(visits))
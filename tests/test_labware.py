@@ -0,0 +1,286 @@
+"""
+Tests for labware.py. Position grouping (sort_list, group_list) is checked for
+properties on seeded random position sets and against the pairwise greedy it replaced,
+384-head block selection against a scan of every block, tip allocation policies on
+fixed racks.
+"""
+
+# Imports
+import itertools, random
+
+import numpy as np
+import pytest
+from pyhamilton import Plate384, Plate96, Tip96
+
+import labware as lw
+
+# Random position sets per case
+CASES = 300
+
+# Seed for position sets
+SEED = 0
+
+
+def old_groups(indexes: list[int], sep: int, channels: int) -> int:
+    """
+    Number of groups found by the greedy sort_list replaced in user-002, generalised
+    from pairs to groups: the valid group with the smallest last position is taken
+    until none is left.
+    """
+    groups = [
+        group
+        for group in itertools.combinations(sorted(indexes), channels)
+        if all(b - a >= sep for a, b in zip(group, group[1:]))
+    ]
+    groups.sort(key=lambda group: group[-1])
+
+    n = 0
+    while groups:
+        taken = set(groups[0])
+        groups = [g for g in groups if not taken.intersection(g)]
+        n += 1
+    return n
+
+
+def old_sort_list(indexes: list[int], sep: int) -> list[int]:
+    """Pairwise greedy sort_list replaced in user-002."""
+    pairs = [
+        pair
+        for pair in itertools.combinations(indexes, 2)
+        if abs(pair[0] - pair[1]) >= sep
+    ]
+    pairs_sorted = sorted(pairs, key=lambda x: x[1])
+    pairs_unique = []
+
+    while pairs_sorted:
+        pair = pairs_sorted[0]
+        pairs_sorted.remove(pair)
+        pairs_unique.append(pair)
+        pairs_sorted = [
+            p for p in pairs_sorted if p[0] not in pair and p[1] not in pair
+        ]
+
+    sorted_indexes = [i for t in pairs_unique for i in t]
+    unsorted_indexes = [i for i in indexes if i not in sorted_indexes]
+
+    return sorted_indexes + unsorted_indexes
+
+
+def positions(rng: random.Random, size: int, n: int) -> list[int]:
+    """n distinct positions of a plate with size positions in random order."""
+    return rng.sample(range(size), n)
+
+
+def full_groups(indexes: list[int], sep: int, channels: int) -> list[list[int]]:
+    """
+    Groups at the start of sort_list output, as many as group_list finds. Each must be
+    sorted with members at least sep apart.
+    """
+    n = len(lw.group_list(sorted(indexes), sep, channels))
+
+    result = lw.sort_list(indexes, sep, channels)
+    groups = [result[i * channels : (i + 1) * channels] for i in range(n)]
+    for group in groups:
+        assert all(b - a >= sep for a, b in zip(group, group[1:]))
+    return groups
+
+
+@pytest.mark.parametrize("channels", [2, 4, 8])
+@pytest.mark.parametrize("size,sep", [(96, 1), (384, 4)])
+def test_sort_list_permutation(channels, size, sep):
+    rng = random.Random(SEED)
+    for _ in range(CASES):
+        indexes = positions(rng, size, rng.randint(0, 48))
+        result = lw.sort_list(indexes, sep, channels)
+        assert sorted(result) == sorted(indexes)
+
+
+@pytest.mark.parametrize("channels", [2, 4, 8])
+@pytest.mark.parametrize("size,sep", [(96, 1), (384, 4)])
+def test_group_list_separation(channels, size, sep):
+    rng = random.Random(SEED)
+    for _ in range(CASES):
+        indexes = sorted(positions(rng, size, rng.randint(0, 48)))
+        groups = lw.group_list(indexes, sep, channels)
+        for group in groups:
+            assert len(group) == channels
+            assert all(abs(a - b) >= sep for a, b in itertools.combinations(group, 2))
+        grouped = [i for group in groups for i in group]
+        assert len(grouped) == len(set(grouped))
+        assert set(grouped) <= set(indexes)
+
+
+@pytest.mark.parametrize("channels", [2, 4, 8])
+def test_sort_list_not_worse_than_old_greedy(channels):
+    # Dense, small position sets make the old greedy miss groups
+    rng = random.Random(SEED)
+    for _ in range(CASES):
+        sep = rng.choice([1, 4])
+        indexes = positions(rng, 24, rng.randint(0, 12))
+        groups = full_groups(indexes, sep, channels)
+        assert len(groups) >= old_groups(indexes, sep, channels)
+
+
+@pytest.mark.parametrize("rows,sep", [(8, 1), (8, 2), (16, 4)])
+def test_sort_list_matches_old_pairing(rows, sep):
+    # Every set of ascending positions in a labware column
+    for subset in itertools.product([False, True], repeat=rows):
+        indexes = [i for i in range(rows) if subset[i]]
+        assert lw.sort_list(indexes, sep) == old_sort_list(indexes, sep)
+
+
+def test_plate_384_ch2_order():
+    # Rows 0, 4, 5 and 8 of column 2: greedy takes [0, 4] although [0, 5], [4, 8]
+    # would pair all four, ch2 keeps the order of the greedy it replaced
+    plate = lw.plate_384(Plate384("plate"))
+    plate.fill(["A3", "E3", "F3", "I3"])
+    first = 2 * 16
+    assert [i for _, i in plate.ch2()] == [first, first + 4]
+    assert [i for _, i in plate.ch2()] == [first + 5, first + 8]
+    assert plate.total() == 0
+
+
+def columns(index: list[int]) -> list[int]:
+    """Rack columns of 96-tip positions, in pickup order."""
+    return [i // 8 for i in index]
+
+
+def test_select_ch2_policies():
+    # Column 0 has 1 tip, column 3 has 3 tips, other columns are full
+    mask = np.ones((8, 12), dtype=bool)
+    mask[1:, 0] = False
+    mask[:5, 3] = False
+    select = lambda n, policy: lw.select_ch2(mask, lw.default_index_96, n, 2, policy)
+
+    assert select(2, "first") == [8, 10]
+    assert select(2, "best") == [29, 31]
+    assert select(2, "reserve") == [29, 31]
+
+    # Only reserve keeps using partial columns with fewer tips than needed
+    mask[5:, 3] = False
+    assert columns(select(2, "first")) == [1, 1]
+    assert columns(select(2, "best")) == [1, 1]
+    assert select(2, "reserve") == [0]
+
+    with pytest.raises(ValueError):
+        select(2, "last")
+
+
+def test_select_ch2_empty():
+    mask = np.zeros((8, 12), dtype=bool)
+    for policy in lw.TIP_POLICIES:
+        assert lw.select_ch2(mask, lw.default_index_96, 2, 2, policy) is None
+
+
+def test_tip_96_ch2_reserve_tops_up_from_next_column():
+    rack = lw.tip_96(Tip96("rack"), "reserve")
+    rack.fill(["A1", "A2", "B2", "C2", "D2", "E2", "F2", "G2", "H2"])
+
+    tips = rack.ch2(2)
+    assert [i for _, i in tips] == [0, 8]
+    assert rack.total() == 7
+    assert rack.pickups == [("ch2", 2)]
+
+
+def test_assign_labware_policy():
+    rack = lw.assign_labware(Tip96("rack"), "reserve")
+    assert isinstance(rack, lw.tip_96)
+    assert rack.policy == "reserve"
+    assert lw.assign_labware(Tip96("rack")).policy == "first"
+    assert isinstance(lw.assign_labware(Plate96("plate"), "best"), lw.plate_96)
+
+
+def test_count_rack_swaps():
+    # 48 pairs empty a rack, every further 48 need a new one
+    for policy in lw.TIP_POLICIES:
+        assert lw.count_rack_swaps([("ch2", 2)] * 48, policy) == 0
+        assert lw.count_rack_swaps([("ch2", 2)] * 49, policy) == 1
+        assert lw.count_rack_swaps([("ch2", 2)] * 97, policy) == 2
+        assert lw.count_rack_swaps([("mph384", 8, 12)] * 3, policy) == 2
+
+    # A 5-tip block leaves a partial column. First-fit takes the next pair from a full
+    # column, so 11 full columns are not left for the 8-tip pickups after it
+    pickups = [("mph384", 5, 1), ("ch2", 2)] + [("mph384", 8, 1)] * 11
+    assert lw.count_rack_swaps(pickups, "first") == 1
+    assert lw.count_rack_swaps(pickups, "best") == 0
+    assert lw.count_rack_swaps(pickups, "reserve") == 0
+    assert lw.compare_tip_policies(pickups) == {"first": 0, "best": 1, "reserve": 1}
+
+
+def brute_rectangle(
+    mask: np.ndarray, rows: int, columns: int, order: str, reverse: bool
+) -> tuple[int, int] | None:
+    """select_rectangle by scanning every block position."""
+    padded = np.pad(mask, 1)
+    blocks = []
+    for r in range(mask.shape[0] - rows + 1):
+        for c in range(mask.shape[1] - columns + 1):
+            if not mask[r : r + rows, c : c + columns].all():
+                continue
+            # Available positions sharing an edge with the block
+            ring = padded[r : r + rows + 2, c : c + columns + 2].copy()
+            ring[1:-1, 1:-1] = False
+            ring[[0, 0, -1, -1], [0, -1, 0, -1]] = False
+            key = (-c, -r) if reverse else (c, r)
+            if order == "fit":
+                key = (int(ring.sum()), *key)
+            blocks.append((key, (r, c)))
+
+    return min(blocks)[1] if blocks else None
+
+
+def used_mask(rng: random.Random) -> np.ndarray:
+    """384 mask with random blocks taken, as by earlier pickups, and single positions
+    flipped."""
+    mask = np.ones((16, 24), dtype=bool)
+    for _ in range(rng.randint(0, 6)):
+        r, c = rng.randrange(16), rng.randrange(24)
+        mask[r : r + rng.randint(1, 8), c : c + rng.randint(1, 12)] = False
+    for _ in range(rng.randint(0, 10)):
+        mask[rng.randrange(16), rng.randrange(24)] ^= True
+    return mask
+
+
+@pytest.mark.parametrize("order", ["a1", "fit"])
+@pytest.mark.parametrize("reverse", [False, True])
+def test_select_rectangle_matches_scan(order, reverse):
+    rng = random.Random(SEED)
+    for _ in range(CASES):
+        # 384 head sub-patterns, from single tips to the full head
+        mask = used_mask(rng)
+        rows = rng.choice([1, 2, 4, 8, 16])
+        columns = rng.choice([1, 2, 3, 4, 6, 12, 24])
+        expected = brute_rectangle(mask, rows, columns, order, reverse)
+        assert lw.select_rectangle(mask, rows, columns, order, reverse) == expected
+
+
+def test_select_rectangle_no_fit():
+    mask = np.ones((16, 24), dtype=bool)
+    mask[8, :] = False
+    mask[:, 12] = False
+
+    assert lw.select_rectangle(mask, 9, 1) is None
+    assert lw.select_rectangle(mask, 1, 13) is None
+    assert lw.select_rectangle(mask, 8, 12) == (0, 0)
+    assert lw.select_rectangle(mask, 8, 12, reverse=True) == (0, 0)
+    assert lw.select_rectangle(mask, 7, 11, reverse=True) == (9, 13)
+    assert lw.select_rectangle(np.zeros((16, 24), dtype=bool), 1, 1) is None
+
+    # Blocks larger than the labware or empty never fit
+    assert lw.select_rectangle(mask, 17, 1) is None
+    assert lw.select_rectangle(mask, 0, 1) is None
+    assert lw.select_mph384(mask, lw.default_index_384, 9, 1) == []
+    assert not lw.pickup_fits(mask, "mph384", 1, 13)
+
+    with pytest.raises(ValueError):
+        lw.select_rectangle(mask, 1, 1, order="last")
+
+
+def test_select_mph384_block():
+    mask = np.ones((16, 24), dtype=bool)
+    mask[:, 0] = False
+    index = lw.default_index_384
+
+    # Block positions in row-major order of the index
+    assert lw.select_mph384(mask, index, 2, 2) == [16, 32, 17, 33]
+    assert lw.select_mph384(mask, index, 16, 1, reverse=True) == list(range(368, 384))
@@ -0,0 +1,129 @@
+"""
+Tests for the motion model in motion.py: coordinates read from every layout in
+data/layouts, calibration from a synthetic method log and travel timed by the simulator.
+"""
+
+# Imports
+import os, datetime
+
+import pytest
+from pyhamilton import Plate96, Tip96
+
+import commands as cmd
+import deck as dk
+import labware as lw
+import motion as mo
+import simulator as sim
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+layout_dir_path = os.path.join(root, "data", "layouts")
+
+LAYOUTS = sorted(f for f in os.listdir(layout_dir_path) if f.endswith(".lay"))
+
+# Synthetic deck, overheads and speeds for calibration
+COORDINATES = {"A": (0.0, 0.0), "B": (300.0, 100.0), "C": (100.0, 450.0)}
+OVERHEADS = {"tip_pick_up": 6.0, "aspirate": 4.0, "grip_get": 11.0}
+SPEEDS = {"channels": 250.0, "gripper": 150.0}
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_read_coordinates(layout):
+    layout_file_path = os.path.join(layout_dir_path, layout)
+    coordinates = mo.read_coordinates(layout_file_path)
+    deck = dk.get_deck(layout_file_path, install=False)
+
+    for col in deck:
+        for slot in deck[col]:
+            for labware in slot["labware"]:
+                assert labware.coordinates == coordinates.get(labware.layout_name())
+                # Lids may have no position of their own in the layout
+                if not isinstance(labware, lw.Lid):
+                    assert labware.coordinates is not None
+
+    for x, y in dk.deck_coordinates(deck).values():
+        assert -100 < x < 800 and 0 < y < 600
+
+
+def test_snapshot_keeps_coordinates():
+    layout_file_path = os.path.join(layout_dir_path, "pooling.lay")
+    deck = dk.get_deck(layout_file_path, install=False)
+    snapshot = dk.deck_from_snapshot(dk.deck_to_snapshot(deck))
+    assert dk.deck_coordinates(snapshot) == dk.deck_coordinates(deck)
+
+
+def write_log(path: str, commands: list[tuple[str, str | None, float]]) -> None:
+    """Write commands as (command, labware, pause) in main.py log format. Each command
+    lasts its overhead and travel in the synthetic model, followed by pause."""
+    time = datetime.datetime(2026, 1, 1, 9, 0, 0)
+    positions = {}
+    with open(path, "w", encoding="utf-8") as f:
+        for command, labware, pause in commands:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
+            f.write(f"{stamp} - commands - DEBUG - Command: {command}")
+            f.write(f" | Labware: {labware} | Mode: 0\n")
+
+            duration = pause
+            if command in mo.ARMS:
+                arm = mo.ARMS[command]
+                distance = mo.distance(COORDINATES, positions.get(arm), labware)
+                duration += OVERHEADS[command] + distance / SPEEDS[arm]
+                positions[arm] = labware
+            else:
+                positions = {}
+            time += datetime.timedelta(seconds=duration)
+
+        f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - main - INFO - Done\n")
+
+
+def test_calibrate_synthetic_log(tmp_path):
+    path = os.path.join(tmp_path, "method.log")
+    commands = [("initialize", None, 0.0)]
+    for source, target in [("A", "B"), ("B", "C"), ("C", "A"), ("A", "C")]:
+        commands += [
+            ("tip_pick_up", source, 0.0),
+            ("aspirate", target, 0.0),
+            ("grip_get", target, 0.0),
+            ("grip_get", source, 0.0),
+        ]
+    # Prompts and incubations are not samples
+    commands += [("aspirate", "B", 600.0), ("tip_pick_up", "C", 0.0)]
+    write_log(path, commands)
+
+    samples = mo.log_samples(mo.read_log(path), COORDINATES)
+    assert all(duration <= mo.MAX_INTERVAL for _, _, duration in samples)
+
+    model = mo.calibrate(samples)
+    # Log times are rounded to ms
+    for command, overhead in OVERHEADS.items():
+        assert model["overheads"][command] == pytest.approx(overhead, abs=0.01)
+    for arm, speed in SPEEDS.items():
+        assert model["speeds"][arm] == pytest.approx(speed, rel=0.01)
+
+    # Commands and arms without samples keep their defaults
+    assert model["overheads"]["dispense"] == mo.MODEL["overheads"]["dispense"]
+    assert model["speeds"]["head384"] == mo.MODEL["speeds"]["head384"]
+
+
+def test_calibrate_without_samples():
+    assert mo.calibrate([]) == mo.MODEL
+
+
+def test_simulator_travel():
+    rack, plate = Tip96("rack"), Plate96("plate")
+
+    with sim.HamiltonSimulator() as ham:
+        ham.coordinates = {"rack": (0.0, 0.0), "plate": (200.0, 80.0)}
+        cmd.initialize(ham)
+        cmd.tip_pick_up(ham, [(rack, 0)])
+        cmd.aspirate(ham, [(plate, 0)], [10], liquidClass="Water")
+        cmd.dispense(ham, [(Plate96("other"), 0)], [10], liquidClass="Water")
+        cmd.dispense(ham, [(plate, 1)], [10], liquidClass="Water")
+        cmd.tip_eject(ham, [(rack, 0)])
+
+    base = [sim.command_duration(n, c, ham.durations) for n, c, _, _ in ham.history]
+    travel = [d - b for (_, _, _, d), b in zip(ham.history, base)]
+    speed = ham.speeds["channels"]
+
+    # First move has no known source, unknown labware resets the arm position
+    assert travel == pytest.approx([0, 0, 200 / speed, 0, 0, 200 / speed])
@@ -0,0 +1,77 @@
+"""
+Tests for background notifications in notifier.py, using ListSink instead of Slack.
+"""
+
+# Imports
+import logging, time
+
+import notifier as nt
+
+
+class FailingSink(nt.ListSink):
+    """List sink failing the first failures sends."""
+
+    def __init__(self, failures: int) -> None:
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    def send(self, text: str) -> None:
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise RuntimeError("sink unavailable")
+        super().send(text)
+
+
+def test_burst_is_coalesced():
+    sink = nt.ListSink()
+    dispatcher = nt.Dispatcher(sink, coalesce=0.5, backoff=0)
+    for text in ["a", "b", "c"]:
+        dispatcher.put(text)
+    dispatcher.close()
+
+    assert sink.messages == ["a\nb\nc"]
+
+
+def test_messages_apart_are_sent_separately():
+    sink = nt.ListSink()
+    dispatcher = nt.Dispatcher(sink, coalesce=0.05, backoff=0)
+    dispatcher.put("a")
+    time.sleep(0.5)
+    dispatcher.put("b")
+    dispatcher.close()
+
+    assert sink.messages == ["a", "b"]
+
+
+def test_failed_send_is_retried():
+    sink = FailingSink(failures=2)
+    dispatcher = nt.Dispatcher(sink, coalesce=0, attempts=3, backoff=0)
+    dispatcher.put("a")
+    dispatcher.close()
+
+    assert sink.attempts == 3
+    assert sink.messages == ["a"]
+
+
+def test_failed_send_is_dropped_after_attempts(caplog):
+    sink = FailingSink(failures=10)
+    dispatcher = nt.Dispatcher(sink, coalesce=0, attempts=3, backoff=0)
+    with caplog.at_level(logging.ERROR, logger="notifier"):
+        dispatcher.put("a")
+        dispatcher.close()
+
+    assert sink.attempts == 3
+    assert sink.messages == []
+    assert "Notification dropped: a" in caplog.text
+
+
+def test_flush_sends_queued_messages():
+    sink = nt.ListSink()
+    nt.configure(sink, coalesce=10, backoff=0)
+    nt.notify("a")
+    nt.notify("b")
+    nt.flush()
+
+    assert sink.messages == ["a\nb"]
+    assert nt.dispatcher is None
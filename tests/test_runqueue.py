@@ -0,0 +1,64 @@
+"""
+Tests for interface sessions shared by queued methods in runqueue.py, against the
+simulator.
+"""
+
+# Imports
+import os, itertools, shutil
+
+import pytest
+
+import commands as cmd
+import runqueue as rq
+import simulator as sim
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+layout_dir_path = os.path.join(root, "data", "layouts")
+
+LAYOUTS = sorted(f for f in os.listdir(layout_dir_path) if f.endswith(".lay"))
+
+
+@pytest.fixture(autouse=True)
+def clean_session(monkeypatch):
+    """Layouts are not installed and initialized interfaces are module globals."""
+    installed = []
+    monkeypatch.setattr(rq.dk, "install_layout", installed.append)
+    monkeypatch.setattr(cmd, "initialized", [])
+    return installed
+
+
+def test_bundled_layouts_are_not_shared():
+    # Every bundled method restarts the interface in a queue
+    for a, b in itertools.permutations(LAYOUTS, 2):
+        paths = [os.path.join(layout_dir_path, layout) for layout in [a, b]]
+        assert rq.shared_layouts(paths) == [False]
+
+
+def test_session_shared_for_identical_layouts(tmp_path, clean_session):
+    pooling = os.path.join(layout_dir_path, "pooling.lay")
+    copied = os.path.join(tmp_path, "pooling.lay")
+    shutil.copy(pooling, copied)
+    purification = os.path.join(layout_dir_path, "purification.lay")
+    assert rq.shared_layouts([pooling, copied, purification]) == [True, False]
+
+    session = rq.Session(sim.HamiltonSimulator)
+    session.use_layout(pooling)
+    with session() as ham:
+        cmd.initialize(ham)
+    session.keep()
+
+    # Same layout keeps the initialized interface
+    session.use_layout(copied)
+    with session() as kept:
+        assert kept is ham
+        assert cmd.initialize(kept) is None
+    assert clean_session == [pooling]
+
+    # Other layout is installed on a new interface
+    session.use_layout(purification)
+    assert not ham.is_open() and cmd.initialized == []
+    with session() as restarted:
+        assert restarted is not ham
+    assert clean_session == [pooling, purification]
+    session.close()
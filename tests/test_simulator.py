@@ -0,0 +1,114 @@
+"""
+Tests for the simulator in simulator.py: commands the robot would reject and command
+durations on the virtual clock.
+"""
+
+# Imports
+import pytest
+from pyhamilton import Plate96, Tip96
+from pyhamilton.oemerr import (
+    LabwareGrippedError,
+    NoLabwareError,
+    NoTipError,
+    TipPresentError,
+)
+
+import commands as cmd
+import simulator as sim
+
+# Labware, in (labware, index) format for positions
+RACK = Tip96("rack")
+PLATE = Plate96("plate")
+
+
+@pytest.fixture
+def ham():
+    with sim.HamiltonSimulator() as ham:
+        yield ham
+
+
+def test_pickup_with_tips_present(ham):
+    cmd.tip_pick_up(ham, [(RACK, 0)])
+    with pytest.raises(TipPresentError):
+        cmd.tip_pick_up(ham, [(RACK, 1), (RACK, 2)])
+
+    # Failed pickup does not change tips held
+    assert ham.channels == {0}
+    cmd.tip_eject(ham, waste=True)
+    cmd.tip_pick_up(ham, [(RACK, 1), (RACK, 2)])
+    assert ham.channels == {0, 1}
+
+
+def test_liquid_handling_without_tips(ham):
+    with pytest.raises(NoTipError):
+        cmd.dispense(ham, [(PLATE, 0)], [10])
+    with pytest.raises(NoTipError):
+        cmd.tip_eject(ham, waste=True)
+
+    # Dispense on a channel without a tip
+    cmd.tip_pick_up(ham, [(RACK, 0)])
+    with pytest.raises(NoTipError):
+        cmd.dispense(ham, [(PLATE, 0), (PLATE, 1)], [10, 10])
+
+
+def test_gripper_place_without_get(ham):
+    with pytest.raises(NoLabwareError):
+        cmd.grip_place(ham, PLATE)
+
+    cmd.grip_get(ham, PLATE)
+    with pytest.raises(LabwareGrippedError):
+        cmd.grip_get(ham, Plate96("other"))
+    cmd.grip_place(ham, Plate96("other"))
+    assert not ham.gripped
+
+
+@pytest.mark.parametrize(
+    "name,command",
+    [
+        # Positions must be in 'layout name, position' format
+        ("PICKUP", {"labwarePositions": "rack", "channelVariable": "1"}),
+        # One position per channel
+        ("PICKUP", {"labwarePositions": "rack, 1", "channelVariable": "11"}),
+        ("ASPIRATE", {"labwarePositions": "", "channelVariable": ""}),
+        # One volume per position, volumes not negative
+        (
+            "DISPENSE",
+            {"labwarePositions": "plate, 1", "channelVariable": "1", "volumes": []},
+        ),
+        (
+            "DISPENSE",
+            {"labwarePositions": "plate, 1", "channelVariable": "1", "volumes": [-1]},
+        ),
+        # 384 head volumes up to MAX_VOLUME_384
+        ("ASPIRATE384", {"labwarePositions": "plate, 1", "aspirateVolume": 51.0}),
+        ("GRIP_GET", {"plateLabwarePositions": ""}),
+        ("GRIP_PLACE", {"plateLabwarePositions": "", "plateSequence": ""}),
+    ],
+)
+def test_check_command_rejects(name, command):
+    with pytest.raises(ValueError):
+        sim.check_command(name, command)
+
+
+def test_rejected_command_not_sent(ham):
+    with pytest.raises(ValueError):
+        cmd.aspirate(ham, [(PLATE, 0)], [10], liquidClass="")
+    assert ham.history == [] and ham.clock == 0.0
+
+
+def test_durations_advance_clock(ham):
+    cmd.tip_pick_up(ham, [(RACK, 0)])
+    cmd.aspirate(ham, [(PLATE, 0)], [10], mixCycles=3, mixVolume=20.0)
+    ham.sleep(60)
+    ham.durations["EJECT"] = 1.0
+    cmd.tip_eject(ham, waste=True)
+
+    # Aspirate adds flow time of the volume and mixing
+    aspirate = sim.DURATIONS["ASPIRATE"] + (10 + 2 * 3 * 20) / sim.FLOW_RATE
+    durations = [sim.DURATIONS["PICKUP"], aspirate, 60, 1.0]
+    starts = [sum(durations[:i]) for i in range(len(durations))]
+
+    assert [c[0] for c in ham.history] == ["PICKUP", "ASPIRATE", "SLEEP", "EJECT"]
+    assert [c[2] for c in ham.history] == pytest.approx(starts)
+    assert [c[3] for c in ham.history] == pytest.approx(durations)
+    assert ham.clock == pytest.approx(sum(durations))
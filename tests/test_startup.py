@@ -0,0 +1,25 @@
+"""
+Start-up checks for main.py, see benchmarks/startup.py. Heavy modules must only be
+imported once all prompts are answered. Time to first prompt depends on the machine and
+is only checked by the benchmark.
+"""
+
+# Imports
+import os, sys
+
+# Paths
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(root, "benchmarks"))
+
+import startup
+
+
+def test_no_heavy_imports_before_prompt(tmp_path):
+    startup.deploy(tmp_path)
+    process, _ = startup.start_main(tmp_path, "-X", "importtime")
+    modules = startup.imported_modules(startup.stop_main(process))
+
+    # Lib modules are imported before the prompt, so the check sees real imports
+    assert "state" in modules
+    assert [m for m in modules if m in startup.HEAVY] == []
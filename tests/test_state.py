@@ -0,0 +1,185 @@
+"""
+Tests for state files, journal, deck stores and well indexes in state.py.
+"""
+
+# Imports
+import os, json
+
+import pytest
+
+import state as st
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    """Open deck stores and well indexes are module globals, start each test empty."""
+    monkeypatch.setattr(st, "deck_stores", [])
+    monkeypatch.setattr(st, "well_indexes", {})
+    monkeypatch.setattr(st, "barriers", [])
+    monkeypatch.setattr(st, "observers", [])
+
+
+def new_state(tmp_path, state: dict) -> str:
+    path = os.path.join(tmp_path, "method.json")
+    st.save_state(state, path)
+    return path
+
+
+def read_json(path: str):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def test_well_index_saved_with_deck_state(tmp_path):
+    path = new_state(tmp_path, {"active_plate": 0})
+    index_path = os.path.join(tmp_path, "method_wells.json")
+
+    with st.DeckStore(os.path.join(tmp_path, "method")) as store:
+        store["A"] = [{"frame": [0]}]
+        st.save_well_index({"fetched": []}, index_path)
+        index = st.load_well_index(index_path)
+
+        # Changes are only written when state is set, together with the deck
+        store["A"][0]["frame"].append(1)
+        index["fetched"].append("P1")
+        assert read_json(index_path) == {"fetched": []}
+
+        st.set_state({"active_plate": 0}, path, "active_plate", 1)
+        assert read_json(index_path) == {"fetched": ["P1"]}
+        with st.DeckStore(os.path.join(tmp_path, "method"), track=False) as reopened:
+            assert reopened["A"][0] == {"frame": [0, 1]}
+
+
+def test_well_index_deck_written_first(tmp_path, monkeypatch):
+    path = new_state(tmp_path, {"active_plate": 0})
+    index_path = os.path.join(tmp_path, "method_wells.json")
+    order = []
+
+    with st.DeckStore(os.path.join(tmp_path, "method")) as store:
+        store["A"] = [{"frame": [0]}]
+        st.save_well_index({"fetched": []}, index_path)
+
+        sync = store.sync
+        write = st.write_well_index
+        monkeypatch.setattr(store, "sync", lambda: order.append("deck") or sync())
+        monkeypatch.setattr(
+            st,
+            "write_well_index",
+            lambda *args: order.append("index") or write(*args),
+        )
+
+        # Unchanged index is not written again
+        st.set_state({"active_plate": 0}, path, "active_plate", 1)
+        assert order == ["deck"]
+
+        st.well_indexes[index_path][0]["fetched"].append("P1")
+        st.set_state({"active_plate": 1}, path, "active_plate", 0)
+        assert order == ["deck", "deck", "index"]
+
+
+def test_deck_column_loads_slots_on_access(tmp_path):
+    with st.DeckStore(os.path.join(tmp_path, "method")) as store:
+        store["A"] = [{"frame": [i]} for i in range(4)]
+        column = store["A"]
+        assert len(column) == 4
+        assert store.loaded == {}
+
+        assert column[-1] == {"frame": [3]}
+        assert column[1:3] == [{"frame": [1]}, {"frame": [2]}]
+        assert sorted(store.loaded) == [("A", 1), ("A", 2), ("A", 3)]
+        assert column[1] is store["A"][1]
+
+        with pytest.raises(IndexError):
+            column[4]
+        with pytest.raises(KeyError):
+            store["B"]
+
+
+def test_deck_store_syncs_changed_slots(tmp_path):
+    path = os.path.join(tmp_path, "method")
+    with st.DeckStore(path) as store:
+        store["A"] = [{"frame": [0]}, {"frame": [1]}]
+        store["B"] = [{"frame": []}]
+        assert list(store) == ["A", "B"] and len(store) == 2
+
+        store["A"][0]["frame"].append(2)
+        store["A"][1]
+        statements = []
+        store.db.set_trace_callback(statements.append)
+        store.sync()
+        store.sync()
+        updates = [s for s in statements if s.startswith("UPDATE")]
+        assert len(updates) == 1 and updates[0].endswith("col = 'A' AND row = 0")
+
+    with st.DeckStore(path, track=False) as reopened:
+        assert reopened["A"][:] == [{"frame": [0, 2]}, {"frame": [1]}]
+        assert reopened["B"][0] == {"frame": []}
+
+
+def test_deck_store_replaces_column(tmp_path):
+    path = os.path.join(tmp_path, "method")
+    with st.DeckStore(path) as store:
+        store["A"] = [{"frame": [0]}, {"frame": [1]}]
+        store["A"][0]["frame"].append(2)
+
+        # Replaced column is not overwritten by unsynced slots
+        store["A"] = [{"frame": [3]}]
+        assert len(store["A"]) == 1
+        store.sync()
+
+        # Failed replace keeps the old column
+        with pytest.raises(Exception):
+            store["A"] = [{"frame": [4]}, {"frame": lambda: None}]
+        assert store["A"][:] == [{"frame": [3]}]
+
+        del store["A"]
+        assert "A" not in store
+
+    with st.DeckStore(path, track=False) as reopened:
+        assert list(reopened) == []
+
+
+def test_journal_replay(tmp_path):
+    path = new_state(tmp_path, {"step": 0, "plate": 0})
+    state = st.load_state(path)
+
+    st.set_state(state, path, "step", 1)
+    st.set_state(state, path, "plate", 2)
+    st.set_state(state, path, "step", 3)
+
+    # Changes are only in the journal, later records win
+    assert read_json(path) == {"step": 0, "plate": 0}
+    assert st.load_state(path) == {"step": 3, "plate": 2} == state
+
+
+def test_journal_truncated_record(tmp_path, caplog):
+    path = new_state(tmp_path, {"step": 0})
+    st.set_state({"step": 0}, path, "step", 1)
+
+    # Interrupted write of the next record
+    with open(f"{path}.journal", "a", encoding="utf-8") as file:
+        file.write('{"key": "step", "val')
+
+    assert st.load_state(path) == {"step": 1}
+    assert "incomplete journal record" in caplog.text
+
+
+def test_journal_compaction(tmp_path, monkeypatch):
+    path = new_state(tmp_path, {"step": 0})
+    state = st.load_state(path)
+    record = len(json.dumps({"key": "step", "value": 1}) + "\n")
+    monkeypatch.setattr(st, "JOURNAL_SIZE", 3 * record)
+
+    # Journal is compacted once it grows past JOURNAL_SIZE
+    for value in range(1, 4):
+        st.set_state(state, path, "step", value)
+    assert os.path.getsize(f"{path}.journal") == st.JOURNAL_SIZE
+    assert read_json(path) == {"step": 0}
+
+    st.set_state(state, path, "step", 4)
+    assert not os.path.exists(f"{path}.journal")
+    assert read_json(path) == {"step": 4}
+
+    st.set_state(state, path, "step", 5)
+    assert os.path.getsize(f"{path}.journal") == record
+    assert st.load_state(path) == {"step": 5}